@@ -0,0 +1,88 @@
+"""Time the batch extrusion of building footprints against one call per building.
+
+Usage:
+    python -m benchmarks.bench_extrusion [buildings]
+
+Footprints are irregular rings of 4-40 vertices, every tenth one with a
+courtyard and every seventh one a round tower, laid out on a grid. Also
+compares the serialized size of the plain and the indexed meshes.
+"""
+import math
+import random
+import sys
+import time
+
+import numpy as np
+from specklepy.serialization.base_object_serializer import BaseObjectSerializer
+
+from utils.utils_geometry import (
+    extrude_building,
+    extrude_buildings,
+    extrude_footprints,
+)
+
+
+def make_footprints(count: int, seed: int = 0) -> tuple[list]:
+    """Footprints, voids and heights of a grid of buildings 30 m apart."""
+    rnd = random.Random(seed)
+    side = math.ceil(math.sqrt(count))
+    footprints = []
+    voids = []
+    heights = []
+    for i in range(count):
+        cx, cy = 30 * (i % side), 30 * (i // side)
+        n = rnd.randint(4, 40)
+        angles = np.linspace(0, 2 * math.pi, n, endpoint=False)
+        radii = np.array([rnd.uniform(8, 12) for _ in range(n)])
+        if i % 7 == 0:  # round, with smooth walls
+            angles = np.linspace(0, 2 * math.pi, 24, endpoint=False)
+            radii = np.full(24, 10)
+        footprints.append(
+            np.column_stack((cx + radii * np.cos(angles), cy + radii * np.sin(angles)))
+        )
+        courtyard = np.array([(-3, -3), (3, -3), (3, 3), (-3, 3)]) + (cx, cy)
+        voids.append([courtyard] if i % 10 == 0 else [])
+        heights.append(rnd.choice([6, 9, 12, 30]))
+    return footprints, voids, heights
+
+
+def run(count: int) -> None:
+    """Print the timings of both ways of extruding the same footprints."""
+    footprints, voids, heights = make_footprints(count)
+
+    start = time.perf_counter()
+    for coords, coords_inner, height in zip(footprints, voids, heights):
+        extrude_building(coords, coords_inner, height)
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vertices, faces, _, _, _ = extrude_footprints(footprints, voids, heights)
+    arrays = time.perf_counter() - start
+
+    start = time.perf_counter()
+    meshes, report = extrude_buildings(footprints, voids, heights)
+    batch = time.perf_counter() - start
+
+    print(
+        f"{count} buildings, {len(vertices)} vertices, {len(faces)} face entries"
+        f" | one by one {single:.2f} s | arrays {arrays:.2f} s"
+        f" | arrays and Meshes {batch:.2f} s"
+    )
+
+    indexed_meshes, indexed_report = extrude_buildings(
+        footprints, voids, heights, indexed=True
+    )
+    serializer = BaseObjectSerializer()
+    for label, result, result_report in (
+        ("plain", meshes, report),
+        ("indexed", indexed_meshes, indexed_report),
+    ):
+        size = sum(len(serializer.write_json(mesh)[1]) for mesh in result[:1000])
+        print(
+            f"{label:>8} | {result_report}"
+            f" | {size / 1e6:.1f} MB serialized for the first 1000"
+        )
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
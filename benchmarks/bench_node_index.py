@@ -0,0 +1,70 @@
+"""Compare the legacy linear node scan with the hashed node index.
+
+Usage:
+    python -m benchmarks.bench_node_index [recorded_response.json[.gz]]
+
+Without an argument, synthetic responses of growing size are used to show
+how both approaches scale.
+"""
+import sys
+import time
+
+from benchmarks.overpass_sample import load_overpass_response, make_overpass_response
+from utils.utils_osm import OsmElements, build_node_index
+from utils.utils_pyproj import ProjectionContext
+
+
+def way_node_lists(features: list[dict]) -> list[list[int]]:
+    """Node ID lists of every way in the response."""
+    return [f["nodes"] for f in features if f["type"] == "way"]
+
+
+def resolve_linear(features: list[dict]) -> int:
+    """Resolve way nodes the way the builders used to: scan all nodes per vertex."""
+    nodes = [
+        {"id": f["id"], "lat": f["lat"], "lon": f["lon"]}
+        for f in features
+        if f["type"] == "node"
+    ]
+    resolved = 0
+    for ids in way_node_lists(features):
+        for node_id in ids:
+            for node in nodes:
+                if node_id == node["id"]:
+                    resolved += 1
+                    break
+    return resolved
+
+
+def resolve_indexed(features: list[dict]) -> int:
+    """Resolve way nodes through a node index built once per response."""
+    osm = OsmElements()
+    osm.extend(features)
+    node_index = build_node_index(osm, ProjectionContext(51.5, -0.12))
+    way_nodes = [node_id for ids in way_node_lists(features) for node_id in ids]
+    _, found = node_index.lookup(way_nodes)
+    return int(found.sum())
+
+
+def run(features: list[dict], label: str) -> None:
+    """Time both resolvers on one response and print a table row."""
+    node_count = sum(1 for f in features if f["type"] == "node")
+    start = time.perf_counter()
+    resolved_indexed = resolve_indexed(features)
+    indexed = time.perf_counter() - start
+    start = time.perf_counter()
+    resolved_linear = resolve_linear(features)
+    linear = time.perf_counter() - start
+    assert resolved_linear == resolved_indexed
+    print(
+        f"{label:>12} | {node_count:>8} nodes | linear {linear:9.3f} s"
+        f" | indexed {indexed:7.4f} s | x{linear / max(indexed, 1e-9):,.0f}"
+    )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        run(load_overpass_response(sys.argv[1]), "recorded")
+    else:
+        for blocks in (5, 10, 20, 40):
+            run(make_overpass_response(blocks), f"{blocks}x{blocks}")
@@ -0,0 +1,72 @@
+"""Compare peak memory of loading a full Overpass response with streaming it.
+
+Usage:
+    python -m benchmarks.bench_overpass_parse [recorded_response.json]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.overpass_sample import make_overpass_response
+from utils.utils_json import iter_json_array
+from utils.utils_osm import OsmElements
+from utils.utils_osm_source import STREAM_CHUNK_SIZE
+
+
+def parse_loaded(path: str) -> int:
+    """The former path: json.loads of the whole body, then lists of dicts."""
+    with open(path, "rb") as f:
+        features = json.loads(f.read())["elements"]
+    ways = []
+    nodes = []
+    for feature in features:
+        if feature["type"] == "way":
+            ways.append({"id": feature["id"], "nodes": feature["nodes"]})
+        elif feature["type"] == "node":
+            nodes.append(
+                {"id": feature["id"], "lat": feature["lat"], "lon": feature["lon"]}
+            )
+    return len(ways) + len(nodes)
+
+
+def parse_streamed(path: str) -> int:
+    """Stream the body in chunks straight into the compact store."""
+    osm = OsmElements()
+    with open(path, "rb") as f:
+        chunks = iter(lambda: f.read(STREAM_CHUNK_SIZE), b"")
+        osm.extend(iter_json_array(chunks, "elements"))
+    return len(osm.way_ids) + len(osm.node_ids)
+
+
+def measure(parse, path: str) -> tuple[float, float]:
+    """Peak traced memory (MB) and run time (s) of a parser."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    parse(path)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024**2, elapsed
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    else:
+        fd, path = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"elements": make_overpass_response(120)}, f)
+
+    size = os.path.getsize(path) / 1024**2
+    for label, parse in (("loaded", parse_loaded), ("streamed", parse_streamed)):
+        peak, elapsed = measure(parse, path)
+        print(
+            f"{label:>8} | payload {size:6.1f} MB | peak {peak:7.1f} MB"
+            f" | {elapsed:5.2f} s"
+        )
+
+    if len(sys.argv) == 1:
+        os.remove(path)
@@ -0,0 +1,54 @@
+"""Time the building and road meshing in this process and in a process pool.
+
+Usage:
+    python -m benchmarks.bench_parallel_meshing [buildings] [workers]
+
+The number of workers defaults to the CPUs allowed by the container quota.
+"""
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.bench_extrusion import make_footprints
+from utils.utils_geometry import extrude_buildings, road_buffers
+from utils.utils_parallel import get_cpu_count
+
+
+def make_roads(count: int, seed: int = 0) -> tuple[list]:
+    """Random walks of 2-30 vertices with the buffer values of the road classes."""
+    rng = np.random.default_rng(seed)
+    roads = [
+        np.cumsum(rng.normal(0, 20, (rng.integers(2, 30), 2)), axis=0)
+        for _ in range(count)
+    ]
+    values = rng.choice([2, 7, 12], count).tolist()
+    return roads, values
+
+
+def run(count: int, workers: int) -> None:
+    """Print the timings of the serial and the parallel meshing."""
+    footprints, voids, heights = make_footprints(count)
+    roads, values = make_roads(count)
+
+    for label, function, arguments in (
+        ("buildings", extrude_buildings, (footprints, voids, heights, False)),
+        ("roads", road_buffers, (roads, values, 8)),
+    ):
+        timings = []
+        results = []
+        for pool_size in (1, workers):
+            start = time.perf_counter()
+            results.append(function(*arguments, workers=pool_size))
+            timings.append(time.perf_counter() - start)
+        print(
+            f"{label:>9} | {count} items | serial {timings[0]:.2f} s"
+            f" | {workers} workers {timings[1]:.2f} s"
+        )
+
+
+if __name__ == "__main__":
+    run(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 10_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else get_cpu_count(),
+    )
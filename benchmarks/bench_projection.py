@@ -0,0 +1,51 @@
+"""Compare per-point reproject_to_crs + rotate_pt with the batched ProjectionContext.
+
+Usage:
+    python -m benchmarks.bench_projection [node_count]
+"""
+import sys
+import time
+
+import numpy as np
+from pyproj import Transformer
+
+from utils.utils_geometry import rotate_pt
+from utils.utils_pyproj import ProjectionContext, create_crs
+
+LAT = 51.5
+LON = -0.12
+ANGLE_RAD = 0.3
+
+
+def project_per_point(lats: list[float], lons: list[float]) -> list[dict]:
+    """The former path: a new Transformer and a rotation call for every node."""
+    projected_crs = create_crs(LAT, LON)
+    coords = []
+    for lat, lon in zip(lats, lons):
+        transformer = Transformer.from_crs("EPSG:4326", projected_crs, always_xy=True)
+        x, y = transformer.transform(lon, lat)
+        coords.append(rotate_pt({"x": x, "y": y}, ANGLE_RAD))
+    return coords
+
+
+if __name__ == "__main__":
+    node_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    rng = np.random.default_rng(0)
+    lats = (LAT + rng.uniform(-0.01, 0.01, node_count)).tolist()
+    lons = (LON + rng.uniform(-0.015, 0.015, node_count)).tolist()
+
+    start = time.perf_counter()
+    projection = ProjectionContext(LAT, LON, ANGLE_RAD)
+    x, y = projection.project(lats, lons)
+    batched = time.perf_counter() - start
+
+    start = time.perf_counter()
+    coords = project_per_point(lats, lons)
+    per_point = time.perf_counter() - start
+
+    assert np.allclose(x, [c["x"] for c in coords])
+    assert np.allclose(y, [c["y"] for c in coords])
+    print(
+        f"{node_count} nodes | per point {per_point:.3f} s"
+        f" | batched {batched * 1000:.1f} ms | x{per_point / batched:,.0f}"
+    )
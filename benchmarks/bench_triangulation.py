@@ -0,0 +1,257 @@
+"""Compare the former Voronoi-based to_triangles with the ear-clipping triangulator.
+
+Usage:
+    python -m benchmarks.bench_triangulation [recorded_response.json[.gz]]
+
+Courtyard footprints (multipolygon buildings with inner rings) are taken
+from a recorded Overpass response, or synthesized as irregular perimeter
+blocks with courtyards and near-duplicate vertices.
+"""
+import math
+import random
+import sys
+import time
+
+import geopandas as gpd
+import numpy as np
+from geovoronoi import voronoi_regions_from_coords
+from shapely import Polygon
+from shapely.ops import triangulate
+
+from benchmarks.overpass_sample import load_overpass_response
+from utils.utils_earcut import triangulate_polygon
+from utils.utils_osm import (
+    MEMBER_WAY,
+    ROLE_INNER,
+    ROLE_OUTER,
+    OsmElements,
+    assign_inner_rings,
+    build_node_index,
+    get_way_coords,
+    stitch_ways,
+)
+from utils.utils_pyproj import ProjectionContext
+
+
+def to_triangles(
+    coords: list[list[float]], coords_inner: list[list[list[float]]], attempt: int = 0
+) -> tuple[dict, int]:
+    """Generate triangular faces from the Polygon with voids."""
+    # https://gis.stackexchange.com/questions/316697/delaunay-triangulation-algorithm-in-shapely-producing-erratic-result
+    try:
+        # round vertices precision
+        digits = 3 - attempt
+
+        vert = []
+        vert_rounded = []
+        # round boundary precision:
+        for i, v in enumerate(coords):
+            if i == len(coords) - 1:
+                vert.append((v[0], v[1]))
+                break  # don't test last point
+            rounded = [round(v[0], digits), round(v[1], digits)]
+            if v not in vert and rounded not in vert_rounded:
+                vert.append((v[0], v[1]))
+                vert_rounded.append(rounded)
+        # round courtyards precision:
+        holes = []
+        holes_rounded = []
+        for k, h in enumerate(coords_inner):
+            hole = []
+            for i, v in enumerate(h):
+                if i == len(h) - 1:
+                    hole.append((v[0], v[1]))
+                    break  # don't test last point
+
+                # test if any previour vertext with similar rounded value
+                # has been added before, then ignore
+                rounded = [round(v[0], digits), round(v[1], digits)]
+                if v not in holes and rounded not in holes_rounded:
+                    hole.append((v[0], v[1]))
+                    holes_rounded.append(rounded)
+            holes.append(hole)
+
+        # check if sufficient holes vertices were added
+        if len(holes) == 1 and len(holes[0]) == 0:
+            polygon = Polygon([(v[0], v[1]) for v in vert])
+        else:
+            polygon = Polygon([(v[0], v[1]) for v in vert], holes)
+
+        exterior_linearring = polygon.exterior
+        poly_points = np.array(exterior_linearring.coords).tolist()
+
+        try:
+            polygon.interiors[0]
+        except IndexError:
+            poly_points = poly_points
+        else:
+            for i, interior_linearring in enumerate(polygon.interiors):
+                a = interior_linearring.coords
+                poly_points += np.array(a).tolist()
+
+        poly_points = np.array(
+            [item for sublist in poly_points for item in sublist]
+        ).reshape(-1, 2)
+
+        poly_shapes, _ = voronoi_regions_from_coords(
+            poly_points, polygon.buffer(0.000001)
+        )
+        gdf_poly_voronoi = (
+            gpd.GeoDataFrame({"geometry": poly_shapes})
+            .explode(index_parts=True)
+            .reset_index()
+        )
+
+        tri_geom = []
+        for geom in gdf_poly_voronoi.geometry:
+            inside_triangles = [
+                tri for tri in triangulate(geom) if tri.centroid.within(polygon)
+            ]
+            tri_geom += inside_triangles
+
+        vertices = []
+        triangles = []
+        for tri in tri_geom:
+            xx, yy = tri.exterior.coords.xy
+            v_list = zip(xx.tolist(), yy.tolist())
+
+            tr_indices = []
+            count = 0
+            for vt in v_list:
+                v = list(vt)
+                if count == 3:
+                    continue
+                if v not in vertices:
+                    vertices.append(v)
+                    tr_indices.append(len(vertices) - 1)
+                else:
+                    tr_indices.append(vertices.index(v))
+                count += 1
+            triangles.append(tr_indices)
+
+        shape = {"vertices": vertices, "triangles": triangles}
+        return shape, attempt
+    except Exception as e:
+        print(f"Meshing iteration {attempt} failed: {e}")
+        attempt += 1
+        if attempt <= 3:
+            return to_triangles(coords, coords_inner, attempt)
+        else:
+            return None, None
+
+
+def recorded_courtyards(path: str) -> list[tuple]:
+    """Outer and inner rings of the courtyard buildings of a recorded response."""
+    features = load_overpass_response(path)
+    osm = OsmElements()
+    osm.extend(features)
+    node = next(f for f in features if f["type"] == "node")
+    node_index = build_node_index(osm, ProjectionContext(node["lat"], node["lon"]))
+
+    footprints = []
+    for row, building in enumerate(osm.relation_tags["building"]):
+        if building is None:
+            continue
+        outer_ways = []
+        inner_ways = []
+        for member_type, member_ref, member_role in osm.get_members(row):
+            member = osm.get_way_nodes(member_ref)
+            if member_type != MEMBER_WAY or member is None:
+                continue
+            if member_role == ROLE_OUTER:
+                outer_ways.append(member.tolist())
+            elif member_role == ROLE_INNER:
+                inner_ways.append(member.tolist())
+        outer_rings, _ = stitch_ways(outer_ways)
+        inner_rings, _ = stitch_ways(inner_ways)
+        groups = assign_inner_rings(outer_rings, inner_rings, node_index)
+        for ring, inner_group in zip(outer_rings, groups):
+            if inner_group:
+                footprints.append(
+                    (
+                        get_way_coords(ring[:-1], node_index),
+                        [get_way_coords(r[:-1], node_index) for r in inner_group],
+                    )
+                )
+    return footprints
+
+
+def synthetic_courtyards(count: int, seed: int = 0) -> list[tuple]:
+    """Irregular perimeter blocks with 1-3 courtyards, some vertices duplicated."""
+    rnd = random.Random(seed)
+
+    def ring(cx: float, cy: float, radius: float, vertices: int) -> np.ndarray:
+        points = []
+        for k in range(vertices):
+            angle = 2 * math.pi * k / vertices
+            r = radius * rnd.uniform(0.9, 1.1)
+            points.append((cx + r * math.cos(angle), cy + r * math.sin(angle)))
+            if rnd.random() < 0.1:  # as left by snapping of mapped nodes
+                points.append((points[-1][0] + 1e-5, points[-1][1]))
+        return np.array(points)
+
+    footprints = []
+    for _ in range(count):
+        outer = ring(0, 0, 40, rnd.randint(12, 80))
+        holes = [
+            ring(
+                14 * math.cos(2 * math.pi * k / 3),
+                14 * math.sin(2 * math.pi * k / 3),
+                6,
+                rnd.randint(4, 16),
+            )
+            for k in range(rnd.randint(1, 3))
+        ]
+        footprints.append((outer, holes))
+    return footprints
+
+
+def area_error(vertices: np.ndarray, triangles: np.ndarray, polygon: Polygon) -> float:
+    """Relative difference of the triangulated and the polygon area."""
+    a, b, c = (vertices[triangles[:, k]] for k in range(3))
+    cross = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (
+        c[:, 0] - a[:, 0]
+    )
+    return abs(np.abs(cross).sum() / 2 - polygon.area) / polygon.area
+
+
+def run(footprints: list[tuple], label: str) -> None:
+    """Time both triangulators and check their areas."""
+    polygons = [Polygon(outer, holes) for outer, holes in footprints]
+
+    start = time.perf_counter()
+    legacy_failed = 0
+    legacy_errors = []
+    for (outer, holes), polygon in zip(footprints, polygons):
+        shape, _ = to_triangles(outer.tolist(), [h.tolist() for h in holes])
+        if shape is None or not shape["triangles"]:
+            legacy_failed += 1
+            continue
+        legacy_errors.append(
+            area_error(
+                np.array(shape["vertices"]), np.array(shape["triangles"]), polygon
+            )
+        )
+    legacy = time.perf_counter() - start
+
+    start = time.perf_counter()
+    errors = []
+    for (outer, holes), polygon in zip(footprints, polygons):
+        vertices, triangles = triangulate_polygon(outer, holes)
+        errors.append(area_error(vertices, triangles, polygon))
+    earcut = time.perf_counter() - start
+
+    print(
+        f"{label:>10} | {len(footprints):>4} courtyards"
+        f" | voronoi {legacy:7.3f} s, {legacy_failed} failed,"
+        f" max area error {max(legacy_errors, default=0):.2e}"
+        f" | earcut {earcut:7.4f} s, max area error {max(errors, default=0):.2e}"
+        f" | x{legacy / max(earcut, 1e-9):,.0f}"
+    )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        run(recorded_courtyards(sys.argv[1]), "recorded")
+    else:
+        run(synthetic_courtyards(200), "synthetic")
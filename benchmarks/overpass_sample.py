@@ -0,0 +1,128 @@
+"""Load recorded Overpass responses or synthesize city-like ones for benchmarks."""
+import gzip
+import json
+import random
+
+# ~1 m in degrees near the equator, good enough for synthetic layouts
+DEGREES_PER_METER = 1 / 111_320
+
+
+def load_overpass_response(path: str) -> list[dict]:
+    """Read the "elements" of a recorded Overpass JSON response (optionally .gz)."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return json.load(f)["elements"]
+
+
+def make_overpass_response(
+    blocks_per_side: int,
+    lat: float = 51.5,
+    lon: float = -0.12,
+    block_size: float = 40.0,
+    seed: int = 0,
+) -> list[dict]:
+    """Synthesize a grid city in the Overpass "out body;>;out skel qt;" layout.
+
+    Every block holds one rectangular building way, every 10th block is a
+    courtyard building (multipolygon relation), and streets run between blocks.
+    """
+    rnd = random.Random(seed)
+    step = block_size * DEGREES_PER_METER
+    tagged = []
+    untagged_ways = []
+    nodes = []
+    next_id = [1]
+
+    def new_node(y: float, x: float) -> int:
+        node_id = next_id[0]
+        next_id[0] += 1
+        nodes.append({"type": "node", "id": node_id, "lat": y, "lon": x})
+        return node_id
+
+    def new_ring(y0: float, x0: float, size: float) -> list[int]:
+        ring = [
+            new_node(y0, x0),
+            new_node(y0, x0 + size),
+            new_node(y0 + size, x0 + size),
+            new_node(y0 + size, x0),
+        ]
+        return ring + ring[:1]
+
+    def new_way_id() -> int:
+        way_id = next_id[0]
+        next_id[0] += 1
+        return way_id
+
+    for row in range(blocks_per_side):
+        for col in range(blocks_per_side):
+            y0 = lat + row * step
+            x0 = lon + col * step
+            size = step * rnd.uniform(0.5, 0.7)
+            tags = {"building": "yes", "building:levels": str(rnd.randint(1, 8))}
+            if (row * blocks_per_side + col) % 10 == 0:
+                outer_id = new_way_id()
+                inner_id = new_way_id()
+                untagged_ways.append(
+                    {"type": "way", "id": outer_id, "nodes": new_ring(y0, x0, size)}
+                )
+                untagged_ways.append(
+                    {
+                        "type": "way",
+                        "id": inner_id,
+                        "nodes": new_ring(y0 + size / 3, x0 + size / 3, size / 3),
+                    }
+                )
+                tagged.append(
+                    {
+                        "type": "relation",
+                        "id": new_way_id(),
+                        "members": [
+                            {"type": "way", "ref": outer_id, "role": "outer"},
+                            {"type": "way", "ref": inner_id, "role": "inner"},
+                        ],
+                        "tags": dict(tags, type="multipolygon"),
+                    }
+                )
+            else:
+                tagged.append(
+                    {
+                        "type": "way",
+                        "id": new_way_id(),
+                        "nodes": new_ring(y0, x0, size),
+                        "tags": tags,
+                    }
+                )
+
+    # streets along the block edges
+    for row in range(blocks_per_side):
+        y = lat + (row + 0.85) * step
+        street = [
+            new_node(y, lon + col * step / 2) for col in range(2 * blocks_per_side)
+        ]
+        highway = rnd.choice(["primary", "secondary", "residential", "service"])
+        tagged.append(
+            {
+                "type": "way",
+                "id": new_way_id(),
+                "nodes": street,
+                "tags": {"highway": highway},
+            }
+        )
+
+    # Overpass emits tagged elements first, then the skeleton of their members
+    rnd.shuffle(nodes)
+    return tagged + untagged_ways + nodes
+
+
+def filter_response(features: list[dict], keyword: str) -> list[dict]:
+    """Keep what a single-keyword Overpass query would return from a response."""
+    tagged = [
+        f for f in features if f["type"] != "node" and keyword in f.get("tags", {})
+    ]
+    member_ids = {
+        m["ref"] for f in tagged if f["type"] == "relation" for m in f["members"]
+    }
+    members = [f for f in features if f["type"] == "way" and f["id"] in member_ids]
+    node_ids = {n for f in tagged + members if f["type"] == "way" for n in f["nodes"]}
+    nodes = [f for f in features if f["type"] == "node" and f["id"] in node_ids]
+    return tagged + [m for m in members if m not in tagged] + nodes
@@ -12,7 +12,7 @@ from speckle_automate import (
 )
 from specklepy.objects.other import Collection
 
-from utils.utils_osm import get_buildings, get_roads
+from utils.utils_osm import get_buildings, get_osm_features, get_roads
 from utils.utils_other import RESULT_BRANCH
 from utils.utils_png import create_image_from_bbox
 
@@ -28,11 +28,46 @@ class FunctionInputs(AutomateBase):
     radius_in_meters: float = Field(
         title="Radius in meters",
         ge=50,
-        le=1000,
+        le=3000,
         description=(
             "Radius from the Model location," " derived from Revit model lat, lon."
         ),
     )
+    building_cell_size_in_meters: float = Field(
+        default=0,
+        title="Merge buildings by grid cell (meters)",
+        ge=0,
+        le=3000,
+        description=(
+            "Size of the grid cells to merge the building meshes (and the"
+            " unioned road meshes) into, to reduce the number of objects."
+            " 0 keeps one object per building."
+        ),
+    )
+    indexed_building_meshes: bool = Field(
+        default=False,
+        title="Indexed building meshes",
+        description=(
+            "Share the vertices between the faces of building meshes"
+            " where the shading allows, and color them per object."
+        ),
+    )
+    simplify_distant_buildings: bool = Field(
+        default=False,
+        title="Simplify distant buildings",
+        description=(
+            "Simplify the building footprints more the farther they are from"
+            " the Model location, and skip small buildings at the periphery."
+        ),
+    )
+    union_road_meshes: bool = Field(
+        default=False,
+        title="Union road meshes",
+        description=(
+            "Merge the overlapping road surfaces of each class (primary,"
+            " secondary, other) into one mesh, instead of one per road."
+        ),
+    )
 
 
 def automate_function(
@@ -64,11 +99,24 @@ def automate_function(
             angle_rad = 0
 
         # get OSM buildings and roads in given area
-        building_base_objects = get_buildings(
+        osm, node_index = get_osm_features(
             lat, lon, function_inputs.radius_in_meters, angle_rad
         )
+        # drop the geometry outside of the requested circle
+        building_base_objects = get_buildings(
+            osm,
+            node_index,
+            function_inputs.radius_in_meters,
+            function_inputs.building_cell_size_in_meters or None,
+            function_inputs.indexed_building_meshes,
+            function_inputs.simplify_distant_buildings,
+        )
         roads_lines, roads_meshes = get_roads(
-            lat, lon, function_inputs.radius_in_meters, angle_rad
+            osm,
+            node_index,
+            function_inputs.radius_in_meters,
+            function_inputs.union_road_meshes,
+            function_inputs.building_cell_size_in_meters or None,
         )
 
         # create layers for buildings and roads
@@ -165,8 +213,9 @@ transport = ServerTransport(client=client, stream_id=streamId)
 #############################
 
 # get OSM buildings and roads in given area
-building_base_objects = get_buildings(lat, lon, radius_in_meters, angle_rad)
-roads_lines, roads_meshes = get_roads(lat, lon, radius_in_meters, angle_rad)
+osm, node_index = get_osm_features(lat, lon, radius_in_meters, angle_rad)
+building_base_objects = get_buildings(osm, node_index, radius_in_meters)
+roads_lines, roads_meshes = get_roads(osm, node_index, radius_in_meters)
 
 # create layers for buildings and roads
 building_layer = Collection(
@@ -0,0 +1,89 @@
+"""Unit tests for the on-disk LRU cache."""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.utils_cache import DiskCache, cache_key
+
+
+@pytest.fixture()
+def cache(tmp_path) -> DiskCache:
+    """A small cache in a temporary folder."""
+    return DiskCache(str(tmp_path / "cache"), max_bytes=10_000, ttl_seconds=60)
+
+
+def test_cache_key_is_stable():
+    """Equal parts give equal keys, the order of parts matters."""
+    assert cache_key("a", 1) == cache_key("a", 1)
+    assert cache_key("a", 1) != cache_key(1, "a")
+
+
+def test_get_set_counts_hits_and_misses(cache: DiskCache):
+    """Stored blobs come back uncompressed and lookups are counted."""
+    assert cache.get("k") is None
+    cache.set("k", b"payload" * 100)
+
+    assert cache.get("k") == b"payload" * 100
+    assert os.path.getsize(os.path.join(cache.folder, "k.gz")) < 700
+    assert cache.stats() == {
+        "hits": 1,
+        "misses": 1,
+        "evictions": 0,
+        "hit_rate": 0.5,
+    }
+
+
+def test_expired_entries_are_removed(cache: DiskCache):
+    """Entries older than the TTL are treated as misses and deleted."""
+    cache.set("k", b"payload")
+    path = os.path.join(cache.folder, "k.gz")
+    old = time.time() - 120
+    os.utime(path, (old, old))
+
+    assert cache.get("k") is None
+    assert not os.path.exists(path)
+
+
+def test_least_recently_used_entries_are_evicted(cache: DiskCache):
+    """Writing beyond max_bytes removes the entries that were not read lately."""
+    payloads = {key: os.urandom(3000) for key in "abc"}
+    for i, (key, payload) in enumerate(payloads.items()):
+        cache.set(key, payload)
+        path = os.path.join(cache.folder, f"{key}.gz")
+        os.utime(path, (time.time() - 100 + i, time.time()))
+    cache.get("a")  # "b" is now the least recently used
+
+    cache.set("d", os.urandom(3000))
+
+    assert cache.get("b") is None
+    assert cache.get("a") == payloads["a"]
+    assert cache.get("d") is not None
+    assert cache.evictions == 1
+
+
+def test_eviction_can_be_deferred_for_many_entries(cache: DiskCache):
+    """Entries stored without evicting stay until the next eviction."""
+    for key in "abcd":
+        cache.set(key, os.urandom(3000), evict=False)
+    assert cache.evictions == 0
+
+    cache.evict()
+
+    assert cache.evictions == 1
+
+
+def test_concurrent_writers_evict_safely(cache: DiskCache):
+    """Entries evicted by another thread in the meantime are skipped."""
+
+    def write(prefix: str) -> None:
+        for i in range(200):
+            cache.set(f"{prefix}{i}", os.urandom(3000))
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(write, "abcd"))
+
+    cache.evict()
+    sizes = [entry.stat().st_size for entry in os.scandir(cache.folder)]
+    assert sum(sizes) <= cache.max_bytes
@@ -0,0 +1,62 @@
+"""Unit tests for clipping projected geometry to the requested radius."""
+import math
+
+import numpy as np
+import pytest
+
+from utils.utils_clip import clip_buildings, clip_polylines
+
+
+def square(x: float, y: float, size: float) -> np.ndarray:
+    """An open ring of a square with its lower left corner at (x, y)."""
+    return np.array([(x, y), (x + size, y), (x + size, y + size), (x, y + size)])
+
+
+def test_clip_buildings_drops_footprints_outside_the_circle():
+    """Footprints touching or enclosing the circle are kept, others dropped."""
+    footprints = [
+        square(10, 10, 5),  # inside
+        square(95, -5, 10),  # crossing the circle
+        square(80, 80, 10),  # outside, although its bbox corner is within 100 m
+        square(-500, -500, 1000),  # enclosing the whole circle
+        np.empty((0, 2)),
+    ]
+
+    keep, report = clip_buildings(footprints, 100)
+
+    assert keep.tolist() == [True, True, False, True, True]
+    assert report == {"buildings": 5, "dropped": 1, "vertices_dropped": 4}
+
+
+def test_clip_polylines_cuts_at_the_circle():
+    """Roads are cut where they cross the circle, chords of a segment included."""
+    polylines = [
+        np.array([(0, 0), (200, 0)]),  # leaving the circle
+        np.array([(-200, 50), (200, 50)]),  # both ends outside
+        np.array([(200, 200), (300, 200)]),  # outside
+    ]
+
+    parts, report = clip_polylines(polylines, [False] * 3, 100)
+
+    assert [i for i, _, _ in parts] == [0, 1]
+    assert parts[0][1][-1] == pytest.approx((100, 0))
+    chord_x = math.sqrt(100**2 - 50**2)
+    assert parts[1][1] == pytest.approx(np.array([(-chord_x, 50), (chord_x, 50)]))
+    assert report["dropped"] == 1
+    assert report["length_removed"] == pytest.approx(700 - 100 - 2 * chord_x, abs=0.1)
+
+
+def test_clip_polylines_opens_cut_rings():
+    """A closed road crossing the circle becomes one open part, others stay closed."""
+    ring = square(-50, -50, 100)
+    cut_ring = square(50, -20, 100)
+
+    parts, _ = clip_polylines([ring, cut_ring], [True, True], 100)
+
+    assert parts[0][0] == 0 and parts[0][1] is ring and parts[0][2]
+    assert len(parts) == 2
+    _, coords, closed = parts[1]
+    assert not closed
+    assert (np.hypot(*coords.T) <= 100 + 1e-9).all()
+    assert coords[0][0] == pytest.approx(math.sqrt(100**2 - 80**2))
+    assert coords[-1][1] == pytest.approx(-20)
@@ -0,0 +1,50 @@
+"""Unit tests for the ear-clipping triangulation of footprints with courtyards."""
+import numpy as np
+from shapely import Polygon
+
+from utils.utils_earcut import clean_ring, earcut, triangulate_polygon
+
+
+def signed_areas(vertices: np.ndarray, triangles: np.ndarray) -> np.ndarray:
+    """Twice the signed area of each triangle, positive if counter-clockwise."""
+    a, b, c = (vertices[triangles[:, k]] for k in range(3))
+    return (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (
+        c[:, 0] - a[:, 0]
+    )
+
+
+def test_earcut_of_a_quad():
+    """The quad from the reference implementation is cut into the same triangles."""
+    assert earcut([10, 0, 0, 50, 60, 60, 70, 10]) == [1, 0, 3, 3, 2, 1]
+
+
+def test_courtyard_is_left_out_and_triangles_face_up():
+    """The triangles of a square with a hole cover its area and face up."""
+    outer = np.array([(0, 0), (0, 10), (10, 10), (10, 0)], dtype=float)  # clockwise
+    hole = np.array([(3, 3), (7, 3), (7, 7), (3, 7)], dtype=float)
+
+    vertices, triangles = triangulate_polygon(outer, [hole])
+    areas = signed_areas(vertices, triangles)
+
+    assert triangles.shape == (8, 3)
+    assert (areas > 0).all()
+    assert areas.sum() / 2 == Polygon(outer, [hole]).area
+
+
+def test_near_duplicate_vertices_are_dropped():
+    """Vertices closer than the tolerance to the previous one are merged."""
+    ring = np.array([(0, 0), (1e-5, 0), (10, 0), (10, 10), (0, 10), (0, 0)])
+
+    assert clean_ring(ring).tolist() == [[10, 0], [10, 10], [0, 10], [0, 0]]
+
+    vertices, triangles = triangulate_polygon(ring)
+
+    assert len(vertices) == 4
+    assert signed_areas(vertices, triangles).sum() / 2 == 100
+
+
+def test_degenerate_ring_gives_no_triangles():
+    """A ring collapsed to a line cannot be triangulated."""
+    vertices, triangles = triangulate_polygon(np.array([(0, 0), (5, 0), (10, 0)]))
+
+    assert triangles.shape == (0, 3)
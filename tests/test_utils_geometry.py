@@ -0,0 +1,169 @@
+"""Unit tests for extruding building footprints into meshes."""
+import numpy as np
+import shapely
+
+from utils.utils_geometry import (
+    extrude_buildings,
+    extrude_buildings_by_cell,
+    extrude_footprints,
+    road_buffers,
+    union_road_buffers,
+)
+
+SQUARE = np.array([(0, 0), (4, 0), (4, 4), (0, 4)], dtype=float)  # counter-clockwise
+COURTYARD = np.array([(1, 1), (3, 1), (3, 3), (1, 3)], dtype=float)
+
+
+def test_extruded_box_faces_out():
+    """A box has its bottom facing down, its top facing up and 4 side quads."""
+    vertices, faces, vertex_starts, face_starts, _ = extrude_footprints(
+        [SQUARE], [[]], [9]
+    )
+
+    assert vertex_starts.tolist() == [0, 24]
+    assert face_starts.tolist() == [0, 30]
+    assert faces[:10].tolist() == [4, 3, 2, 1, 0, 4, 4, 5, 6, 7]
+    assert faces[10:15].tolist() == [4, 8, 9, 10, 11]
+    assert vertices[8:12].tolist() == [[0, 0, 0], [4, 0, 0], [4, 0, 9], [0, 0, 9]]
+
+
+def test_clockwise_footprint_gives_the_same_box():
+    """The side quads of a clockwise footprint are reversed to face out as well."""
+    vertices, faces, _, _, _ = extrude_footprints([SQUARE[::-1]], [[]], [9])
+
+    assert faces[:10].tolist() == [4, 0, 1, 2, 3, 4, 7, 6, 5, 4]
+    assert vertices[8:12].tolist() == [[0, 4, 0], [0, 4, 9], [4, 4, 9], [4, 4, 0]]
+
+
+def test_batch_keeps_the_order_of_the_footprints():
+    """Each footprint gets its own mesh with local indices, or None if too short."""
+    meshes, _ = extrude_buildings(
+        [SQUARE + 10, SQUARE[:2], SQUARE], [[], [], [COURTYARD]], [3, 3, 6]
+    )
+
+    assert meshes[1] is None
+    box, courtyard = meshes[0], meshes[2]
+    assert len(box.vertices) == 3 * 24
+    assert min(box.vertices[::3]) == 10
+    # 8 triangles per cap and 4 quads per ring
+    assert len(courtyard.vertices) == 3 * (2 * 8 * 3 + 8 * 4)
+    assert max(courtyard.faces) == 2 * 8 * 3 + 8 * 4 - 1
+    assert max(courtyard.vertices[2::3]) == 6
+
+
+def test_degenerate_voids_are_dropped():
+    """Empty voids or voids with less than 3 points do not break the walls."""
+    expected = extrude_footprints([SQUARE], [[COURTYARD]], [5])
+    empty = np.empty((0, 2))
+    for voids in [[COURTYARD, empty], [empty, COURTYARD], [COURTYARD[:2], COURTYARD]]:
+        result = extrude_footprints([SQUARE], [voids], [5])
+        for array, expected_array in zip(result, expected):
+            assert np.array_equal(array, expected_array)
+
+    box = extrude_footprints([SQUARE], [[]], [5])
+    result = extrude_footprints([SQUARE], [[empty, COURTYARD[:2]]], [5])
+    for array, expected_array in zip(result, box):
+        assert np.array_equal(array, expected_array)
+
+
+def test_buildings_are_merged_by_cell():
+    """Buildings share a Mesh per cell, each with its own range of faces."""
+    footprints = [SQUARE + (120, 10), SQUARE + (10, 10), SQUARE + (30, 10), SQUARE]
+    footprints[3] = footprints[3][:2]  # too short, no geometry
+    boxes = extrude_footprints(footprints[:3], [[]] * 3, [3, 6, 9])[1]
+
+    merged, _ = extrude_buildings_by_cell(footprints, [[]] * 4, [3, 6, 9, 12], 100)
+
+    assert [(cell, indices) for cell, _, indices, _ in merged] == [
+        ((0, 0), [1, 2]),
+        ((1, 0), [0]),
+    ]
+    _, mesh, _, face_starts = merged[0]
+    assert face_starts == [0, 30, 60]
+    assert mesh.faces[:30] == boxes[30:60].tolist()  # indices within the cell
+    # a box has 6 quads, the second one follows the 24 vertices of the first
+    second = np.array(mesh.faces[30:60]).reshape(6, 5)
+    assert (second[:, 0] == 4).all()
+    assert (second[:, 1:] == boxes[60:90].reshape(6, 5)[:, 1:] + 24).all()
+    assert len(mesh.vertices) == 3 * 48
+
+
+def test_indexed_meshes_share_vertices_where_the_shading_allows():
+    """Smooth walls and triangulated caps share vertices, sharp corners do not."""
+    angles = np.linspace(0, 2 * np.pi, 24, endpoint=False)
+    tower = np.column_stack((10 * np.cos(angles), 10 * np.sin(angles)))
+    footprints = [SQUARE, tower, SQUARE]
+    voids = [[], [], [COURTYARD]]
+
+    plain, _ = extrude_buildings(footprints, voids, [3, 6, 9])
+    indexed, report = extrude_buildings(footprints, voids, [3, 6, 9], indexed=True)
+
+    # box: 4 + 4 cap vertices, and a vertical pair on each side of 4 corners
+    assert len(indexed[0].vertices) == len(plain[0].vertices) == 3 * 24
+    # tower: 24 + 24 cap vertices and a vertical pair at each vertex
+    assert len(indexed[1].vertices) == 3 * (48 + 48)
+    # courtyard: each cap has the 8 ring vertices
+    assert len(indexed[2].vertices) == 3 * (16 + 8 * 4)
+    assert indexed[1].colors == []
+    assert indexed[1].renderMaterial.diffuse < 0
+    assert report["vertices_before"] == 24 + 144 + 80
+    assert report["vertices"] == 24 + 96 + 48
+
+
+def test_road_buffers_face_up_in_the_order_of_the_roads():
+    """Each road becomes a polygon around it, or None if it has no area."""
+    roads = [
+        np.array([(0, 0), (10, 0)]),
+        np.array([(5, 5)]),
+        np.array([(10, 0), (0, 0)]),
+    ]
+
+    meshes = road_buffers(roads, [2, 2, None])
+
+    assert meshes[1:] == [None, None]
+    mesh = meshes[0].displayValue[0]
+    xy = np.array(mesh.vertices).reshape(-1, 3)[mesh.faces[1:], :2]
+    # square caps: 2 m beyond the ends, counter-clockwise
+    assert xy.min(axis=0).tolist() == [-2, -2]
+    assert xy.max(axis=0).tolist() == [12, 2]
+    area = np.sum(xy[:, 0] * np.roll(xy[:, 1], -1) - np.roll(xy[:, 0], -1) * xy[:, 1])
+    assert area / 2 == 14 * 4
+    assert meshes[0].width == 4
+
+
+def test_crossing_roads_are_unioned_per_class():
+    """Overlapping roads of a class become one Mesh covering their union."""
+    roads = [
+        np.array([(-50, 0), (50, 0)]),
+        np.array([(0, -50), (0, 50)]),
+        np.array([(-50, 20), (50, 20)]),
+    ]
+    classes = ["other", "other", "primary"]
+
+    meshes, report = union_road_buffers(roads, [2, 2, 12], classes)
+
+    assert [m.highway for m in meshes] == ["other", "primary"]
+    mesh = meshes[0].displayValue[0]
+    vertices = np.array(mesh.vertices).reshape(-1, 3)
+    triangles = vertices[np.array(mesh.faces).reshape(-1, 4)[:, 1:], :2]
+    a, b, c = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+    areas = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (
+        c[:, 0] - a[:, 0]
+    )
+    expected = shapely.union(
+        shapely.buffer(shapely.LineString(roads[0]), 2, cap_style="square"),
+        shapely.buffer(shapely.LineString(roads[1]), 2, cap_style="square"),
+    )
+    assert (areas > 0).all()
+    assert np.isclose(areas.sum() / 2, expected.area)
+    assert report["meshes_before"] == 3
+    assert report["meshes"] == 2
+
+
+def test_unioned_roads_are_cut_into_cells():
+    """With a cell size, each class gets a Mesh per grid cell it covers."""
+    roads = [np.array([(10, 10), (190, 10)])]
+
+    meshes, _ = union_road_buffers(roads, [2], ["other"], cell_size=100)
+
+    assert [m.cell for m in meshes] == [[0, 0], [1, 0]]
@@ -0,0 +1,99 @@
+"""Unit tests for the pooled HTTP client, against a fake session."""
+import io
+
+import pytest
+import requests
+
+from utils import utils_http
+from utils.utils_http import HttpClient
+
+
+def make_response(status_code: int, body: bytes = b"", headers=None):
+    """A streamed requests.Response with the given status and body."""
+    response = requests.Response()
+    response.status_code = status_code
+    response.raw = io.BytesIO(body)
+    response.headers.update(headers or {})
+    return response
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    """Don't actually wait between retries."""
+    monkeypatch.setattr(utils_http.time, "sleep", lambda seconds: None)
+
+
+def fake_session_get(monkeypatch, client: HttpClient, outcomes: list) -> list:
+    """Make the client's session return (or raise) the outcomes in order."""
+    calls = []
+
+    def get(url, **kwargs):
+        calls.append(kwargs)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(client.session, "get", get)
+    return calls
+
+
+def test_retries_transient_failures(monkeypatch):
+    """Connection errors and 429/5xx are retried, then the body is returned."""
+    client = HttpClient()
+    calls = fake_session_get(
+        monkeypatch,
+        client,
+        [
+            requests.ConnectionError("reset"),
+            make_response(503),
+            make_response(429, headers={"Retry-After": "1"}),
+            make_response(200, b"tile"),
+        ],
+    )
+
+    response = client.get("https://example.com/1.png", read_timeout=5)
+
+    assert response.content == b"tile"
+    assert len(calls) == 4
+    assert calls[0]["timeout"] == (utils_http.HTTP_CONNECT_TIMEOUT, 5)
+    assert client.summary()["retries"] == 3
+
+
+def test_gives_up_after_max_retries(monkeypatch):
+    """The last failing status is returned to the caller to handle."""
+    client = HttpClient(max_retries=2)
+    fake_session_get(monkeypatch, client, [make_response(500) for _ in range(3)])
+
+    assert client.get("https://example.com").status_code == 500
+
+
+def test_total_timeout_covers_streamed_body(monkeypatch):
+    """A body trickling in beyond the total timeout fails the request."""
+    client = HttpClient(total_timeout=10)
+    fake_session_get(monkeypatch, client, [make_response(200, b"x" * 100)])
+    clock = iter(range(1000))
+    monkeypatch.setattr(utils_http.time, "monotonic", lambda: next(clock))
+
+    response = client.get("https://example.com", stream=True)
+    with pytest.raises(requests.Timeout):
+        for _ in client.iter_content(response, chunk_size=10):
+            pass
+
+
+def test_metrics_per_request(monkeypatch):
+    """Bytes and timings are recorded for every request."""
+    client = HttpClient()
+    fake_session_get(
+        monkeypatch, client, [make_response(200, b"abc"), make_response(200, b"de")]
+    )
+
+    client.get("https://example.com/a")
+    streamed = client.get("https://example.com/b", stream=True)
+    assert b"".join(client.iter_content(streamed)) == b"de"
+
+    assert [(m.url, m.status_code, m.bytes) for m in client.metrics] == [
+        ("https://example.com/a", 200, 3),
+        ("https://example.com/b", 200, 2),
+    ]
+    assert client.summary()["bytes"] == 5
@@ -0,0 +1,53 @@
+"""Unit tests for the streaming JSON array parser."""
+import json
+
+import pytest
+
+from utils.utils_json import iter_json_array
+
+DOCUMENT = {
+    "version": 0.6,
+    "osm3s": {"copyright": "The data included in this document is from OSM."},
+    "elements": [
+        {"type": "node", "id": 1, "lat": 51.5, "lon": -0.1},
+        {"type": "way", "id": 2, "nodes": [1, 3], "tags": {"name": "Straße"}},
+        {"type": "relation", "id": 4, "members": []},
+    ],
+    "remark": "runtime error",
+}
+
+
+def chunked(data: bytes, size: int) -> list[bytes]:
+    """Split bytes into chunks of the given size."""
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 16, 10_000])
+def test_items_and_other_values_at_any_chunk_boundary(chunk_size: int):
+    """Chunk boundaries may split tokens, numbers and multi-byte characters."""
+    data = json.dumps(DOCUMENT, ensure_ascii=False, indent=1).encode("utf-8")
+    other_values = {}
+
+    items = list(iter_json_array(chunked(data, chunk_size), "elements", other_values))
+
+    assert items == DOCUMENT["elements"]
+    assert other_values == {
+        "version": 0.6,
+        "osm3s": DOCUMENT["osm3s"],
+        "remark": "runtime error",
+    }
+
+
+def test_empty_array_and_missing_array():
+    """Empty or missing arrays yield nothing."""
+    assert list(iter_json_array([b'{"elements": []}'], "elements")) == []
+    assert list(iter_json_array([b'{"version": 1}'], "elements")) == []
+    assert list(iter_json_array([b"{}"], "elements")) == []
+
+
+def test_truncated_stream_raises():
+    """A response cut off mid-way is an error, not a silently shorter list."""
+    data = json.dumps(DOCUMENT).encode()[:-40]
+
+    with pytest.raises(ValueError):
+        list(iter_json_array(chunked(data, 5), "elements"))
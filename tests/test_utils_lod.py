@@ -0,0 +1,59 @@
+"""Unit tests for the distance-based simplification of building footprints."""
+import numpy as np
+import shapely
+
+from utils.utils_lod import simplify_buildings
+
+BANDS = ((100, 0.0, 0.0), (200, 0.5, 0.0), (np.inf, 1.0, 20.0))
+
+
+def circle(x: float, y: float, radius: float, count: int = 64) -> np.ndarray:
+    """An open ring of a regular polygon around (x, y)."""
+    angles = np.linspace(0, 2 * np.pi, count, endpoint=False)
+    return np.column_stack((x + radius * np.cos(angles), y + radius * np.sin(angles)))
+
+
+def test_footprints_are_simplified_by_distance():
+    """Near footprints stay as they are, farther ones lose more vertices."""
+    footprints = [circle(0, 0, 10), circle(150, 0, 10), circle(500, 0, 10)]
+
+    simplified, _, keep, report = simplify_buildings(footprints, [[]] * 3, BANDS)
+
+    assert keep.all()
+    assert simplified[0] is footprints[0]
+    assert 3 < len(simplified[2]) < len(simplified[1]) < 64
+    assert shapely.Polygon(simplified[2]).area > 0.9 * np.pi * 10**2
+    assert [band["vertices_before"] for band in report] == [64, 64, 64]
+    assert [band["vertices"] for band in report] == [
+        64,
+        len(simplified[1]),
+        len(simplified[2]),
+    ]
+
+
+def test_small_buildings_are_dropped_at_the_periphery():
+    """Only the outer band has a minimum area."""
+    small = np.array([(0, 0), (3, 0), (3, 3), (0, 3)], dtype=float)
+    footprints = [small, small + 500]
+
+    _, _, keep, report = simplify_buildings(footprints, [[], []], BANDS)
+
+    assert keep.tolist() == [True, False]
+    assert report[2]["dropped"] == 1
+    assert report[2]["vertices"] == 0
+
+
+def test_courtyards_and_invalid_footprints_are_kept():
+    """Simplified footprints keep their voids; invalid ones are not touched."""
+    courtyard = circle(500, 0, 20)
+    void = circle(500, 0, 8)[::-1]
+    bowtie = np.array([(500, 50), (530, 80), (530, 50), (500, 80)], dtype=float)
+
+    footprints, voids, keep, _ = simplify_buildings(
+        [courtyard, bowtie], [[void], []], BANDS
+    )
+
+    assert keep.tolist() == [True, True]
+    assert len(voids[0]) == 1
+    assert shapely.Polygon(footprints[0], voids[0]).is_valid
+    assert footprints[1] is bowtie
@@ -0,0 +1,62 @@
+"""Unit tests for the cache of building cap triangulations."""
+import numpy as np
+import pytest
+
+from utils import utils_mesh_cache
+from utils.utils_cache import DiskCache
+from utils.utils_earcut import triangulate_polygon
+from utils.utils_mesh_cache import get_cached_triangulations
+
+
+def make_courtyard(vertices: int, offset: float = 0) -> tuple:
+    """A round building with a square courtyard."""
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    outer = 20 * np.column_stack((np.cos(angles), np.sin(angles))) + offset
+    inner = np.array([(-5, -5), (-5, 5), (5, 5), (5, -5)], dtype=float) + offset
+    return outer, [inner]
+
+
+@pytest.fixture(autouse=True)
+def mesh_cache(tmp_path, monkeypatch) -> DiskCache:
+    """An empty cache in a temporary folder."""
+    cache = DiskCache(str(tmp_path), max_bytes=10**6)
+    monkeypatch.setattr(utils_mesh_cache, "mesh_cache", cache)
+    return cache
+
+
+def test_triangulations_are_reused(mesh_cache: DiskCache):
+    """The second run reads the same triangles from the cache."""
+    outer, inner = make_courtyard(40)
+    _, expected = triangulate_polygon(outer, inner)
+
+    first, report = get_cached_triangulations([1], [outer], [inner])
+    assert report == {"hits": 0, "misses": 1}
+    second, report = get_cached_triangulations([1], [outer], [inner])
+    assert report == {"hits": 1, "misses": 0}
+
+    assert first[0].tolist() == second[0].tolist() == expected.tolist()
+
+
+def test_entries_are_keyed_by_building_and_shape():
+    """The same shape of the same building is a hit wherever its first vertex is."""
+    outer, inner = make_courtyard(40)
+    get_cached_triangulations([1], [outer], [inner])
+
+    moved = make_courtyard(40, offset=123.4)
+    _, report = get_cached_triangulations([1], *([c] for c in moved))
+    assert report["hits"] == 1
+    _, report = get_cached_triangulations([2], *([c] for c in moved))
+    assert report["misses"] == 1
+
+
+def test_small_and_simple_footprints_are_not_cached():
+    """Footprints without voids or with few vertices are left to the extrusion."""
+    small = make_courtyard(8)
+    large = make_courtyard(40)
+
+    triangulations, report = get_cached_triangulations(
+        [1, 2], [small[0], large[0]], [small[1], []]
+    )
+
+    assert triangulations == [None, None]
+    assert report == {"hits": 0, "misses": 0}
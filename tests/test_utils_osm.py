@@ -0,0 +1,415 @@
+"""Unit tests for OSM response parsing, run against small offline responses."""
+import json
+import math
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from utils import utils_osm, utils_osm_source
+from utils.utils_cache import DiskCache
+from utils.utils_osm import NodeIndex, OsmElements, build_node_index, get_way_coords
+from utils.utils_pyproj import ProjectionContext
+
+LAT = 51.5
+LON = -0.12
+BBOX = ((LAT - 0.001, LON - 0.001), (LAT + 0.001, LON + 0.001))
+
+
+@pytest.fixture()
+def features() -> list[dict]:
+    """A square building, a road and a node that is not part of any way."""
+    d = 0.0001
+    return [
+        {
+            "type": "way",
+            "id": 100,
+            "nodes": [1, 2, 3, 4, 1],
+            "tags": {"building": "yes", "height": "12", "name": "Town hall"},
+        },
+        {"type": "way", "id": 200, "nodes": [5, 6], "tags": {"highway": "primary"}},
+        {"type": "node", "id": 7, "lat": LAT, "lon": LON, "tags": {"amenity": "x"}},
+        {"type": "node", "id": 1, "lat": LAT, "lon": LON},
+        {"type": "node", "id": 2, "lat": LAT, "lon": LON + d},
+        {"type": "node", "id": 3, "lat": LAT + d, "lon": LON + d},
+        {"type": "node", "id": 4, "lat": LAT + d, "lon": LON},
+        {"type": "node", "id": 5, "lat": LAT, "lon": LON - d},
+        {"type": "node", "id": 6, "lat": LAT, "lon": LON + d},
+    ]
+
+
+@pytest.fixture()
+def osm(features: list[dict]) -> OsmElements:
+    """The features routed into the compact store."""
+    osm = OsmElements()
+    osm.extend(features)
+    return osm
+
+
+def test_store_keeps_only_used_tags(osm: OsmElements):
+    """Ways keep their node IDs and only the tags the builders read."""
+    assert osm.get_way(100) == ((1, 2, 3, 4, 1), {"building": "yes", "height": "12"})
+    assert len(osm.node_ids) == 7
+
+
+def test_store_is_columnar(osm: OsmElements):
+    """Way nodes are concatenated with offsets, tags are parallel columns."""
+    assert list(osm.way_ids) == [100, 200]
+    assert list(osm.way_offsets) == [0, 5, 7]
+    assert list(osm.way_nodes) == [1, 2, 3, 4, 1, 5, 6]
+    assert osm.way_tags["building"] == ["yes", None]
+    assert osm.way_tags["highway"] == [None, "primary"]
+
+    osm.add(
+        {
+            "type": "relation",
+            "id": 300,
+            "members": [
+                {"type": "way", "ref": 100, "role": "outer"},
+                {"type": "node", "ref": 7, "role": "label"},
+            ],
+            "tags": {"building": "yes", "type": "multipolygon"},
+        }
+    )
+
+    assert list(osm.get_members(0)) == [
+        (utils_osm.MEMBER_WAY, 100, utils_osm.ROLE_OUTER),
+        (utils_osm.MEMBER_NODE, 7, utils_osm.ROLE_OTHER),
+    ]
+    assert osm.relation_tags["building"] == ["yes"]
+
+
+def test_store_ignores_skeleton_repetitions(osm: OsmElements):
+    """An untagged repetition of a way (e.g. as a relation member) keeps its tags."""
+    osm.add({"type": "way", "id": 100, "nodes": [1, 2, 3, 4, 1]})
+
+    assert osm.get_way(100)[1] == {"building": "yes", "height": "12"}
+
+
+def test_build_node_index(osm: OsmElements):
+    """Every node, tagged or not, is indexed by its ID in site coordinates."""
+    node_index = build_node_index(osm, ProjectionContext(LAT, LON))
+
+    xy, found = node_index.lookup([1, 3, 99])
+
+    assert len(node_index) == 7
+    assert found.tolist() == [True, True, False]
+    assert xy[0] == pytest.approx((0, 0), abs=1e-6)
+    assert xy[1] == pytest.approx((6.95, 11.13), abs=0.05)
+
+
+def test_build_node_index_rotates_to_true_north(osm: OsmElements):
+    """The true north rotation is applied together with the reprojection."""
+    node_index = build_node_index(osm, ProjectionContext(LAT, LON, math.pi / 2))
+
+    assert get_way_coords([2], node_index)[0] == pytest.approx((0, -6.95), abs=0.05)
+
+
+def test_get_way_coords_skips_unknown_nodes(osm: OsmElements):
+    """Missing node IDs are dropped instead of failing the whole way."""
+    node_index = build_node_index(osm, ProjectionContext(LAT, LON))
+    coords = get_way_coords([1, 99, 2], node_index)
+
+    assert coords.shape == (2, 2)
+    assert coords[0][0] == pytest.approx(0, abs=1e-6)
+    assert coords[1][0] == pytest.approx(6.95, abs=0.05)
+
+
+def test_single_request_for_buildings_and_roads(osm: OsmElements, monkeypatch):
+    """Both keywords are fetched together and the builders share the response."""
+    calls = []
+
+    def fake_server(keywords, min_lat_lon, max_lat_lon):
+        calls.append(keywords)
+        return osm
+
+    monkeypatch.setattr(utils_osm, "get_features_from_osm_server", fake_server)
+
+    osm, node_index = utils_osm.get_osm_features(LAT, LON, 50, 0)
+    buildings = utils_osm.get_buildings(osm, node_index)
+    roads_lines, roads_meshes = utils_osm.get_roads(osm, node_index)
+
+    assert calls == [["building", "highway"]]
+    assert len(buildings) == 1
+    assert max(buildings[0].displayValue[0].vertices[2::3]) == 12
+    assert len(roads_lines) == 1
+    assert len(roads_lines[0].as_points()) == 2
+    assert len(roads_meshes) == 1
+
+
+class FakeClient:
+    """HTTP client streaming a fixed Overpass response in small chunks."""
+
+    def __init__(self, data: dict) -> None:
+        """Answer every request with data as JSON."""
+        self.content = json.dumps(data).encode()
+        self.requests = []
+
+    def get(self, url, params, **kwargs):
+        """Record the query and answer it."""
+        self.requests.append(params["data"])
+        return SimpleNamespace(status_code=200, content=self.content)
+
+    def iter_content(self, response, chunk_size):
+        """Stream the response in chunks of 7 bytes."""
+        for i in range(0, len(self.content), 7):
+            yield self.content[i : i + 7]
+
+    def summary(self):
+        """No transfer statistics."""
+        return {}
+
+
+def test_overpass_responses_are_streamed_and_cached(
+    features: list[dict], monkeypatch, tmp_path
+):
+    """A repeated query for the same area is answered from the disk cache."""
+    client = FakeClient({"version": 0.6, "elements": features})
+    monkeypatch.setattr(utils_osm_source, "http_client", client)
+    monkeypatch.setattr(
+        utils_osm_source, "overpass_cache", DiskCache(str(tmp_path), max_bytes=10**6)
+    )
+
+    first = utils_osm.get_features_from_osm_server(["highway", "building"], *BBOX)
+    second = utils_osm.get_features_from_osm_server(["building", "highway"], *BBOX)
+
+    assert list(first.way_ids) == list(second.way_ids) == [100, 200]
+    assert first.get_way(100) == second.get_way(100)
+    assert list(second.node_ids) == [7, 1, 2, 3, 4, 5, 6]
+    assert len(client.requests) == 1
+    assert utils_osm_source.overpass_cache.stats()["hits"] == 1
+
+
+def test_incomplete_responses_are_not_cached(
+    features: list[dict], monkeypatch, tmp_path
+):
+    """Partial results (reported in "remark") are used once but never cached."""
+    client = FakeClient(
+        {"elements": features, "remark": "runtime error: Query timed out"}
+    )
+    monkeypatch.setattr(utils_osm_source, "http_client", client)
+    monkeypatch.setattr(
+        utils_osm_source, "overpass_cache", DiskCache(str(tmp_path), max_bytes=10**6)
+    )
+
+    osm = utils_osm.get_features_from_osm_server(["building"], *BBOX)
+
+    assert 100 in osm.way_rows
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_corrupted_responses_are_fetched_again(
+    features: list[dict], monkeypatch, tmp_path
+):
+    """A truncated cache entry fails once and is removed, then fetched again."""
+    client = FakeClient({"elements": features})
+    monkeypatch.setattr(utils_osm_source, "http_client", client)
+    monkeypatch.setattr(
+        utils_osm_source, "overpass_cache", DiskCache(str(tmp_path), max_bytes=10**6)
+    )
+    utils_osm.get_features_from_osm_server(["building"], *BBOX)
+    (entry,) = tmp_path.iterdir()
+    entry.write_bytes(entry.read_bytes()[: entry.stat().st_size // 2])
+
+    with pytest.raises(EOFError):
+        utils_osm.get_features_from_osm_server(["building"], *BBOX)
+    assert list(tmp_path.iterdir()) == []
+    assert utils_osm_source.overpass_cache.stats()["hits"] == 0
+
+    osm = utils_osm.get_features_from_osm_server(["building"], *BBOX)
+    assert 100 in osm.way_rows
+    assert len(client.requests) == 2
+
+
+def test_overpass_counts_are_cached(monkeypatch, tmp_path):
+    """The element count of an area is asked only once, warm runs stay offline."""
+    client = FakeClient({"elements": [{"type": "count", "tags": {"total": "42"}}]})
+    monkeypatch.setattr(utils_osm_source, "http_client", client)
+    monkeypatch.setattr(
+        utils_osm_source, "overpass_cache", DiskCache(str(tmp_path), max_bytes=10**6)
+    )
+    source = utils_osm_source.OverpassDataSource()
+
+    assert source.count_elements(["building"], *BBOX) == 42
+    assert source.count_elements(["building"], *BBOX) == 42
+    assert len(client.requests) == 1
+
+
+def test_stitch_ways_joins_members_in_any_direction():
+    """Open ways sharing end nodes are joined, reversing them where needed."""
+    rings, chains = utils_osm.stitch_ways(
+        [(1, 2, 3), (5, 4, 3), (5, 6, 1), (7, 8), (8, 9), (10, 11, 10)]
+    )
+
+    assert rings == [[1, 2, 3, 4, 5, 6, 1]]
+    assert chains == [[9, 8, 7]] or chains == [[7, 8, 9]]
+
+
+def test_stitch_ways_drops_degenerate_rings():
+    """Rings need at least 3 distinct nodes, unclosable parts stay open chains."""
+    rings, chains = utils_osm.stitch_ways([(1, 2, 1), (3,), (4, 5, 6)])
+
+    assert rings == []
+    assert chains == [[4, 5, 6]]
+
+
+def test_multipolygon_rings_are_stitched():
+    """Outer rings split into several ways become one building with its courtyard."""
+    d = 0.0001
+    # node IDs of a 4x4 grid of points, d apart
+    grid = {(i, j): 10 * i + j + 1 for i in range(4) for j in range(4)}
+    features = [
+        {"type": "node", "id": n, "lat": LAT + i * d, "lon": LON + j * d}
+        for (i, j), n in grid.items()
+    ]
+    border = [(0, 0), (0, 1), (0, 2), (0, 3), (1, 3), (2, 3), (3, 3)]
+    border += [(3, 2), (3, 1), (3, 0), (2, 0), (1, 0), (0, 0)]
+    outer = [grid[p] for p in border]
+    inner = [grid[p] for p in [(1, 1), (1, 2), (2, 2), (2, 1), (1, 1)]]
+    features += [
+        # the outer ring is split in two, the second way runs backwards
+        {"type": "way", "id": 1, "nodes": outer[:7]},
+        {"type": "way", "id": 2, "nodes": outer[6:][::-1]},
+        {"type": "way", "id": 3, "nodes": inner},
+        {
+            "type": "relation",
+            "id": 10,
+            "members": [
+                {"type": "way", "ref": 1, "role": "outer"},
+                {"type": "way", "ref": 3, "role": "inner"},
+                {"type": "way", "ref": 2, "role": "outer"},
+            ],
+            "tags": {"building": "yes", "type": "multipolygon"},
+        },
+    ]
+    osm = OsmElements()
+    osm.extend(features)
+    node_index = build_node_index(osm, ProjectionContext(LAT, LON))
+
+    buildings = utils_osm.get_buildings(osm, node_index)
+
+    assert len(buildings) == 1
+    faces = buildings[0].displayValue[0].faces
+    triangles = 0
+    i = 0
+    while i < len(faces):
+        triangles += faces[i] == 3
+        i += faces[i] + 1
+    # both caps of the 12-vertex outer ring around the 4-vertex courtyard
+    assert triangles == 2 * 16
+
+
+def test_assign_inner_rings_to_containing_outer():
+    """With several outer rings, each inner ring goes to the one around it."""
+    node_index = NodeIndex(
+        np.arange(1, 12),
+        [
+            (0, 0),
+            (10, 0),
+            (10, 10),
+            (0, 10),
+            (20, 0),
+            (30, 0),
+            (30, 10),
+            (20, 10),
+            (22, 2),
+            (28, 2),
+            (25, 8),
+        ],
+    )
+    outer_rings = [[1, 2, 3, 4, 1], [5, 6, 7, 8, 5]]
+    inner_rings = [[9, 10, 11, 9]]
+
+    groups = utils_osm.assign_inner_rings(outer_rings, inner_rings, node_index)
+
+    assert groups == [[], [[9, 10, 11, 9]]]
+
+
+def test_merge_skips_elements_already_stored(features: list[dict], osm: OsmElements):
+    """Elements on chunk borders are returned twice, but stored once."""
+    other = OsmElements()
+    other.extend(features[1:])
+    other.add({"type": "way", "id": 100, "nodes": [1, 2, 3, 4, 1]})
+    other.add({"type": "node", "id": 8, "lat": LAT, "lon": LON})
+
+    osm.merge(other)
+
+    assert list(osm.node_ids) == [7, 1, 2, 3, 4, 5, 6, 8]
+    assert len(osm.node_lats) == len(osm.node_lons) == 8
+    assert osm.get_way(100)[1] == {"building": "yes", "height": "12"}
+
+
+class FakeSource(utils_osm_source.OsmDataSource):
+    """Data source returning the same features for every bbox."""
+
+    def __init__(self, features: list[dict], count: int) -> None:
+        """Report count elements for any area."""
+        self.features = features
+        self.count = count
+        self.bboxes = []
+
+    def count_elements(self, keywords, min_lat_lon, max_lat_lon):
+        """Get the fixed element count."""
+        return self.count
+
+    def iter_elements(self, keywords, min_lat_lon, max_lat_lon):
+        """Record the bbox and yield the features."""
+        self.bboxes.append((min_lat_lon, max_lat_lon))
+        yield from self.features
+
+
+def test_large_areas_are_fetched_in_chunks(features: list[dict], osm: OsmElements):
+    """The element count sets the grid, the chunks are merged without duplicates."""
+    source = FakeSource(features, count=3 * utils_osm.OSM_CHUNK_MAX_ELEMENTS)
+    bbox = ((LAT - 0.01, LON - 0.01), (LAT + 0.01, LON + 0.01))
+
+    chunked = utils_osm.get_features_from_osm_server(
+        ["building"], *bbox, data_source=source
+    )
+
+    assert len(source.bboxes) == 4
+    assert sorted(source.bboxes)[0] == (bbox[0], (LAT, LON))
+    assert sorted(source.bboxes)[-1] == ((LAT, LON), bbox[1])
+    assert list(chunked.node_ids) == list(osm.node_ids)
+    assert list(chunked.way_ids) == list(osm.way_ids)
+    assert list(chunked.way_nodes) == list(osm.way_nodes)
+    assert chunked.way_tags == osm.way_tags
+
+
+def test_small_areas_are_fetched_at_once(features: list[dict]):
+    """No element count is needed for areas below the chunking size."""
+    source = FakeSource(features, count=None)
+    source.count_elements = None  # must not be called
+
+    utils_osm.get_features_from_osm_server(["building"], *BBOX, data_source=source)
+
+    assert source.bboxes == [BBOX]
+
+
+def test_data_sources_implement_the_whole_interface():
+    """A data source missing a method fails when it is created, not mid-fetch."""
+
+    class PartialSource(utils_osm_source.OsmDataSource):
+        def iter_elements(self, keywords, min_lat_lon, max_lat_lon):
+            yield from []
+
+    with pytest.raises(TypeError):
+        PartialSource()
+
+
+@pytest.mark.parametrize(
+    "tags, height",
+    [
+        ({"height": "12;15"}, 12),
+        ({"height": "tall", "building:levels": "4"}, 9),
+        ({"building:levels": "4"}, 12),
+        ({"layer": "1"}, 9),
+        ({}, 9),
+    ],
+)
+def test_get_building_height(tags: dict, height: float):
+    """The height tag wins over levels (3 m each), else a default of 9 m."""
+    osm = OsmElements()
+    osm.add({"type": "way", "id": 1, "nodes": [], "tags": {"building": "yes", **tags}})
+
+    assert utils_osm.get_building_height(osm.way_tags, 0) == height
@@ -0,0 +1,118 @@
+"""Unit tests for the local OSM extract data source, run against a tiny .osm file."""
+import os
+
+import pytest
+
+from utils import utils_osm
+from utils.utils_osm_extract import LocalExtractDataSource
+
+LAT = 51.5
+LON = -0.12
+BBOX = ((LAT - 0.001, LON - 0.001), (LAT + 0.001, LON + 0.001))
+
+OSM_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="51.5" lon="-0.12"/>
+  <node id="2" lat="51.5" lon="-0.1199"/>
+  <node id="3" lat="51.5001" lon="-0.1199"/>
+  <node id="4" lat="51.5001" lon="-0.12"/>
+  <node id="5" lat="51.5002" lon="-0.1201"/>
+  <node id="6" lat="51.5002" lon="-0.1197"/>
+  <node id="7" lat="51.5004" lon="-0.1197"/>
+  <node id="8" lat="51.5004" lon="-0.1201"/>
+  <node id="9" lat="51.6" lon="-0.12"/>
+  <node id="10" lat="51.6" lon="-0.1199"/>
+  <way id="100">
+    <nd ref="1"/><nd ref="2"/><nd ref="3"/><nd ref="4"/><nd ref="1"/>
+    <tag k="building" v="yes"/><tag k="height" v="9"/>
+  </way>
+  <way id="200">
+    <nd ref="1"/><nd ref="2"/>
+    <tag k="highway" v="residential"/>
+  </way>
+  <way id="300">
+    <nd ref="5"/><nd ref="6"/><nd ref="7"/><nd ref="8"/><nd ref="5"/>
+  </way>
+  <way id="400">
+    <nd ref="9"/><nd ref="10"/>
+    <tag k="highway" v="primary"/>
+  </way>
+  <relation id="500">
+    <member type="way" ref="300" role="outer"/>
+    <tag k="type" v="multipolygon"/><tag k="building" v="yes"/>
+  </relation>
+</osm>
+"""
+
+
+@pytest.fixture()
+def extract_path(tmp_path) -> str:
+    """A small extract with a building, two roads and a multipolygon building."""
+    path = tmp_path / "site.osm"
+    path.write_text(OSM_XML)
+    return str(path)
+
+
+def test_extract_elements_follow_overpass_layout(extract_path: str):
+    """Tagged elements in the bbox come first, then member ways and nodes untagged."""
+    source = LocalExtractDataSource(extract_path)
+    elements = list(source.iter_elements(["building", "highway"], *BBOX))
+
+    assert [(e["type"], e["id"]) for e in elements[:4]] == [
+        ("way", 100),
+        ("way", 200),
+        ("relation", 500),
+        ("way", 300),
+    ]
+    assert "tags" not in elements[3]
+    assert [e["id"] for e in elements[4:]] == [1, 2, 3, 4, 5, 6, 7, 8]
+
+
+def test_extract_index_is_reused_until_the_extract_changes(extract_path: str):
+    """The spatial index is built once and rebuilt when the extract is modified."""
+    first = LocalExtractDataSource(extract_path)
+    list(first.iter_elements(["building"], *BBOX))
+    second = LocalExtractDataSource(extract_path)
+    list(second.iter_elements(["building"], *BBOX))
+
+    assert first.stats()["index_built"]
+    assert not second.stats()["index_built"]
+
+    with open(extract_path, "a") as f:
+        f.write("\n")
+    stat = os.stat(extract_path)
+    os.utime(extract_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    third = LocalExtractDataSource(extract_path)
+    list(third.iter_elements(["building"], *BBOX))
+
+    assert third.stats()["index_built"]
+
+
+def test_extract_feeds_the_builders(extract_path: str, monkeypatch):
+    """The builders produce the same objects from an extract as from Overpass."""
+    monkeypatch.setenv("OSM_EXTRACT_PATH", extract_path)
+
+    osm, node_index = utils_osm.get_osm_features(LAT, LON, 100, 0)
+    buildings = utils_osm.get_buildings(osm, node_index)
+    roads_lines, roads_meshes = utils_osm.get_roads(osm, node_index)
+
+    assert len(buildings) == 2
+    assert len(roads_lines) == 1
+    assert len(roads_meshes) == 1
+
+
+def test_pbf_extract_gives_the_same_elements(extract_path: str, tmp_path):
+    """A .osm.pbf extract is indexed like the same data as .osm."""
+    osmium = pytest.importorskip("osmium")
+    pbf_path = str(tmp_path / "site.osm.pbf")
+    with osmium.SimpleWriter(pbf_path) as writer:
+        for element in osmium.FileProcessor(extract_path):
+            writer.add(element)
+
+    xml_source = LocalExtractDataSource(extract_path)
+    pbf_source = LocalExtractDataSource(pbf_path)
+
+    keywords = ["building", "highway"]
+    assert list(pbf_source.iter_elements(keywords, *BBOX)) == list(
+        xml_source.iter_elements(keywords, *BBOX)
+    )
@@ -0,0 +1,81 @@
+"""Unit tests for the helpers in utils_other."""
+import random
+from copy import copy
+
+import pytest
+
+from benchmarks.overpass_sample import make_overpass_response
+from utils.utils_other import split_by_repeated_values
+
+
+def legacy_fill_list(vals: list, lsts: list) -> list[list]:
+    """The former recursive splitter, as a reference."""
+    if len(vals) > 1:
+        lsts.append([])
+    else:
+        return
+
+    for i, v in enumerate(vals):
+        if v not in lsts[len(lsts) - 1]:
+            lsts[len(lsts) - 1].append(v)
+        else:
+            if len(lsts[len(lsts) - 1]) <= 1:
+                lsts.pop(len(lsts) - 1)
+            vals = copy(vals[i - 1 :])
+            lsts = legacy_fill_list(vals, lsts)
+    return lsts
+
+
+def legacy_split(vals: list) -> list[list] | None:
+    """Output of the former splitter, None where it failed."""
+    try:
+        return legacy_fill_list(list(vals), [])
+    except (TypeError, RecursionError):
+        return None
+
+
+@pytest.mark.parametrize(
+    "vals, lsts",
+    [
+        ([1, 2, 3, 1], [[1, 2, 3], [3, 1]]),
+        ([1, 2, 3, 4, 2], [[1, 2, 3, 4], [4, 2]]),
+        # the former splitter failed on these
+        ([1, 2, 3, 4, 2, 5], [[1, 2, 3, 4], [4, 2, 5]]),
+        ([1, 2, 1, 2, 1], [[1, 2], [2, 1], [1, 2], [2, 1]]),
+        ([1, 2, 2, 3], [[1, 2, 3]]),
+        ([1, 1], []),
+    ],
+)
+def test_split_by_repeated_values(vals: list, lsts: list):
+    """A repeated value starts a new list from the previous value."""
+    assert split_by_repeated_values(vals) == lsts
+
+
+def test_split_matches_the_former_splitter():
+    """Where the former splitter worked, the lists are the same."""
+    rnd = random.Random(0)
+    ways = [
+        [f["nodes"] for f in make_overpass_response(8) if f["type"] == "way"],
+        # closed loops and lollipops of random node ids
+        [[rnd.randint(0, 50) for _ in range(rnd.randint(2, 30))] for _ in range(2000)],
+    ]
+    compared = 0
+    for nodes in ways[0] + ways[1]:
+        expected = legacy_split(nodes)
+        if expected is not None and len(set(nodes)) < len(nodes):
+            assert split_by_repeated_values(nodes) == expected
+            compared += 1
+
+    assert compared > 100
+
+
+def test_split_long_loops_without_recursion():
+    """Ways repeating many nodes do not hit the recursion limit."""
+    nodes = list(range(5000)) * 3
+
+    lsts = split_by_repeated_values(nodes)
+
+    assert len(lsts) == 4
+    # consecutive lists share an end
+    assert sum(len(lst) for lst in lsts) == 15000 + 3
+    assert all(a[-1] == b[0] for a, b in zip(lsts, lsts[1:]))
@@ -0,0 +1,58 @@
+"""Unit tests for the process pool used for meshing."""
+import numpy as np
+
+from utils import utils_parallel
+from utils.utils_geometry import extrude_buildings, road_buffers
+from utils.utils_parallel import get_cpu_quota, map_batches, split_batches
+
+SQUARE = np.array([(0, 0), (4, 0), (4, 4), (0, 4)], dtype=float)
+
+
+def test_batches_cover_the_items_in_order():
+    """Batches are contiguous, in order and never empty, except for no items."""
+    batches = split_batches(10, 2)
+
+    assert [i for batch in batches for i in range(10)[batch]] == list(range(10))
+    assert all(batch.stop > batch.start for batch in batches)
+    assert split_batches(0, 4) == [slice(0, 0)]
+
+
+def test_pool_returns_the_results_in_input_order():
+    """The batches give the same results in a process pool as in this process."""
+    batches = [(np.arange(i, i + 3),) for i in range(6)]
+
+    serial = map_batches(np.cumsum, batches, 1)
+    pooled = map_batches(np.cumsum, batches, 2)
+
+    assert [r.tolist() for r in pooled] == [r.tolist() for r in serial]
+
+
+def test_cpu_quota_from_cgroup_v2(tmp_path, monkeypatch):
+    """The quota is the CPU time per period, None without a limit."""
+    cpu_max = tmp_path / "cpu.max"
+    monkeypatch.setattr(utils_parallel, "CGROUP_V2_CPU_MAX", str(cpu_max))
+    monkeypatch.setattr(utils_parallel, "CGROUP_V1_CPU_QUOTA", str(tmp_path / "x"))
+
+    cpu_max.write_text("250000 100000\n")
+    assert get_cpu_quota() == 2.5
+    cpu_max.write_text("max 100000\n")
+    assert get_cpu_quota() is None
+
+
+def test_parallel_meshing_gives_the_same_meshes():
+    """Buildings and roads meshed by several processes match the serial ones."""
+    footprints = [SQUARE + (10 * i, 0) for i in range(20)]
+    serial, _ = extrude_buildings(footprints, [[]] * 20, [3 + i for i in range(20)])
+    pooled, _ = extrude_buildings(
+        footprints, [[]] * 20, [3 + i for i in range(20)], workers=2
+    )
+    assert [(m.vertices, m.faces) for m in pooled] == [
+        (m.vertices, m.faces) for m in serial
+    ]
+
+    roads = [np.array([(0, i), (20, i + 5)], dtype=float) for i in range(20)]
+    serial = road_buffers(roads, [2] * 20, 8)
+    pooled = road_buffers(roads, [2] * 20, 8, workers=2)
+    assert [b.displayValue[0].vertices for b in pooled] == [
+        b.displayValue[0].vertices for b in serial
+    ]
@@ -0,0 +1,66 @@
+"""Unit tests for rendering the basemap from tiles."""
+import numpy as np
+import png
+
+from utils import utils_png
+from utils.utils_png import (
+    add_copyright_text,
+    read_png_colors,
+    render_mosaic,
+    writePng,
+)
+
+
+def test_box_filter_stays_within_each_tile():
+    """Pixels are the quantized mean of their 3x3 window, clamped to their tile."""
+    mosaic = np.zeros((4, 8, 3), dtype=np.uint8)  # two 4x4 tiles side by side
+    mosaic[:, 4:] = 90
+    mosaic[1, 1] = 9 * 11
+
+    image = render_mosaic(
+        mosaic,
+        column_tiles=np.array([0, 4, 4]),
+        column_pixels=np.array([1, 0, 3]),
+        row_tiles=np.array([0]),
+        row_pixels=np.array([0]),
+        w=4,
+        h=4,
+    )
+
+    # 9 * 11 / 9 = 11, quantized to 10; the right tile never sees the left one
+    assert image[0, :, 0].tolist() == [10, 90, 90]
+
+
+def test_png_is_written_from_an_array(tmp_path):
+    """The image array round-trips through the PNG file."""
+    image = np.random.default_rng(0).integers(0, 256, (5, 7, 3), dtype=np.uint8)
+    path = str(tmp_path / "map.png")
+
+    writePng(image.reshape(5, -1), path)
+
+    assert png.Reader(filename=path).read()[:2] == (7, 5)
+    assert (read_png_colors(path) == image).all()
+
+
+def test_png_is_written_from_a_row_generator(tmp_path, monkeypatch):
+    """Rows streamed in several blocks decode to the same image."""
+    monkeypatch.setattr(utils_png, "PNG_BLOCK_ROWS", 4)
+    x, y = np.meshgrid(np.arange(9), np.arange(10))
+    image = np.stack((x * 20, y * 20, (x * y) % 256), axis=2).astype(np.uint8)
+    path = str(tmp_path / "map.png")
+
+    rows = (row.reshape(-1).tolist() for row in image)
+    writePng(rows, path, width=9, height=10, compression_level=1)
+
+    assert (read_png_colors(path) == image).all()
+
+
+def test_copyright_bar_is_added_below():
+    """The notice is a white bar with dark text, as wide as the image."""
+    image = np.zeros((10, 1000, 3), dtype=np.uint8)
+
+    image = add_copyright_text(image, width=1000)
+
+    assert image.shape[1:] == (1000, 3)
+    bar = image[10:]
+    assert len(bar) > 0 and (bar[:, 0] == 255).all() and (bar < 100).any()
@@ -0,0 +1,125 @@
+"""Unit tests for the persistent cache of map tiles."""
+import io
+import time
+from types import SimpleNamespace
+
+import png
+import pytest
+
+from utils import utils_tiles
+from utils.utils_cache import DiskCache
+from utils.utils_tiles import TokenBucket
+
+
+def make_tile(value: int) -> bytes:
+    """A 4x4 palette PNG of a single color."""
+    f = io.BytesIO()
+    writer = png.Writer(4, 4, palette=[(value, value, value)], bitdepth=8)
+    writer.write(f, [[0] * 4] * 4)
+    return f.getvalue()
+
+
+class FakeTileServer:
+    """Tile server answering with a fixed tile, or 304 if the ETag matches."""
+
+    def __init__(self, tile: bytes, max_age: int = 3600) -> None:
+        """Serve the tile with a max-age in seconds."""
+        self.tile = tile
+        self.max_age = max_age
+        self.requests = []
+
+    def get(self, url, headers, **kwargs):
+        """Record the request headers and answer with the tile or a 304."""
+        self.requests.append(headers)
+        response_headers = {
+            "ETag": '"v1"',
+            "Cache-Control": f"max-age={self.max_age}",
+        }
+        if headers.get("If-None-Match") == '"v1"':
+            return SimpleNamespace(status_code=304, headers=response_headers)
+        return SimpleNamespace(
+            status_code=200, headers=response_headers, content=self.tile
+        )
+
+
+@pytest.fixture()
+def server(monkeypatch, tmp_path) -> FakeTileServer:
+    """A fake tile server and an empty tile cache."""
+    server = FakeTileServer(make_tile(200))
+    monkeypatch.setattr(utils_tiles, "http_client", server)
+    monkeypatch.setattr(
+        utils_tiles, "tile_cache", DiskCache(str(tmp_path), max_bytes=10**6)
+    )
+    return server
+
+
+def test_fresh_tiles_are_not_requested_again(server: FakeTileServer):
+    """A tile within its max-age is read from the cache only."""
+    first, status = utils_tiles.get_tile_colors(18, 1, 2, "test")
+    assert status == "downloaded"
+    second, status = utils_tiles.get_tile_colors(18, 1, 2, "test")
+    assert status == "cached"
+
+    assert len(server.requests) == 1
+    assert (first == second).all() and first.shape == (4, 4, 3)
+    assert (first == 200).all()
+
+
+def test_expired_tiles_are_revalidated(server: FakeTileServer):
+    """An expired tile is requested with its ETag and kept on a 304."""
+    server.max_age = 0
+    utils_tiles.get_tile_colors(18, 1, 2, "test")
+    colors, status = utils_tiles.get_tile_colors(18, 1, 2, "test")
+
+    assert status == "revalidated"
+    assert server.requests[-1]["If-None-Match"] == '"v1"'
+    assert (colors == 200).all()
+
+
+def test_decoded_colors_can_be_cached(server: FakeTileServer, monkeypatch):
+    """With TILE_CACHE_DECODED, the colors are kept next to the PNG data."""
+    monkeypatch.setattr(utils_tiles, "TILE_CACHE_DECODED", True)
+    utils_tiles.get_tile_colors(18, 1, 2, "test")
+    monkeypatch.setattr(utils_tiles, "decode_png_colors", None)  # not called again
+
+    colors, _ = utils_tiles.get_tile_colors(18, 1, 2, "test")
+
+    assert colors.shape == (4, 4, 3) and (colors == 200).all()
+
+
+def test_max_age_falls_back_to_expires_and_default():
+    """The server's max-age wins over Expires, the default applies without both."""
+    assert utils_tiles.get_max_age({"Cache-Control": "public, max-age=60"}) == 60
+    expires = {"Expires": "Thu, 01 Jan 1970 00:00:00 GMT"}
+    assert utils_tiles.get_max_age(expires) < 0
+    assert utils_tiles.get_max_age({}) == utils_tiles.TILE_CACHE_MAX_AGE
+
+
+def test_tiles_are_returned_in_grid_order(server: FakeTileServer, monkeypatch):
+    """Tiles fetched by several threads come back as rows of columns."""
+    monkeypatch.setattr(utils_tiles, "tile_rate_limiter", TokenBucket(1000, 100))
+    requested = []
+    fetch = utils_tiles.fetch_tile
+
+    def fetch_tile(zoom, x, y, user_agent):
+        requested.append((x, y))
+        return fetch(zoom, x, y, user_agent)
+
+    monkeypatch.setattr(utils_tiles, "fetch_tile", fetch_tile)
+
+    tiles = utils_tiles.get_tiles(18, [5, 6, 7], [1, 2], "test")
+
+    assert [len(row) for row in tiles] == [3, 3]
+    assert sorted(requested) == [(x, y) for x in (5, 6, 7) for y in (1, 2)]
+    assert all(status == "downloaded" for row in tiles for _, status in row)
+
+
+def test_token_bucket_limits_the_rate():
+    """After the burst, requests wait for the tokens added at the rate."""
+    bucket = TokenBucket(rate=100, capacity=2)
+    start = time.monotonic()
+
+    waits = [bucket.acquire() for _ in range(6)]
+
+    assert waits[:2] == [0.0, 0.0]
+    assert time.monotonic() - start >= 0.035  # 4 tokens at 100 per second
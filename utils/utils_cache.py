@@ -0,0 +1,178 @@
+import gzip
+import hashlib
+import os
+import tempfile
+import time
+
+CACHE_FOLDER = os.getenv(
+    "AUTOMATE_CACHE_FOLDER",
+    os.path.join(os.path.abspath(tempfile.gettempdir()), "automate_cache"),
+)
+
+
+def cache_key(*parts) -> str:
+    """Create a file-safe cache key from any number of (string-convertible) parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """Gzip-compressed blobs in a local folder, with TTL and size-bounded LRU eviction.
+
+    Entry age (for TTL) is tracked by file modification time and recency
+    (for LRU) by file access time, which is bumped explicitly on every hit.
+    """
+
+    def __init__(
+        self,
+        folder: str,
+        max_bytes: int,
+        ttl_seconds: float | None = None,
+        compress_level: int = 9,
+    ) -> None:
+        """Set up the cache, the folder is only created on first write."""
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.compress_level = compress_level
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.folder, f"{key}.gz")
+
+    def open(self, key: str) -> gzip.GzipFile | None:
+        """Open the blob stored under the key for streamed reading (None on a miss)."""
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        now = time.time()
+        if self.ttl_seconds is not None and now - stat.st_mtime > self.ttl_seconds:
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        try:
+            f = gzip.open(path, "rb")
+        except FileNotFoundError:  # removed in the meantime
+            self.misses += 1
+            return None
+
+        os.utime(path, (now, stat.st_mtime))  # mark as recently used
+        self.hits += 1
+        return f
+
+    def get(self, key: str) -> bytes | None:
+        """Get the uncompressed blob stored under the key, or None on a miss."""
+        f = self.open(key)
+        if f is None:
+            return None
+        try:
+            with f:
+                return f.read()
+        except (OSError, EOFError):  # corrupted entry
+            self.invalidate(key)
+            return None
+
+    def invalidate(self, key: str) -> None:
+        """Remove a corrupted entry found by a hit, counting it as a miss."""
+        self._remove(self._path(key))
+        self.hits -= 1
+        self.misses += 1
+
+    def writer(self, key: str) -> "CacheWriter":
+        """Start writing a blob under the key in chunks."""
+        os.makedirs(self.folder, exist_ok=True)
+        return CacheWriter(self, key)
+
+    def set(self, key: str, data: bytes, evict: bool = True) -> None:
+        """Store the blob under the key and evict least recently used entries.
+
+        When storing many entries at once, pass evict=False and call evict
+        once afterwards.
+        """
+        writer = self.writer(key)
+        writer.write(data)
+        writer.commit(evict)
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache fits into max_bytes."""
+        entries = []
+        total_bytes = 0
+        if not os.path.isdir(self.folder):
+            return
+        for entry in os.scandir(self.folder):
+            if not entry.name.endswith(".gz"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:  # evicted by another writer in the meantime
+                continue
+            entries.append((stat.st_atime, stat.st_size, entry.path))
+            total_bytes += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            self._remove(path)
+            total_bytes -= size
+            self.evictions += 1
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> dict:
+        """Get hit/miss statistics of this cache instance."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class CacheWriter:
+    """Chunked writer of a cache entry, visible to readers once committed."""
+
+    def __init__(self, cache: DiskCache, key: str) -> None:
+        """Compress into a temporary file next to the final entry."""
+        self.cache = cache
+        self.key = key
+        fd, self.temp_path = tempfile.mkstemp(dir=cache.folder, suffix=".tmp")
+        self.file = gzip.GzipFile(
+            fileobj=os.fdopen(fd, "wb"), mode="wb", compresslevel=cache.compress_level
+        )
+
+    def write(self, data: bytes) -> None:
+        """Append a chunk to the entry."""
+        self.file.write(data)
+
+    def commit(self, evict: bool = True) -> None:
+        """Publish the entry and evict least recently used entries."""
+        self._close()
+        os.replace(self.temp_path, self.cache._path(self.key))
+        if evict:
+            self.cache.evict()
+
+    def discard(self) -> None:
+        """Drop the entry, e.g. if the response turned out to be incomplete."""
+        self._close()
+        self.cache._remove(self.temp_path)
+
+    def _close(self) -> None:
+        fileobj = self.file.fileobj
+        self.file.close()
+        fileobj.close()
@@ -0,0 +1,165 @@
+import numpy as np
+
+
+def flatten_coords(coords_lists: list[np.ndarray]) -> tuple[np.ndarray]:
+    """Stack (n, 2) coord arrays into one array, with their starts and counts."""
+    counts = np.array([len(coords) for coords in coords_lists], dtype=np.int64)
+    starts = np.zeros(len(counts), dtype=np.int64)
+    np.cumsum(counts[:-1], out=starts[1:])
+    xy = np.concatenate(
+        [np.asarray(coords, dtype=np.float64).reshape(-1, 2) for coords in coords_lists]
+        or [np.empty((0, 2))]
+    )
+
+    return xy, starts, counts
+
+
+def footprints_within_radius(footprints: list[np.ndarray], radius: float) -> np.ndarray:
+    """Flag the footprints (rings around the site origin) touching the circle.
+
+    A footprint is outside only if all of its edges are farther than the
+    radius from the origin and it does not enclose the origin either.
+    """
+    keep = np.ones(len(footprints), dtype=bool)
+    xy, starts, counts = flatten_coords(footprints)
+    valid = counts > 0
+    if not valid.any():
+        return keep
+    starts = starts[valid]
+    ends = starts + counts[valid]
+
+    # each vertex with the next one of its ring
+    next_index = np.arange(1, len(xy) + 1)
+    next_index[ends - 1] = starts
+    a = xy
+    ab = xy[next_index] - a
+
+    # distance from the origin to each edge
+    length_sq = np.einsum("ij,ij->i", ab, ab)
+    t = np.divide(
+        -np.einsum("ij,ij->i", a, ab),
+        length_sq,
+        out=np.zeros(len(a)),
+        where=length_sq > 0,
+    )
+    closest = a + np.clip(t, 0, 1)[:, None] * ab
+    dist_sq = np.minimum.reduceat(np.einsum("ij,ij->i", closest, closest), starts)
+
+    # the origin is enclosed if a ray along +x crosses an odd number of edges
+    crosses_axis = (a[:, 1] > 0) != (a[:, 1] + ab[:, 1] > 0)
+    x_at_axis = a[:, 0] - a[:, 1] * np.divide(
+        ab[:, 0], ab[:, 1], out=np.zeros(len(a)), where=crosses_axis
+    )
+    crossings = np.add.reduceat(crosses_axis & (x_at_axis > 0), starts)
+
+    keep[valid] = (dist_sq <= radius**2) | (crossings % 2 == 1)
+
+    return keep
+
+
+def clip_buildings(
+    footprints: list[np.ndarray], radius: float
+) -> tuple[np.ndarray, dict]:
+    """Flag the buildings to keep within the radius and report the dropped ones."""
+    keep = footprints_within_radius(footprints, radius)
+    report = {
+        "buildings": len(footprints),
+        "dropped": int(len(footprints) - keep.sum()),
+        "vertices_dropped": sum(
+            len(coords) for coords, k in zip(footprints, keep) if not k
+        ),
+    }
+    return keep, report
+
+
+def clip_polylines(
+    polylines: list[np.ndarray], closed: list[bool], radius: float
+) -> tuple[list[tuple[int, np.ndarray, bool]], dict]:
+    """Cut the polylines (around the site origin) at the circle of the radius.
+
+    Returns the parts within the circle as (index of the polyline, coords,
+    closed) and a report of the removed geometry. Closed polylines stay
+    closed only if they are entirely within the circle.
+    """
+    radius_sq = radius**2
+    # start closed polylines outside the circle, so that a cut one does not
+    # run across its first vertex, and close them to get their last segment
+    opened = []
+    for coords, is_closed in zip(polylines, closed):
+        if is_closed and len(coords) > 1:
+            j = int(np.argmax(np.einsum("ij,ij->i", coords, coords) > radius_sq))
+            coords = np.concatenate((coords[j:], coords[:j], coords[j : j + 1]))
+        opened.append(coords)
+
+    xy, starts, counts = flatten_coords(opened)
+    inside = np.einsum("ij,ij->i", xy, xy) <= radius_sq
+
+    # intersections of all segments (from each vertex to the next) with the circle
+    a = xy[:-1]
+    ab = xy[1:] - a
+    qa = np.einsum("ij,ij->i", ab, ab)
+    qb = 2 * np.einsum("ij,ij->i", a, ab)
+    qc = np.einsum("ij,ij->i", a, a) - radius_sq
+    discriminant = qb**2 - 4 * qa * qc
+    hits = (discriminant > 0) & (qa > 0)
+    root = np.sqrt(np.where(hits, discriminant, 0))
+    denominator = np.where(hits, 2 * qa, 1)
+    # without an intersection, enter at the end and exit at the start vertex
+    t_enter = np.clip(np.where(hits, (-qb - root) / denominator, 1), 0, 1)
+    t_exit = np.clip(np.where(hits, (-qb + root) / denominator, 0), 0, 1)
+    enter_xy = a + t_enter[:, None] * ab
+    exit_xy = a + t_exit[:, None] * ab
+    # segments with both ends outside, passing through the circle
+    chords = hits & (t_enter > 0) & (t_exit < 1) & (t_enter < t_exit)
+
+    parts = []
+    for i, (start, count) in enumerate(zip(starts.tolist(), counts.tolist())):
+        if count == 0:
+            continue
+        end = start + count
+        if inside[start:end].all():
+            parts.append((i, polylines[i], closed[i]))
+            continue
+
+        part = [xy[start]] if inside[start] else None
+        for k in range(start, end - 1):
+            if inside[k] and inside[k + 1]:
+                part.append(xy[k + 1])
+            elif inside[k]:
+                part.append(exit_xy[k])
+                parts.append((i, np.array(part), False))
+                part = None
+            elif inside[k + 1]:
+                part = [enter_xy[k], xy[k + 1]]
+            elif chords[k]:
+                parts.append((i, np.array([enter_xy[k], exit_xy[k]]), False))
+        if part is not None and len(part) > 1:
+            parts.append((i, np.array(part), False))
+
+    length_before = _total_length(opened)
+    length_after = _total_length(
+        [
+            np.concatenate((coords, coords[:1])) if is_closed else coords
+            for _, coords, is_closed in parts
+        ]
+    )
+    report = {
+        "roads": len(polylines),
+        "parts": len(parts),
+        "dropped": len(polylines) - len({i for i, _, _ in parts}),
+        "length_removed": round(length_before - length_after, 1),
+    }
+    return parts, report
+
+
+def _total_length(coords_lists: list[np.ndarray]) -> float:
+    """Sum up the lengths of polylines."""
+    xy, starts, counts = flatten_coords(coords_lists)
+    if len(xy) < 2:
+        return 0.0
+    segments = np.hypot(*(xy[1:] - xy[:-1]).T)
+    # drop the segments between the end of one polyline and the next
+    last = (starts + counts - 1)[(counts > 0) & (starts + counts < len(xy))]
+    segments[last] = 0
+
+    return float(segments.sum())
@@ -0,0 +1,731 @@
+"""Polygon-with-holes triangulation by ear clipping.
+
+A port of the earcut algorithm (https://github.com/mapbox/earcut, ISC license):
+holes are bridged into the outer ring, then ears are clipped from the
+resulting ring, with z-order hashing of the vertices for larger polygons.
+Degenerate input (self-touching rings, collinear and coincident vertices)
+is handled by filtering points, curing local intersections and splitting
+the ring, instead of failing.
+"""
+import numpy as np
+
+# vertices closer than this (in meters) to the previous vertex are dropped
+DUPLICATE_TOLERANCE = 1e-3
+# z-order hashing pays off from this number of coordinates on
+HASH_THRESHOLD = 80
+
+
+class _Node:
+    """Vertex of a ring in a circular doubly linked list."""
+
+    __slots__ = ("i", "x", "y", "prev", "next", "z", "prev_z", "next_z", "steiner")
+
+    def __init__(self, i: int, x: float, y: float) -> None:
+        self.i = i  # vertex index in the input coordinates
+        self.x = x
+        self.y = y
+        self.prev = None
+        self.next = None
+        self.z = 0  # z-order curve value
+        self.prev_z = None
+        self.next_z = None
+        self.steiner = False
+
+
+def triangulate_polygon(
+    outer: np.ndarray, holes: list[np.ndarray] | None = None
+) -> tuple[np.ndarray]:
+    """Triangulate a polygon with holes given as (n, 2) coordinate arrays.
+
+    Returns the (n, 2) vertices (the cleaned rings, outer first) and an
+    (m, 3) array of vertex indices of counter-clockwise triangles.
+    """
+    vertices, hole_indices = clean_polygon(outer, holes)
+    if len(vertices) < 3:
+        return vertices, np.empty((0, 3), dtype=np.int64)
+    triangles = np.array(
+        earcut(vertices.ravel().tolist(), hole_indices), dtype=np.int64
+    ).reshape(-1, 3)
+
+    # make all triangles face up
+    a, b, c = (vertices[triangles[:, k]] for k in range(3))
+    cross = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (
+        c[:, 0] - a[:, 0]
+    )
+    triangles[cross < 0] = triangles[cross < 0][:, ::-1]
+
+    return vertices, triangles
+
+
+def clean_polygon(
+    outer: np.ndarray, holes: list[np.ndarray] | None = None
+) -> tuple[np.ndarray, list[int]]:
+    """Clean the rings of a polygon and drop holes with less than 3 vertices.
+
+    Returns the (n, 2) vertices (outer first, without holes if it has less
+    than 3 vertices) and the vertex indices at which the holes start.
+    """
+    rings = [clean_ring(outer)]
+    if len(rings[0]) >= 3:
+        for hole in holes or []:
+            hole = clean_ring(hole)
+            if len(hole) >= 3:
+                rings.append(hole)
+
+    vertices = np.concatenate(rings)
+    hole_indices = np.cumsum([len(ring) for ring in rings[:-1]]).tolist()
+    return vertices, hole_indices
+
+
+def clean_ring(ring: np.ndarray) -> np.ndarray:
+    """Drop the closing vertex and vertices (nearly) equal to their predecessor."""
+    ring = np.asarray(ring, dtype=np.float64).reshape(-1, 2)
+    if len(ring) == 0:
+        return ring
+    step = np.hypot(*(ring - np.roll(ring, 1, axis=0)).T)
+    keep = step > DUPLICATE_TOLERANCE
+    if not keep.any():
+        return ring[:1]
+    return ring[keep]
+
+
+def earcut(data: list[float], hole_indices: list[int] | None = None) -> list[int]:
+    """Triangulate flat [x0, y0, x1, y1, ...] coordinates of an outer ring and holes.
+
+    hole_indices are the vertex indices at which the holes start. Returns
+    the flat vertex indices of the triangles.
+    """
+    dim = 2
+    has_holes = bool(hole_indices)
+    outer_len = hole_indices[0] * dim if has_holes else len(data)
+    outer_node = _linked_list(data, 0, outer_len, dim, True)
+    triangles = []
+
+    if outer_node is None or outer_node.next is outer_node.prev:
+        return triangles
+
+    if has_holes:
+        outer_node = _eliminate_holes(data, hole_indices, outer_node, dim)
+
+    min_x = min_y = inv_size = 0
+    # hash the vertices of larger polygons for faster ear checks
+    if len(data) > HASH_THRESHOLD * dim:
+        xs = data[0:outer_len:dim]
+        ys = data[1:outer_len:dim]
+        min_x, min_y = min(xs), min(ys)
+        inv_size = max(max(xs) - min_x, max(ys) - min_y)
+        inv_size = 32767 / inv_size if inv_size != 0 else 0
+
+    _earcut_linked(outer_node, triangles, dim, min_x, min_y, inv_size, 0)
+
+    return triangles
+
+
+def _linked_list(
+    data: list[float], start: int, end: int, dim: int, clockwise: bool
+) -> _Node | None:
+    """Create a circular linked list of the ring in the specified winding order."""
+    last = None
+    if clockwise == (_signed_area(data, start, end, dim) > 0):
+        for i in range(start, end, dim):
+            last = _insert_node(i, data[i], data[i + 1], last)
+    else:
+        for i in range(end - dim, start - 1, -dim):
+            last = _insert_node(i, data[i], data[i + 1], last)
+
+    if last is not None and _equals(last, last.next):
+        _remove_node(last)
+        last = last.next
+
+    return last
+
+
+def _filter_points(start: _Node | None, end: _Node | None = None) -> _Node | None:
+    """Eliminate coincident and collinear points."""
+    if start is None:
+        return start
+    if end is None:
+        end = start
+
+    p = start
+    while True:
+        again = False
+        if not p.steiner and (_equals(p, p.next) or _area(p.prev, p, p.next) == 0):
+            _remove_node(p)
+            p = end = p.prev
+            if p is p.next:
+                break
+            again = True
+        else:
+            p = p.next
+        if not (again or p is not end):
+            break
+
+    return end
+
+
+def _earcut_linked(
+    ear: _Node | None,
+    triangles: list[int],
+    dim: int,
+    min_x: float,
+    min_y: float,
+    inv_size: float,
+    pass_: int,
+) -> None:
+    """Clip ears off the ring, with increasingly tolerant passes if it gets stuck."""
+    if ear is None:
+        return
+
+    # interlink the polygon nodes in z-order
+    if pass_ == 0 and inv_size:
+        _index_curve(ear, min_x, min_y, inv_size)
+
+    stop = ear
+    while ear.prev is not ear.next:
+        prev = ear.prev
+        next_ = ear.next
+
+        if _is_ear_hashed(ear, min_x, min_y, inv_size) if inv_size else _is_ear(ear):
+            triangles.append(prev.i // dim)
+            triangles.append(ear.i // dim)
+            triangles.append(next_.i // dim)
+            _remove_node(ear)
+            # skipping the next vertex leads to less sliver triangles
+            ear = next_.next
+            stop = next_.next
+            continue
+
+        ear = next_
+
+        # no more ears found in a full loop
+        if ear is stop:
+            if pass_ == 0:
+                # try filtering points and slicing again
+                _earcut_linked(
+                    _filter_points(ear), triangles, dim, min_x, min_y, inv_size, 1
+                )
+            elif pass_ == 1:
+                # cure small local self-intersections
+                ear = _cure_local_intersections(_filter_points(ear), triangles, dim)
+                _earcut_linked(ear, triangles, dim, min_x, min_y, inv_size, 2)
+            elif pass_ == 2:
+                # as a last resort, split the polygon in two
+                _split_earcut(ear, triangles, dim, min_x, min_y, inv_size)
+            break
+
+
+def _is_ear(ear: _Node) -> bool:
+    """Check whether a polygon node forms a valid ear with adjacent nodes."""
+    a = ear.prev
+    b = ear
+    c = ear.next
+    if _area(a, b, c) >= 0:
+        return False  # reflex, can't be an ear
+
+    ax, bx, cx, ay, by, cy = a.x, b.x, c.x, a.y, b.y, c.y
+    x0, x1 = min(ax, bx, cx), max(ax, bx, cx)
+    y0, y1 = min(ay, by, cy), max(ay, by, cy)
+
+    # no points of the ring may lie inside the ear
+    p = c.next
+    while p is not a:
+        if (
+            x0 <= p.x <= x1
+            and y0 <= p.y <= y1
+            and _point_in_triangle(ax, ay, bx, by, cx, cy, p.x, p.y)
+            and _area(p.prev, p, p.next) >= 0
+        ):
+            return False
+        p = p.next
+
+    return True
+
+
+def _is_ear_hashed(ear: _Node, min_x: float, min_y: float, inv_size: float) -> bool:
+    """Check whether a node is an ear, looking only at nodes near it in z-order."""
+    a = ear.prev
+    b = ear
+    c = ear.next
+    if _area(a, b, c) >= 0:
+        return False  # reflex, can't be an ear
+
+    ax, bx, cx, ay, by, cy = a.x, b.x, c.x, a.y, b.y, c.y
+    x0, x1 = min(ax, bx, cx), max(ax, bx, cx)
+    y0, y1 = min(ay, by, cy), max(ay, by, cy)
+
+    # z-order range for the current triangle bbox
+    min_z = _z_order(x0, y0, min_x, min_y, inv_size)
+    max_z = _z_order(x1, y1, min_x, min_y, inv_size)
+
+    def inside(p: _Node) -> bool:
+        return (
+            x0 <= p.x <= x1
+            and y0 <= p.y <= y1
+            and p is not a
+            and p is not c
+            and _point_in_triangle(ax, ay, bx, by, cx, cy, p.x, p.y)
+            and _area(p.prev, p, p.next) >= 0
+        )
+
+    p = ear.prev_z
+    n = ear.next_z
+
+    # look for points inside the triangle in both directions
+    while p is not None and p.z >= min_z and n is not None and n.z <= max_z:
+        if inside(p):
+            return False
+        p = p.prev_z
+        if inside(n):
+            return False
+        n = n.next_z
+
+    while p is not None and p.z >= min_z:
+        if inside(p):
+            return False
+        p = p.prev_z
+
+    while n is not None and n.z <= max_z:
+        if inside(n):
+            return False
+        n = n.next_z
+
+    return True
+
+
+def _cure_local_intersections(start: _Node, triangles: list[int], dim: int) -> _Node:
+    """Go through all polygon nodes and cure small local self-intersections."""
+    p = start
+    while True:
+        a = p.prev
+        b = p.next.next
+        if (
+            not _equals(a, b)
+            and _intersects(a, p, p.next, b)
+            and _locally_inside(a, b)
+            and _locally_inside(b, a)
+        ):
+            triangles.append(a.i // dim)
+            triangles.append(p.i // dim)
+            triangles.append(b.i // dim)
+            # remove two nodes involved
+            _remove_node(p)
+            _remove_node(p.next)
+            p = start = b
+        p = p.next
+        if p is start:
+            break
+
+    return _filter_points(p)
+
+
+def _split_earcut(
+    start: _Node,
+    triangles: list[int],
+    dim: int,
+    min_x: float,
+    min_y: float,
+    inv_size: float,
+) -> None:
+    """Split the polygon at a valid diagonal and triangulate both halves."""
+    a = start
+    while True:
+        b = a.next.next
+        while b is not a.prev:
+            if a.i != b.i and _is_valid_diagonal(a, b):
+                c = _split_polygon(a, b)
+                a = _filter_points(a, a.next)
+                c = _filter_points(c, c.next)
+                _earcut_linked(a, triangles, dim, min_x, min_y, inv_size, 0)
+                _earcut_linked(c, triangles, dim, min_x, min_y, inv_size, 0)
+                return
+            b = b.next
+        a = a.next
+        if a is start:
+            break
+
+
+def _eliminate_holes(
+    data: list[float], hole_indices: list[int], outer_node: _Node, dim: int
+) -> _Node:
+    """Link every hole into the outer ring, producing a single-ring polygon."""
+    queue = []
+    for n, hole_index in enumerate(hole_indices):
+        start = hole_index * dim
+        end = hole_indices[n + 1] * dim if n < len(hole_indices) - 1 else len(data)
+        ring = _linked_list(data, start, end, dim, False)
+        if ring is None:
+            continue
+        if ring is ring.next:
+            ring.steiner = True
+        queue.append(_get_leftmost(ring))
+
+    # process holes from left to right
+    queue.sort(key=lambda node: node.x)
+    for hole in queue:
+        outer_node = _eliminate_hole(hole, outer_node)
+
+    return outer_node
+
+
+def _eliminate_hole(hole: _Node, outer_node: _Node) -> _Node:
+    """Find a bridge between the hole and the outer ring and link them."""
+    bridge = _find_hole_bridge(hole, outer_node)
+    if bridge is None:
+        return outer_node
+
+    bridge_reverse = _split_polygon(bridge, hole)
+    # filter collinear points around the cuts
+    _filter_points(bridge_reverse, bridge_reverse.next)
+
+    return _filter_points(bridge, bridge.next)
+
+
+def _find_hole_bridge(hole: _Node, outer_node: _Node) -> _Node | None:
+    """Find a node of the outer ring visible from the leftmost node of the hole."""
+    p = outer_node
+    hx = hole.x
+    hy = hole.y
+    qx = -np.inf
+    m = None
+
+    # find a segment intersected by a ray from the hole's leftmost point to the
+    # left, the segment's endpoint with lesser x will be a potential connection
+    while True:
+        if hy <= p.y and hy >= p.next.y and p.next.y != p.y:
+            x = p.x + (hy - p.y) * (p.next.x - p.x) / (p.next.y - p.y)
+            if hx >= x > qx:
+                qx = x
+                m = p if p.x < p.next.x else p.next
+                if x == hx:
+                    return m  # the hole touches the outer segment
+        p = p.next
+        if p is outer_node:
+            break
+
+    if m is None:
+        return None
+
+    # look for points inside the triangle of the hole point, the segment
+    # intersection and the endpoint, if there are none, it is the connection,
+    # otherwise take the point with the minimum angle with the ray
+    stop = m
+    mx = m.x
+    my = m.y
+    tan_min = np.inf
+
+    p = m
+    while True:
+        if (
+            hx >= p.x >= mx
+            and hx != p.x
+            and _point_in_triangle(
+                hx if hy < my else qx, hy, mx, my, qx if hy < my else hx, hy, p.x, p.y
+            )
+        ):
+            tan = abs(hy - p.y) / (hx - p.x)
+            if _locally_inside(p, hole) and (
+                tan < tan_min
+                or (
+                    tan == tan_min
+                    and (p.x > m.x or (p.x == m.x and _sector_contains_sector(m, p)))
+                )
+            ):
+                m = p
+                tan_min = tan
+        p = p.next
+        if p is stop:
+            break
+
+    return m
+
+
+def _sector_contains_sector(m: _Node, p: _Node) -> bool:
+    """Check whether the sector at vertex m contains the sector at vertex p."""
+    return _area(m.prev, m, p.prev) < 0 and _area(p.next, m, m.next) < 0
+
+
+def _index_curve(start: _Node, min_x: float, min_y: float, inv_size: float) -> None:
+    """Interlink the polygon nodes in z-order."""
+    p = start
+    while True:
+        if p.z == 0:
+            p.z = _z_order(p.x, p.y, min_x, min_y, inv_size)
+        p.prev_z = p.prev
+        p.next_z = p.next
+        p = p.next
+        if p is start:
+            break
+
+    p.prev_z.next_z = None
+    p.prev_z = None
+
+    _sort_linked(p)
+
+
+def _sort_linked(head: _Node) -> _Node:
+    """Sort the z-order links with a bottom-up merge sort."""
+    in_size = 1
+    while True:
+        p = head
+        head = None
+        tail = None
+        num_merges = 0
+
+        while p is not None:
+            num_merges += 1
+            q = p
+            p_size = 0
+            for _ in range(in_size):
+                p_size += 1
+                q = q.next_z
+                if q is None:
+                    break
+            q_size = in_size
+
+            while p_size > 0 or (q_size > 0 and q is not None):
+                if p_size != 0 and (q_size == 0 or q is None or p.z <= q.z):
+                    e = p
+                    p = p.next_z
+                    p_size -= 1
+                else:
+                    e = q
+                    q = q.next_z
+                    q_size -= 1
+
+                if tail is not None:
+                    tail.next_z = e
+                else:
+                    head = e
+                e.prev_z = tail
+                tail = e
+
+            p = q
+
+        tail.next_z = None
+        in_size *= 2
+        if num_merges <= 1:
+            return head
+
+
+def _z_order(x: float, y: float, min_x: float, min_y: float, inv_size: float) -> int:
+    """Z-order of a point from coords and inverse of the longer side of the bbox."""
+    # coords are transformed into non-negative 15-bit integer range
+    x = int((x - min_x) * inv_size)
+    y = int((y - min_y) * inv_size)
+
+    x = (x | (x << 8)) & 0x00FF00FF
+    x = (x | (x << 4)) & 0x0F0F0F0F
+    x = (x | (x << 2)) & 0x33333333
+    x = (x | (x << 1)) & 0x55555555
+
+    y = (y | (y << 8)) & 0x00FF00FF
+    y = (y | (y << 4)) & 0x0F0F0F0F
+    y = (y | (y << 2)) & 0x33333333
+    y = (y | (y << 1)) & 0x55555555
+
+    return x | (y << 1)
+
+
+def _get_leftmost(start: _Node) -> _Node:
+    """Find the leftmost node of a polygon ring."""
+    p = start
+    leftmost = start
+    while True:
+        if p.x < leftmost.x or (p.x == leftmost.x and p.y < leftmost.y):
+            leftmost = p
+        p = p.next
+        if p is start:
+            break
+
+    return leftmost
+
+
+def _point_in_triangle(
+    ax: float,
+    ay: float,
+    bx: float,
+    by: float,
+    cx: float,
+    cy: float,
+    px: float,
+    py: float,
+) -> bool:
+    """Check if a point lies within a convex triangle."""
+    return (
+        (cx - px) * (ay - py) >= (ax - px) * (cy - py)
+        and (ax - px) * (by - py) >= (bx - px) * (ay - py)
+        and (bx - px) * (cy - py) >= (cx - px) * (by - py)
+    )
+
+
+def _is_valid_diagonal(a: _Node, b: _Node) -> bool:
+    """Check if a diagonal between two polygon nodes is valid (lies in the interior)."""
+    return (
+        a.next.i != b.i
+        and a.prev.i != b.i
+        and not _intersects_polygon(a, b)
+        and (
+            # locally visible and the diagonal is not zero length
+            (
+                _locally_inside(a, b)
+                and _locally_inside(b, a)
+                and _middle_inside(a, b)
+                and (_area(a.prev, a, b.prev) != 0 or _area(a, b.prev, b) != 0)
+            )
+            # or a special zero-length case
+            or (
+                _equals(a, b)
+                and _area(a.prev, a, a.next) > 0
+                and _area(b.prev, b, b.next) > 0
+            )
+        )
+    )
+
+
+def _area(p: _Node, q: _Node, r: _Node) -> float:
+    """Signed area of a triangle."""
+    return (q.y - p.y) * (r.x - q.x) - (q.x - p.x) * (r.y - q.y)
+
+
+def _equals(p1: _Node, p2: _Node) -> bool:
+    """Check if two points are equal."""
+    return p1.x == p2.x and p1.y == p2.y
+
+
+def _sign(value: float) -> int:
+    return (value > 0) - (value < 0)
+
+
+def _on_segment(p: _Node, q: _Node, r: _Node) -> bool:
+    """For collinear points p, q, r, check if point q lies on segment pr."""
+    return min(p.x, r.x) <= q.x <= max(p.x, r.x) and min(p.y, r.y) <= q.y <= max(
+        p.y, r.y
+    )
+
+
+def _intersects(p1: _Node, q1: _Node, p2: _Node, q2: _Node) -> bool:
+    """Check if two segments intersect."""
+    o1 = _sign(_area(p1, q1, p2))
+    o2 = _sign(_area(p1, q1, q2))
+    o3 = _sign(_area(p2, q2, p1))
+    o4 = _sign(_area(p2, q2, q1))
+
+    if o1 != o2 and o3 != o4:
+        return True  # general case
+
+    # collinear cases
+    return (
+        (o1 == 0 and _on_segment(p1, p2, q1))
+        or (o2 == 0 and _on_segment(p1, q2, q1))
+        or (o3 == 0 and _on_segment(p2, p1, q2))
+        or (o4 == 0 and _on_segment(p2, q1, q2))
+    )
+
+
+def _intersects_polygon(a: _Node, b: _Node) -> bool:
+    """Check if a polygon diagonal intersects any polygon segments."""
+    p = a
+    while True:
+        if (
+            p.i != a.i
+            and p.next.i != a.i
+            and p.i != b.i
+            and p.next.i != b.i
+            and _intersects(p, p.next, a, b)
+        ):
+            return True
+        p = p.next
+        if p is a:
+            break
+
+    return False
+
+
+def _locally_inside(a: _Node, b: _Node) -> bool:
+    """Check if a polygon diagonal is locally inside the polygon."""
+    if _area(a.prev, a, a.next) < 0:
+        return _area(a, b, a.next) >= 0 and _area(a, a.prev, b) >= 0
+    return _area(a, b, a.prev) < 0 or _area(a, a.next, b) < 0
+
+
+def _middle_inside(a: _Node, b: _Node) -> bool:
+    """Check if the middle point of a polygon diagonal is inside the polygon."""
+    p = a
+    inside = False
+    px = (a.x + b.x) / 2
+    py = (a.y + b.y) / 2
+    while True:
+        if (
+            (p.y > py) != (p.next.y > py)
+            and p.next.y != p.y
+            and px < (p.next.x - p.x) * (py - p.y) / (p.next.y - p.y) + p.x
+        ):
+            inside = not inside
+        p = p.next
+        if p is a:
+            break
+
+    return inside
+
+
+def _split_polygon(a: _Node, b: _Node) -> _Node:
+    """Link two polygon vertices with a bridge.
+
+    If the vertices belong to the same ring, it splits the polygon into two.
+    If one belongs to the outer ring and another to a hole, it merges them
+    into a single ring.
+    """
+    a2 = _Node(a.i, a.x, a.y)
+    b2 = _Node(b.i, b.x, b.y)
+    an = a.next
+    bp = b.prev
+
+    a.next = b
+    b.prev = a
+
+    a2.next = an
+    an.prev = a2
+
+    b2.next = a2
+    a2.prev = b2
+
+    bp.next = b2
+    b2.prev = bp
+
+    return b2
+
+
+def _insert_node(i: int, x: float, y: float, last: _Node | None) -> _Node:
+    """Create a node and optionally link it with the previous one."""
+    p = _Node(i, x, y)
+    if last is None:
+        p.prev = p
+        p.next = p
+    else:
+        p.next = last.next
+        p.prev = last
+        last.next.prev = p
+        last.next = p
+
+    return p
+
+
+def _remove_node(p: _Node) -> None:
+    p.next.prev = p.prev
+    p.prev.next = p.next
+
+    if p.prev_z is not None:
+        p.prev_z.next_z = p.next_z
+    if p.next_z is not None:
+        p.next_z.prev_z = p.prev_z
+
+
+def _signed_area(data: list[float], start: int, end: int, dim: int) -> float:
+    total = 0.0
+    j = end - dim
+    for i in range(start, end, dim):
+        total += (data[j] - data[i]) * (data[i + 1] + data[j + 1])
+        j = i
+
+    return total
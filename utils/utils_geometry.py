@@ -1,198 +1,22 @@
-import json
 import math
 from copy import copy
 
-import geopandas as gpd
 import numpy as np
-from geovoronoi import voronoi_regions_from_coords
-from shapely import (
-    LineString,
-    Polygon,
-    buffer,
-    to_geojson,
-)
-from shapely.ops import triangulate
+import shapely
 from specklepy.objects import Base
 from specklepy.objects.geometry import Mesh, Point, Polyline
+from specklepy.objects.other import RenderMaterial
 
+from utils.utils_clip import flatten_coords
+from utils.utils_earcut import clean_polygon, triangulate_polygon
 from utils.utils_other import (
     COLOR_BLD,
     COLOR_ROAD,
-    fill_list,
+    split_by_repeated_values,
 )
+from utils.utils_parallel import map_batches, split_batches
 
-
-def fix_orientation(
-    point_tuple_list: list,
-    vert_indices: list,
-    make_counter_clockwise: bool = True,
-    coef: int = 1,
-) -> tuple[list, bool]:
-    """Check the polygon face orientation and reverse if needed."""
-    sum_orientation = 0
-    for k, _ in enumerate(point_tuple_list):  # pointTupleList:
-        index = k + 1
-        if k == len(point_tuple_list) - 1:
-            index = 0
-        pt = point_tuple_list[k * coef]
-        pt2 = point_tuple_list[index * coef]
-
-        sum_orientation += (pt2[0] - pt[0]) * (pt2[1] + pt[1])
-
-    if sum_orientation > 0:
-        original_clockwise_orientation = True  # facing down originally
-    else:
-        original_clockwise_orientation = False  # facing up originally
-        # if needs to be facing down, reverse the vertex order
-        if make_counter_clockwise:
-            vert_indices.reverse()
-
-    return vert_indices, original_clockwise_orientation
-
-
-def create_side_face(
-    coords, i, next_coord_index, height, clockwise_orientation
-) -> list[float]:
-    """Constructing a vertical Mesh face assuming counter-clockwise orientation of the base polygon."""
-    if clockwise_orientation is False:
-        side_vertices = [
-            coords[i]["x"],
-            coords[i]["y"],
-            0,
-            next_coord_index["x"],
-            next_coord_index["y"],
-            0,
-            next_coord_index["x"],
-            next_coord_index["y"],
-            height,
-            coords[i]["x"],
-            coords[i]["y"],
-            height,
-        ]
-    else:  # if clockwise orientation
-        side_vertices = [
-            coords[i]["x"],
-            coords[i]["y"],
-            0,
-            coords[i]["x"],
-            coords[i]["y"],
-            height,
-            next_coord_index["x"],
-            next_coord_index["y"],
-            height,
-            next_coord_index["x"],
-            next_coord_index["y"],
-            0,
-        ]
-
-    return side_vertices
-
-
-def to_triangles(
-    coords: list[dict], coords_inner: list[dict], attempt: int = 0
-) -> tuple[dict, int]:
-    """Generate triangular faces from the Polygon with voids."""
-    # https://gis.stackexchange.com/questions/316697/delaunay-triangulation-algorithm-in-shapely-producing-erratic-result
-    try:
-        # round vertices precision
-        digits = 3 - attempt
-
-        vert = []
-        vert_rounded = []
-        # round boundary precision:
-        for i, v in enumerate(coords):
-            if i == len(coords) - 1:
-                vert.append((v["x"], v["y"]))
-                break  # don't test last point
-            rounded = [round(v["x"], digits), round(v["y"], digits)]
-            if v not in vert and rounded not in vert_rounded:
-                vert.append((v["x"], v["y"]))
-                vert_rounded.append(rounded)
-        # round courtyards precision:
-        holes = []
-        holes_rounded = []
-        for k, h in enumerate(coords_inner):
-            hole = []
-            for i, v in enumerate(h):
-                if i == len(h) - 1:
-                    hole.append((v["x"], v["y"]))
-                    break  # don't test last point
-
-                # test if any previour vertext with similar rounded value
-                # has been added before, then ignore
-                rounded = [round(v["x"], digits), round(v["y"], digits)]
-                if v not in holes and rounded not in holes_rounded:
-                    hole.append((v["x"], v["y"]))
-                    holes_rounded.append(rounded)
-            holes.append(hole)
-
-        # check if sufficient holes vertices were added
-        if len(holes) == 1 and len(holes[0]) == 0:
-            polygon = Polygon([(v[0], v[1]) for v in vert])
-        else:
-            polygon = Polygon([(v[0], v[1]) for v in vert], holes)
-
-        exterior_linearring = polygon.exterior
-        poly_points = np.array(exterior_linearring.coords).tolist()
-
-        try:
-            polygon.interiors[0]
-        except:
-            poly_points = poly_points
-        else:
-            for i, interior_linearring in enumerate(polygon.interiors):
-                a = interior_linearring.coords
-                poly_points += np.array(a).tolist()
-
-        poly_points = np.array(
-            [item for sublist in poly_points for item in sublist]
-        ).reshape(-1, 2)
-
-        poly_shapes, _ = voronoi_regions_from_coords(
-            poly_points, polygon.buffer(0.000001)
-        )
-        gdf_poly_voronoi = (
-            gpd.GeoDataFrame({"geometry": poly_shapes})
-            .explode(index_parts=True)
-            .reset_index()
-        )
-
-        tri_geom = []
-        for geom in gdf_poly_voronoi.geometry:
-            inside_triangles = [
-                tri for tri in triangulate(geom) if tri.centroid.within(polygon)
-            ]
-            tri_geom += inside_triangles
-
-        vertices = []
-        triangles = []
-        for tri in tri_geom:
-            xx, yy = tri.exterior.coords.xy
-            v_list = zip(xx.tolist(), yy.tolist())
-
-            tr_indices = []
-            count = 0
-            for vt in v_list:
-                v = list(vt)
-                if count == 3:
-                    continue
-                if v not in vertices:
-                    vertices.append(v)
-                    tr_indices.append(len(vertices) - 1)
-                else:
-                    tr_indices.append(vertices.index(v))
-                count += 1
-            triangles.append(tr_indices)
-
-        shape = {"vertices": vertices, "triangles": triangles}
-        return shape, attempt
-    except Exception as e:
-        print(f"Meshing iteration {attempt} failed: {e}")
-        attempt += 1
-        if attempt <= 3:
-            return to_triangles(coords, coords_inner, attempt)
-        else:
-            return None, None
+SMOOTH_WALL_ANGLE = 30  # degrees; indexed walls turning by less share vertices
 
 
 def rotate_pt(coord: dict, angle: float) -> dict:
@@ -205,194 +29,571 @@ def rotate_pt(coord: dict, angle: float) -> dict:
     return {"x": x2, "y": y2}
 
 
-def extrude_building(
-    coords: list[dict], coords_inner: list[list[dict]], height: float
-) -> Mesh:
-    """Create a 3d Mesh from the lists of outer and inner coords and height."""
-    vertices = []
-    faces = []
-    colors = []
+def extrude_footprints(
+    footprints: list[np.ndarray],
+    voids: list[list[np.ndarray]],
+    heights: list[float],
+    merged: bool = False,
+    indexed: bool = False,
+    triangulations: list[np.ndarray | None] | None = None,
+) -> tuple[np.ndarray]:
+    """Extrude all footprints at once into flat vertex and face arrays.
+
+    Returns the (n, 3) vertices, the faces (as [count, *indices], indices
+    local to each building, or to the whole batch if merged), per building
+    the start of its vertices and faces, and the number of face corners
+    (the vertex count without shared vertices). Footprints with less than
+    3 points get no geometry, and so do voids with less than 3 points.
+
+    If indexed, the triangulated caps share their vertices, and so do the
+    side quads of walls turning by less than SMOOTH_WALL_ANGLE.
+
+    Footprints with voids are triangulated, unless their triangles (indices
+    into their clean_polygon vertices) are given in triangulations.
+    """
+    count = len(footprints)
+    rings = []
+    ring_buildings = []
+    cap_points = []
+    cap_triangles = []
+    cap_buildings = []
+    is_simple = np.zeros(count, dtype=bool)
+    for i, (coords, coords_inner) in enumerate(zip(footprints, voids)):
+        if len(coords) < 3:
+            continue
+        # degenerate voids would break the ring adjacency of the walls
+        coords_inner = [ring for ring in coords_inner if len(ring) >= 3]
+        if len(coords_inner) > 0:
+            if triangulations is not None and triangulations[i] is not None:
+                vertices, _ = clean_polygon(coords, coords_inner)
+                triangles = triangulations[i]
+            else:
+                vertices, triangles = triangulate_polygon(coords, coords_inner)
+            if len(triangles) > 0:
+                rings.extend([coords, *coords_inner])
+                ring_buildings.extend([i] * (len(coords_inner) + 1))
+                if not indexed:  # own vertices for each triangle
+                    vertices = vertices[triangles].reshape(-1, 2)
+                    triangles = np.arange(len(vertices)).reshape(-1, 3)
+                cap_points.append(vertices)
+                cap_triangles.append(triangles)
+                cap_buildings.append(i)
+                continue
+        # default to only outer border mesh generation
+        rings.append(coords)
+        ring_buildings.append(i)
+        is_simple[i] = True
+
+    xy, ring_starts, ring_counts = flatten_coords(rings)
+    ring_buildings = np.array(ring_buildings, dtype=np.int64)
+    heights = np.asarray(heights, dtype=np.float64).reshape(-1)
+    # per ring vertex: its building, the next vertex, its index in the ring
+    owner = np.repeat(ring_buildings, ring_counts)
+    vertex_heights = heights[owner]
+    ring_ends = ring_starts + ring_counts - 1
+    next_index = np.arange(1, len(xy) + 1)
+    next_index[ring_ends] = ring_starts
+    previous_index = np.arange(-1, len(xy) - 1)
+    previous_index[ring_starts] = ring_ends
+    in_ring = np.arange(len(xy)) - np.repeat(ring_starts, ring_counts)
+
+    # facing down originally if the shoelace sum is positive
+    shoelace = (xy[next_index, 0] - xy[:, 0]) * (xy[next_index, 1] + xy[:, 1])
+    clockwise = np.zeros(len(rings), dtype=bool)
+    clockwise[ring_counts > 0] = (
+        np.add.reduceat(shoelace, ring_starts[ring_counts > 0]) > 0
+    )
+    vertex_clockwise = np.repeat(clockwise, ring_counts)
+
+    # triangulated caps
+    cap_buildings = np.array(cap_buildings, dtype=np.int64)
+    point_counts = np.zeros(count, dtype=np.int64)
+    point_counts[cap_buildings] = [len(points) for points in cap_points]
+    triangle_counts = np.zeros(count, dtype=np.int64)
+    triangle_counts[cap_buildings] = [len(triangles) for triangles in cap_triangles]
+
+    # side quads share the vertices at smooth turns of the walls
+    edges = xy[next_index] - xy
+    previous_edges = edges[previous_index]
+    cross = previous_edges[:, 0] * edges[:, 1] - previous_edges[:, 1] * edges[:, 0]
+    turn = np.arctan2(np.abs(cross), np.einsum("ij,ij->i", previous_edges, edges))
+    sharp = (turn > math.radians(SMOOTH_WALL_ANGLE)) | (not indexed)
+    # a vertical pair of vertices at each smooth vertex, two at each sharp one
+    slot_counts = 1 + sharp.astype(np.int64)
+
+    # vertices and faces of each building: caps first, then the sides
+    outer_counts = np.zeros(count, dtype=np.int64)
+    outer_counts[is_simple] = ring_counts[is_simple[ring_buildings]]
+    side_counts = np.bincount(owner, minlength=count)
+    cap_vertex_counts = 2 * outer_counts + 2 * point_counts
+    cap_face_counts = (2 * outer_counts + 2) * is_simple + 8 * triangle_counts
+    side_vertex_counts = 2 * np.bincount(owner, slot_counts, count).astype(np.int64)
+    vertex_counts = cap_vertex_counts + side_vertex_counts
+    face_counts = cap_face_counts + 5 * side_counts
+    vertex_starts = np.concatenate(([0], np.cumsum(vertex_counts)))
+    face_starts = np.concatenate(([0], np.cumsum(face_counts)))
+    vertices = np.zeros((vertex_starts[-1], 3))
+    faces = np.zeros(face_starts[-1], dtype=np.int64)
+    index_offsets = vertex_starts[:-1] if merged else np.zeros(count, dtype=np.int64)
+    corners = int(2 * outer_counts.sum() + 6 * triangle_counts.sum() + 4 * len(xy))
+
+    # caps of simple footprints: an n-gon at the bottom and the top
+    simple = is_simple[owner]
+    b = owner[simple]
+    j = in_ring[simple]
+    n = outer_counts[b]
+    cw = vertex_clockwise[simple]
+    vertices[vertex_starts[b] + j, :2] = xy[simple]
+    vertices[vertex_starts[b] + n + j, :2] = xy[simple]
+    vertices[vertex_starts[b] + n + j, 2] = heights[b]
+    bottom = np.where(cw, j, n - 1 - j)  # reversed unless facing down
+    top = n + np.where(cw, n - 1 - j, j)  # reversed if facing down
+    faces[face_starts[b] + 1 + j] = index_offsets[b] + bottom
+    faces[face_starts[b] + n + 2 + j] = index_offsets[b] + top
+    simple_starts = face_starts[:-1][is_simple]
+    faces[simple_starts] = outer_counts[is_simple]
+    faces[simple_starts + outer_counts[is_simple] + 1] = outer_counts[is_simple]
+
+    # triangulated caps: all triangles face up, so the bottom ones are reversed
+    points = np.concatenate(cap_points or [np.empty((0, 2))])
+    b = np.repeat(cap_buildings, point_counts[cap_buildings])
+    k = np.arange(len(points)) - np.repeat(
+        np.cumsum(point_counts[cap_buildings]) - point_counts[cap_buildings],
+        point_counts[cap_buildings],
+    )
+    vertices[vertex_starts[b] + k, :2] = points
+    vertices[vertex_starts[b] + point_counts[b] + k, :2] = points
+    vertices[vertex_starts[b] + point_counts[b] + k, 2] = heights[b]
+    triangles = np.concatenate(cap_triangles or [np.empty((0, 3), dtype=np.int64)])
+    b = np.repeat(cap_buildings, triangle_counts[cap_buildings])
+    m = np.arange(len(triangles)) - np.repeat(
+        np.cumsum(triangle_counts[cap_buildings]) - triangle_counts[cap_buildings],
+        triangle_counts[cap_buildings],
+    )
+    offsets = index_offsets[b][:, None]
+    bottom_index = face_starts[b] + 4 * m
+    top_index = bottom_index + 4 * triangle_counts[b]
+    faces[bottom_index] = 3
+    faces[bottom_index[:, None] + np.arange(1, 4)] = offsets + triangles[:, ::-1]
+    faces[top_index] = 3
+    faces[top_index[:, None] + np.arange(1, 4)] = (
+        offsets + point_counts[b][:, None] + triangles
+    )
+
+    # sides: a quad per ring edge, counter-clockwise seen from outside
+    b = owner
+    e = np.arange(len(xy)) - np.repeat(
+        np.concatenate(([0], np.cumsum(side_counts)))[:-1], side_counts
+    )
+    side_starts = vertex_starts[b] + cap_vertex_counts[b]
+    if indexed:
+        # slots of each vertex, incoming and outgoing (the same if smooth)
+        slots = np.cumsum(slot_counts) - slot_counts
+        building_slots = np.concatenate(([0], np.cumsum(side_vertex_counts // 2)))
+        slots -= building_slots[b]
+        outgoing = slots + sharp
+        for slot in (slots, outgoing):
+            vertices[side_starts + 2 * slot, :2] = xy
+            vertices[side_starts + 2 * slot + 1, :2] = xy
+            vertices[side_starts + 2 * slot + 1, 2] = vertex_heights
+        start = 2 * outgoing
+        end = 2 * slots[next_index]
+        # from the bottom at the start of the edge, to its end and up
+        quads = np.column_stack((start, end, end + 1, start + 1))
+        quads[vertex_clockwise] = quads[vertex_clockwise][:, [0, 3, 2, 1]]
+    else:
+        base = np.column_stack((xy, np.zeros(len(xy))))
+        next_base = base[next_index]
+        corner_points = np.stack((base, next_base, next_base.copy(), base.copy()), 1)
+        corner_points[:, 2:, 2] = vertex_heights[:, None]
+        corner_points[vertex_clockwise] = corner_points[vertex_clockwise][
+            :, [0, 3, 2, 1]
+        ]
+        vertices[side_starts[:, None] + 4 * e[:, None] + np.arange(4)] = corner_points
+        quads = 4 * e[:, None] + np.arange(4)
+    local = index_offsets[b] + cap_vertex_counts[b]
+    face_index = face_starts[b] + cap_face_counts[b] + 5 * e
+    faces[face_index] = 4
+    faces[face_index[:, None] + np.arange(1, 5)] = local[:, None] + quads
 
+    return vertices, faces, vertex_starts, face_starts, corners
+
+
+def create_building_mesh(
+    vertices: np.ndarray, faces: np.ndarray, indexed: bool
+) -> Mesh:
+    """Create a Mesh colored per vertex, or with a RenderMaterial if indexed."""
     color = COLOR_BLD  # (255<<24) + (100<<16) + (100<<8) + 100 # argb
+    if indexed:
+        obj = Mesh.create(
+            faces=faces.tolist(), vertices=vertices.ravel().tolist(), colors=[]
+        )
+        # the same color for the whole object, as a signed 32-bit argb
+        obj.renderMaterial = RenderMaterial(name="Building", diffuse=color - (1 << 32))
+    else:
+        obj = Mesh.create(
+            faces=faces.tolist(),
+            vertices=vertices.ravel().tolist(),
+            colors=[color] * len(vertices),
+        )
+    obj.units = "m"
+
+    return obj
+
 
-    if len(coords) < 3:
-        return None
-    # if the building has single outline
-    if len(coords_inner) == 0:
-        # bottom
-        bottom_vert_indices = list(range(len(coords)))
-        bottom_vertices = [[c["x"], c["y"]] for c in coords]
-        bottom_vert_indices, clockwise_orientation = fix_orientation(
-            bottom_vertices, bottom_vert_indices
+def get_payload_report(
+    meshes: int, vertices: int, corners: int, face_values: int, indexed: bool
+) -> dict:
+    """Count the numbers sent for the meshes, and without shared vertices."""
+    colors = 0 if indexed else vertices
+    return {
+        "meshes": meshes,
+        "vertices_before": corners,
+        "vertices": vertices,
+        "values_before": 4 * corners + face_values,
+        "values": 3 * vertices + colors + face_values,
+    }
+
+
+def extrude_buildings(
+    footprints: list[np.ndarray],
+    voids: list[list[np.ndarray]],
+    heights: list[float],
+    indexed: bool = False,
+    workers: int = 1,
+    triangulations: list[np.ndarray | None] | None = None,
+) -> tuple[list[Mesh | None], dict]:
+    """Create 3d Meshes from (n, 2) arrays of outer and inner coords and heights.
+
+    Returns the Meshes and a report of their payload size. With more than
+    one worker, the footprints are extruded in batches in processes. Known
+    cap triangulations can be passed as in extrude_footprints.
+    """
+    if triangulations is None:
+        triangulations = [None] * len(footprints)
+    batches = [
+        (
+            footprints[batch],
+            voids[batch],
+            heights[batch],
+            False,
+            indexed,
+            triangulations[batch],
         )
-        for c in coords:
-            vertices.extend([c["x"], c["y"], 0])
-            colors.append(color)
-        faces.extend([len(coords)] + bottom_vert_indices)
-
-        # top
-        top_vert_indices = list(range(len(coords), 2 * len(coords)))
-        for c in coords:
-            vertices.extend([c["x"], c["y"], height])
-            colors.append(color)
-
-        if clockwise_orientation is True:  # if facing down originally
-            top_vert_indices.reverse()
-        faces.extend([len(coords)] + top_vert_indices)
-
-        # sides
-        total_vertices = len(colors)
-        for i, c in enumerate(coords):
-            if i != len(coords) - 1:
-                next_coord_index = coords[i + 1]
-            else:
-                next_coord_index = coords[0]  # 0
+        for batch in split_batches(len(footprints), workers)
+    ]
+    results = map_batches(extrude_footprints, batches, workers)
+    # the face indices are local to each building, only the starts move
+    vertices = np.concatenate([r[0] for r in results])
+    faces = np.concatenate([r[1] for r in results])
+    vertex_offsets = np.cumsum([0] + [len(r[0]) for r in results])
+    face_offsets = np.cumsum([0] + [len(r[1]) for r in results])
+    vertex_starts = np.concatenate(
+        [r[2][:-1] + o for r, o in zip(results, vertex_offsets)] + [vertex_offsets[-1:]]
+    )
+    face_starts = np.concatenate(
+        [r[3][:-1] + o for r, o in zip(results, face_offsets)] + [face_offsets[-1:]]
+    )
+    corners = sum(r[4] for r in results)
+
+    meshes = []
+    for i in range(len(footprints)):
+        if vertex_starts[i] == vertex_starts[i + 1]:
+            meshes.append(None)
+            continue
+        obj = create_building_mesh(
+            vertices[vertex_starts[i] : vertex_starts[i + 1]],
+            faces[face_starts[i] : face_starts[i + 1]],
+            indexed,
+        )
+        meshes.append(obj)
 
-            side_vert_indices = list(range(total_vertices, total_vertices + 4))
-            faces.extend([4] + side_vert_indices)
-            side_vertices = create_side_face(
-                coords, i, next_coord_index, height, clockwise_orientation
+    report = get_payload_report(
+        len(meshes) - meshes.count(None), len(vertices), corners, len(faces), indexed
+    )
+    return meshes, report
+
+
+def extrude_buildings_by_cell(
+    footprints: list[np.ndarray],
+    voids: list[list[np.ndarray]],
+    heights: list[float],
+    cell_size: float,
+    indexed: bool = False,
+    workers: int = 1,
+    triangulations: list[np.ndarray | None] | None = None,
+) -> tuple[list[tuple], dict]:
+    """Create a merged 3d Mesh of the footprints in each square grid cell.
+
+    Footprints go to the cell of their vertex centroid. Returns, per cell
+    with geometry, the (column, row) of the cell, the Mesh, the indices of
+    the footprints in it and the start of their faces in the Mesh; and a
+    report of the payload size. Known cap triangulations can be passed as
+    in extrude_footprints.
+    """
+    if triangulations is None:
+        triangulations = [None] * len(footprints)
+    centroids = np.array(
+        [
+            np.asarray(coords, dtype=np.float64).reshape(-1, 2).mean(axis=0)
+            if len(coords)
+            else (0.0, 0.0)
+            for coords in footprints
+        ]
+    ).reshape(-1, 2)
+    cells = np.floor(centroids / cell_size).astype(np.int64)
+    order = np.lexsort((cells[:, 0], cells[:, 1]))  # row by row, stable
+
+    boundaries = np.flatnonzero(np.any(np.diff(cells[order], axis=0) != 0, axis=1))
+    groups = np.split(order, boundaries + 1) if len(order) else []
+    batches = [
+        (
+            [footprints[i] for i in indices],
+            [voids[i] for i in indices],
+            [heights[i] for i in indices],
+            True,
+            indexed,
+            [triangulations[i] for i in indices],
+        )
+        for indices in groups
+    ]
+
+    merged = []
+    totals = np.zeros(3, dtype=np.int64)  # vertices, corners, face values
+    for indices, result in zip(
+        groups, map_batches(extrude_footprints, batches, workers)
+    ):
+        vertices, faces, vertex_starts, face_starts, corners = result
+        has_geometry = vertex_starts[1:] > vertex_starts[:-1]
+        if not has_geometry.any():
+            continue
+        totals += (len(vertices), corners, len(faces))
+        merged.append(
+            (
+                tuple(cells[indices[0]].tolist()),
+                create_building_mesh(vertices, faces, indexed),
+                indices[has_geometry].tolist(),
+                np.append(face_starts[:-1][has_geometry], len(faces)).tolist(),
             )
-            # if clockwise_orientation is True:  # if facing down originally
-            #    side_vertices.reverse()
+        )
 
-            vertices.extend(side_vertices)
-            colors.extend([color, color, color, color])
-            total_vertices += 4
+    report = get_payload_report(len(merged), *totals.tolist(), indexed)
+    return merged, report
 
-    else:  # if outline contains holes and mesh needs to be constructed
-        # bottom
-        try:
-            total_vertices = 0
-            triangulated_geom, _ = to_triangles(coords, coords_inner)
-        except Exception as e:  # default to only outer border mesh generation
-            print(f"Mesh creation failed: {e}")
-            return extrude_building(coords, [], height)
-
-        if triangulated_geom is None:  # default to only outer border mesh generation
-            return extrude_building(coords, [], height)
-
-        pt_list = [[p[0], p[1], 0] for p in triangulated_geom["vertices"]]
-        triangle_list = [trg for trg in triangulated_geom["triangles"]]
-
-        for trg in triangle_list:
-            a = trg[0]
-            b = trg[1]
-            c = trg[2]
-            vertices.extend(pt_list[a] + pt_list[b] + pt_list[c])
-            colors.extend([color, color, color])
-            total_vertices += 3
-
-            # all faces are counter-clockwise now (facing up)
-            # therefore, add vertices in the reverse (clockwise) order (facing down)
-            faces.extend(
-                [3, total_vertices - 1, total_vertices - 2, total_vertices - 3]
-            )
 
-        # top
-        pt_list = [[p[0], p[1], height] for p in triangulated_geom["vertices"]]
-
-        for trg in triangle_list:
-            a = trg[0]
-            b = trg[1]
-            c = trg[2]
-            # all faces are counter-clockwise now (facing up)
-            vertices.extend(pt_list[a] + pt_list[b] + pt_list[c])
-            colors.extend([color, color, color])
-            total_vertices += 3
-            faces.extend(
-                [3, total_vertices - 3, total_vertices - 2, total_vertices - 1]
-            )
+def extrude_building(
+    coords: np.ndarray, coords_inner: list[np.ndarray], height: float
+) -> Mesh:
+    """Create a 3d Mesh from the (n, 2) arrays of outer and inner coords and height."""
+    meshes, _ = extrude_buildings([coords], [coords_inner], [height])
+    return meshes[0]
+
+
+def buffer_polylines(
+    polylines: list[np.ndarray], values: list[float], quad_segs: int = 8
+) -> tuple[np.ndarray, list[int]]:
+    """Buffer all (n, 2) polylines with at least 2 points and a value at once.
+
+    Returns the array of shapely Polygons and the indices of their polylines.
+    """
+    valid = [
+        i
+        for i, (coords, value) in enumerate(zip(polylines, values))
+        if value is not None and len(coords) > 1
+    ]
+    if not valid:
+        return np.empty(0, dtype=object), valid
+
+    xy, _, counts = flatten_coords([polylines[i] for i in valid])
+    lines = shapely.linestrings(xy, indices=np.repeat(np.arange(len(valid)), counts))
+    areas = shapely.buffer(
+        lines,
+        np.array([values[i] for i in valid], dtype=np.float64),
+        quad_segs=quad_segs,
+        cap_style="square",
+    )
+    return areas, valid
 
-        # sides
-        bottom_vert_indices = list(range(len(coords)))
-        bottom_vertices = [[c["x"], c["y"]] for c in coords]
-        bottom_vert_indices, clockwise_orientation = fix_orientation(
-            bottom_vertices, bottom_vert_indices
-        )
-        for i, c in enumerate(coords):
-            if i != len(coords) - 1:
-                next_coord_index = coords[i + 1]
-            else:
-                next_coord_index = coords[0]  # 0
 
-            side_vert_indices = list(range(total_vertices, total_vertices + 4))
-            faces.extend([4] + side_vert_indices)
-            side_vertices = create_side_face(
-                coords, i, next_coord_index, height, clockwise_orientation
-            )
+def get_road_buffer_rings(
+    polylines: list[np.ndarray], values: list[float], quad_segs: int = 8
+) -> tuple[np.ndarray]:
+    """Buffer the (n, 2) polylines and get the open rings around them as arrays.
 
-            vertices.extend(side_vertices)
-            colors.extend([color, color, color, color])
-            total_vertices += 4
+    Returns the ring coords, the number of coords per polyline (0 without
+    a buffer) and whether each ring is clockwise.
+    """
+    ring_counts = np.zeros(len(polylines), dtype=np.int64)
+    clockwise = np.zeros(len(polylines), dtype=bool)
+    areas, valid = buffer_polylines(polylines, values, quad_segs)
+    if not valid:
+        return np.empty((0, 2)), ring_counts, clockwise
 
-        # voids sides
-        for _, local_coords_inner in enumerate(coords_inner):
-            bottom_void_vert_indices = list(range(len(local_coords_inner)))
-            bottom_void_vertices = [[c["x"], c["y"]] for c in local_coords_inner]
-            bottom_void_vert_indices, clockwise_orientation_void = fix_orientation(
-                bottom_void_vertices, bottom_void_vert_indices
-            )
+    coords, ring_index = shapely.get_coordinates(
+        shapely.get_exterior_ring(areas), return_index=True
+    )
+    counts = np.bincount(ring_index, minlength=len(valid))
+    starts = np.cumsum(counts) - counts
+
+    # drop the closing vertex of each ring
+    is_last = np.zeros(len(coords), dtype=bool)
+    is_last[(starts + counts - 1)[counts > 0]] = True
+    coords = coords[~is_last]
+    counts = np.maximum(counts - 1, 0)
+    starts = np.cumsum(counts) - counts
+
+    # faces facing up: reverse the clockwise rings (positive shoelace sum)
+    next_index = np.arange(1, len(coords) + 1)
+    next_index[(starts + counts - 1)[counts > 0]] = starts[counts > 0]
+    shoelace = (coords[next_index, 0] - coords[:, 0]) * (
+        coords[next_index, 1] + coords[:, 1]
+    )
+    ring_counts[valid] = counts
+    clockwise[np.array(valid)[counts > 0]] = (
+        np.add.reduceat(shoelace, starts[counts > 0]) > 0
+    )
 
-            for i, c in enumerate(local_coords_inner):
-                if i != len(local_coords_inner) - 1:
-                    next_coord_index = local_coords_inner[i + 1]
-                else:
-                    next_coord_index = local_coords_inner[0]  # 0
-
-                side_vert_indices = list(range(total_vertices, total_vertices + 4))
-                faces.extend([4] + side_vert_indices)
-                side_vertices = create_side_face(
-                    local_coords_inner,
-                    i,
-                    next_coord_index,
-                    height,
-                    clockwise_orientation_void,
-                )
-                vertices.extend(side_vertices)
-                colors.extend([color, color, color, color])
-                total_vertices += 4
-
-    obj = Mesh.create(faces=faces, vertices=vertices, colors=colors)
-    obj.units = "m"
+    return coords, ring_counts, clockwise
 
-    return obj
 
+def road_buffers(
+    polylines: list[np.ndarray],
+    values: list[float],
+    quad_segs: int = 8,
+    workers: int = 1,
+) -> list[Base | None]:
+    """Create Meshes of all road (n, 2) polylines buffered by their values at once.
+
+    quad_segs is the number of segments of a quarter circle at the joins.
+    Polylines that are too short or without a value get None. With more
+    than one worker, the buffers are computed in batches in processes.
+    """
+    color = COLOR_ROAD  # (255<<24) + (150<<16) + (150<<8) + 150 # argb
+    batches = [
+        (polylines[batch], values[batch], quad_segs)
+        for batch in split_batches(len(polylines), workers)
+    ]
+    rings = map_batches(get_road_buffer_rings, batches, workers)
+    coords = np.concatenate([r[0] for r in rings])
+    ring_counts = np.concatenate([r[1] for r in rings])
+    clockwise = np.concatenate([r[2] for r in rings])
+    ring_starts = np.cumsum(ring_counts) - ring_counts
+
+    results = [None] * len(polylines)
+    vertices = np.column_stack((coords, np.zeros(len(coords)))).ravel().tolist()
+    for i, (start, count) in enumerate(zip(ring_starts.tolist(), ring_counts.tolist())):
+        if count < 3:  # not buffered, or buffer of a zero-length line
+            continue
+        face_list = list(range(count))
+        if clockwise[i]:
+            face_list.reverse()
+        mesh = Mesh.create(
+            vertices=vertices[3 * start : 3 * (start + count)],
+            colors=[color] * count,
+            faces=[count] + face_list,
+        )
+        mesh.units = "m"
+
+        results[i] = Base(
+            units="m",
+            displayValue=[mesh],
+            width=2 * values[i],
+            source_data="© OpenStreetMap",
+            source_url="https://www.openstreetmap.org/",
+        )
+
+    return results
 
-def road_buffer(poly: Polyline, value: float) -> Base:
-    """Creage a Mesh from Polyline and buffer value."""
-    if value is None:
-        return
-    line = LineString([(p.x, p.y) for p in poly.as_points()])
-    area = to_geojson(buffer(line, value, cap_style="square"))  # POLYGON to geojson
-    area = json.loads(area)
-    vertices = []
-    colors = []
-    vetricesTuples = []
 
+def union_road_buffers(
+    polylines: list[np.ndarray],
+    values: list[float],
+    classes: list[str],
+    quad_segs: int = 8,
+    cell_size: float | None = None,
+) -> tuple[list[Base], dict]:
+    """Create a triangulated Mesh of the union of the buffered roads per class.
+
+    With cell_size, the union of each class is cut into square grid cells,
+    with a Mesh per cell. Returns the objects and a report of the number of
+    meshes and triangles, with and without the union.
+    """
     color = COLOR_ROAD  # (255<<24) + (150<<16) + (150<<8) + 150 # argb
+    areas, valid = buffer_polylines(polylines, values, quad_segs)
+    valid_classes = np.array([classes[i] for i in valid], dtype=object)
+    # each buffer alone is an n-gon of n - 2 triangles
+    ring_counts = shapely.get_num_coordinates(shapely.get_exterior_ring(areas)) - 1
+    report = {
+        "meshes_before": len(valid),
+        "triangles_before": int(np.maximum(ring_counts - 2, 0).sum()),
+    }
+
+    results = []
+    for road_class in sorted(set(valid_classes.tolist())):
+        union = shapely.union_all(areas[valid_classes == road_class])
+        if cell_size:
+            xmin, ymin, xmax, ymax = (shapely.bounds(union) / cell_size).tolist()
+            cells = [
+                (column, row)
+                for row in range(math.floor(ymin), math.ceil(ymax))
+                for column in range(math.floor(xmin), math.ceil(xmax))
+            ]
+            corners = np.array(cells, dtype=np.float64).reshape(-1, 2) * cell_size
+            parts = shapely.intersection(
+                union, shapely.box(*corners.T, *(corners + cell_size).T)
+            )
+        else:
+            cells = [None]
+            parts = [union]
+
+        for cell, part in zip(cells, parts):
+            vertices, triangles = triangulate_polygons(shapely.get_parts(part))
+            if len(triangles) == 0:
+                continue
+            vertices = np.column_stack((vertices, np.zeros(len(vertices))))
+            faces = np.column_stack((np.full(len(triangles), 3), triangles))
+            mesh = Mesh.create(
+                vertices=vertices.ravel().tolist(),
+                colors=[color] * len(vertices),
+                faces=faces.ravel().tolist(),
+            )
+            mesh.units = "m"
+            base_obj = Base(
+                units="m",
+                displayValue=[mesh],
+                highway=road_class,
+                source_data="© OpenStreetMap",
+                source_url="https://www.openstreetmap.org/",
+            )
+            if cell is not None:
+                base_obj.cell = list(cell)
+                base_obj.cell_size = cell_size
+            results.append(base_obj)
 
-    for i, c in enumerate(area["coordinates"][0]):
-        if i != len(area["coordinates"][0]) - 1:
-            vertices.extend(c + [0])
-            vetricesTuples.append(c)
-            colors.append(color)
+    report["meshes"] = len(results)
+    report["triangles"] = sum(len(r.displayValue[0].faces) // 4 for r in results)
+    return results, report
 
-    face_list = list(range(len(vetricesTuples)))
-    face_list, _ = fix_orientation(vetricesTuples, face_list)
-    face_list.reverse()
 
-    mesh = Mesh.create(
-        vertices=vertices, colors=colors, faces=[len(vetricesTuples)] + face_list
-    )
-    mesh.units = "m"
-
-    return Base(
-        units="m",
-        displayValue=[mesh],
-        width=2 * value,
-        source_data="© OpenStreetMap",
-        source_url="https://www.openstreetmap.org/",
+def triangulate_polygons(polygons: np.ndarray) -> tuple[np.ndarray]:
+    """Triangulate shapely Polygons with holes into one vertex and triangle array."""
+    vertices = []
+    triangles = []
+    count = 0
+    for polygon in polygons:
+        if not isinstance(polygon, shapely.Polygon) or polygon.is_empty:
+            continue  # points or lines left by cutting
+        polygon_vertices, polygon_triangles = triangulate_polygon(
+            shapely.get_coordinates(polygon.exterior)[:-1],
+            [shapely.get_coordinates(ring)[:-1] for ring in polygon.interiors],
+        )
+        vertices.append(polygon_vertices)
+        triangles.append(polygon_triangles + count)
+        count += len(polygon_vertices)
+
+    return (
+        np.concatenate(vertices or [np.empty((0, 2))]),
+        np.concatenate(triangles or [np.empty((0, 3), dtype=np.int64)]),
     )
 
 
@@ -413,7 +614,7 @@ def split_ways_by_intersection(ways: list[dict], tags: list[dict]) -> tuple[list
             pass
 
         if len(list(set(ids))) < len(ids):  # if there are repetitions
-            wList = fill_list(ids, [])
+            wList = split_by_repeated_values(ids)
             for item in wList:
                 x = copy(w)
                 x["nodes"] = item
@@ -426,12 +627,12 @@ def split_ways_by_intersection(ways: list[dict], tags: list[dict]) -> tuple[list
     return splitWays, splitTags
 
 
-def join_roads(coords: list[dict], closed: bool, height: float) -> Polyline:
-    """Create a Polyline from a list of coordinates."""
+def join_roads(coords: np.ndarray, closed: bool, height: float) -> Polyline:
+    """Create a Polyline from an (n, 2) array of coordinates."""
     points = []
 
-    for c in coords:
-        points.append(Point.from_list([c["x"], c["y"], 0]))
+    for x, y in np.asarray(coords).tolist():
+        points.append(Point.from_list([x, y, 0]))
 
     poly = Polyline.from_points(points)
     poly.closed = closed
@@ -0,0 +1,173 @@
+import random
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass
+
+import requests
+from requests.adapters import HTTPAdapter
+
+HTTP_POOL_SIZE = 16
+HTTP_CONNECT_TIMEOUT = 10  # seconds
+HTTP_READ_TIMEOUT = 60  # seconds, between bytes
+HTTP_TOTAL_TIMEOUT = 300  # seconds, for all attempts and the body of a request
+HTTP_MAX_RETRIES = 4
+HTTP_BACKOFF_BASE = 0.5  # seconds
+HTTP_BACKOFF_MAX = 30  # seconds
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+@dataclass
+class RequestMetrics:
+    """Transfer statistics of a single request (including its retries)."""
+
+    url: str
+    status_code: int = 0
+    attempts: int = 0
+    bytes: int = 0  # decoded body size
+    wire_bytes: int = 0  # body size as transferred (compressed)
+    latency: float = 0.0  # seconds until the response headers arrived
+    duration: float = 0.0  # seconds until the body was read
+
+
+class HttpClient:
+    """Pooled HTTP client with compression, timeouts, retries and metrics.
+
+    All outbound requests share one keep-alive connection pool per host.
+    Requests failing with a connection error, a timeout or a 429/5xx status
+    are retried with jittered exponential backoff (or after Retry-After),
+    as long as the total timeout of the request allows it.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = HTTP_POOL_SIZE,
+        connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+        read_timeout: float = HTTP_READ_TIMEOUT,
+        total_timeout: float = HTTP_TOTAL_TIMEOUT,
+        max_retries: int = HTTP_MAX_RETRIES,
+    ) -> None:
+        """Create the session and its connection pools."""
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+        self.max_retries = max_retries
+        self.metrics: list[RequestMetrics] = []
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+
+    def get(
+        self,
+        url: str,
+        params: dict | None = None,
+        headers: dict | None = None,
+        stream: bool = False,
+        read_timeout: float | None = None,
+        total_timeout: float | None = None,
+    ) -> requests.Response:
+        """Send a GET request, retrying transient failures.
+
+        With stream=True, read the body through iter_content, which applies the
+        remaining total timeout and completes the metrics of the request.
+        """
+        read_timeout = read_timeout or self.read_timeout
+        deadline = time.monotonic() + (total_timeout or self.total_timeout)
+        metrics = RequestMetrics(url=url)
+        self.metrics.append(metrics)
+        start = time.monotonic()
+
+        for attempt in range(self.max_retries + 1):
+            metrics.attempts = attempt + 1
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise requests.Timeout(f"Total timeout exceeded for {url}")
+            try:
+                response = self.session.get(
+                    url,
+                    params=params,
+                    headers=headers,
+                    stream=True,
+                    timeout=(
+                        min(self.connect_timeout, remaining),
+                        min(read_timeout, remaining),
+                    ),
+                )
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                self._sleep(self._backoff(attempt), deadline)
+                continue
+
+            metrics.status_code = response.status_code
+            if (
+                response.status_code in RETRY_STATUS_CODES
+                and attempt < self.max_retries
+            ):
+                delay = self._retry_after(response) or self._backoff(attempt)
+                response.close()
+                self._sleep(delay, deadline)
+                continue
+            break
+
+        metrics.latency = time.monotonic() - start
+        response.metrics = metrics
+        response.deadline = deadline
+        response.started = start
+        if not stream:
+            response._content = b"".join(self.iter_content(response))
+            response._content_consumed = True
+        return response
+
+    def iter_content(
+        self, response: requests.Response, chunk_size: int = 64 * 1024
+    ) -> Iterator[bytes]:
+        """Yield the decoded body in chunks, within the total timeout of the request."""
+        metrics = response.metrics
+        try:
+            for chunk in response.iter_content(chunk_size):
+                metrics.bytes += len(chunk)
+                if time.monotonic() > response.deadline:
+                    raise requests.Timeout(f"Total timeout exceeded for {metrics.url}")
+                yield chunk
+        finally:
+            metrics.duration = time.monotonic() - response.started
+            try:
+                metrics.wire_bytes = response.raw.tell()
+            except (AttributeError, OSError):
+                metrics.wire_bytes = metrics.bytes
+            response.close()
+
+    def summary(self) -> dict:
+        """Aggregate the metrics of all requests sent so far."""
+        return {
+            "requests": len(self.metrics),
+            "retries": sum(m.attempts - 1 for m in self.metrics),
+            "bytes": sum(m.bytes for m in self.metrics),
+            "wire_bytes": sum(m.wire_bytes for m in self.metrics),
+            "max_latency": max((m.latency for m in self.metrics), default=0.0),
+            "total_duration": sum(m.duration for m in self.metrics),
+        }
+
+    def _backoff(self, attempt: int) -> float:
+        """Exponential backoff with full jitter."""
+        return random.uniform(
+            0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2**attempt)
+        )
+
+    def _retry_after(self, response: requests.Response) -> float | None:
+        """Delay requested by the server (in seconds), if any."""
+        try:
+            return min(float(response.headers["Retry-After"]), HTTP_BACKOFF_MAX)
+        except (KeyError, ValueError):
+            return None
+
+    def _sleep(self, delay: float, deadline: float) -> None:
+        """Wait before the next attempt, but not beyond the deadline."""
+        time.sleep(max(0.0, min(delay, deadline - time.monotonic())))
+
+
+# shared by all modules, so that connections are reused across requests
+http_client = HttpClient()
@@ -0,0 +1,110 @@
+import codecs
+import json
+from collections.abc import Iterable, Iterator
+
+WHITESPACE = " \t\n\r"
+DELIMITERS = WHITESPACE + ",:]}"
+# drop the consumed part of the buffer once it grows beyond this many characters
+COMPACT_THRESHOLD = 1 << 16
+
+_decoder = json.JSONDecoder()
+
+
+class _Buffer:
+    """Text buffer over a stream of byte chunks, refilled on demand."""
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self.chunks = iter(chunks)
+        self.utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.pos = 0
+        self.exhausted = False
+
+    def fill(self) -> bool:
+        """Append the next chunk, return False if the stream has ended."""
+        if self.exhausted:
+            return False
+        if self.pos > COMPACT_THRESHOLD:
+            self.text = self.text[self.pos :]
+            self.pos = 0
+        for chunk in self.chunks:
+            text = self.utf8.decode(chunk)
+            if text:
+                self.text += text
+                return True
+        self.text += self.utf8.decode(b"", final=True)
+        self.exhausted = True
+        return False
+
+    def peek(self) -> str:
+        """Get the next non-whitespace character without consuming it."""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                raise ValueError("Unexpected end of JSON stream")
+
+    def expect(self, char: str) -> None:
+        """Consume the next non-whitespace character, which must be char."""
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at JSON stream position {self.pos}")
+        self.pos += 1
+
+    def decode_value(self):
+        """Decode the next complete JSON value, reading more chunks if needed."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # inside an object a value is always followed by a delimiter,
+            # without one (e.g. "0." of "0.6") it may continue in the next chunk
+            if (
+                end == len(self.text) or self.text[end] not in DELIMITERS
+            ) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_array(
+    chunks: Iterable[bytes], array_key: str, other_values: dict | None = None
+) -> Iterator:
+    """Yield the items of one array of a JSON object streamed as byte chunks.
+
+    Only a single array item is decoded at a time, so the full document is
+    never held in memory. The other (small) top-level values are collected
+    into other_values, the ones after the array once the iterator is exhausted.
+    """
+    if other_values is None:
+        other_values = {}
+    buffer = _Buffer(chunks)
+    buffer.expect("{")
+    if buffer.peek() == "}":
+        return
+
+    while True:
+        key = buffer.decode_value()
+        buffer.expect(":")
+        if key == array_key:
+            buffer.expect("[")
+            if buffer.peek() == "]":
+                buffer.pos += 1
+            else:
+                while True:
+                    yield buffer.decode_value()
+                    if buffer.peek() == "]":
+                        buffer.pos += 1
+                        break
+                    buffer.expect(",")
+        else:
+            other_values[key] = buffer.decode_value()
+
+        if buffer.peek() == "}":
+            return
+        buffer.expect(",")
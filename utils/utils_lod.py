@@ -0,0 +1,147 @@
+import math
+
+import numpy as np
+import shapely
+
+from utils.utils_clip import flatten_coords
+
+# (up to the distance from the origin, simplification tolerance, minimum area)
+# in meters and square meters; the nearest buildings are kept as they are
+LOD_BANDS = (
+    (250, 0.0, 0.0),
+    (500, 0.5, 0.0),
+    (1000, 1.0, 20.0),
+    (math.inf, 2.0, 50.0),
+)
+
+
+def get_footprint_polygons(
+    footprints: list[np.ndarray], voids: list[list[np.ndarray]]
+) -> np.ndarray:
+    """Create shapely Polygons of all footprints with their voids at once.
+
+    Footprints with less than 3 points get None, shorter voids are skipped.
+    """
+    rings = []
+    ring_polygons = []
+    for i, (coords, coords_inner) in enumerate(zip(footprints, voids)):
+        if len(coords) < 3:
+            continue
+        rings.extend([coords, *(c for c in coords_inner if len(c) >= 3)])
+        ring_polygons.extend([i] * (len(rings) - len(ring_polygons)))
+
+    polygons = np.full(len(footprints), None, dtype=object)
+    if not rings:
+        return polygons
+    xy, starts, counts = flatten_coords(rings)
+    # repeat the first point of each ring at its end
+    closed = np.insert(xy, starts + counts, xy[starts], axis=0)
+    linearrings = shapely.linearrings(
+        closed, indices=np.repeat(np.arange(len(rings)), counts + 1)
+    )
+    ring_polygons = np.array(ring_polygons)
+    built = np.unique(ring_polygons)
+    polygons[built] = shapely.polygons(linearrings, indices=ring_polygons)[built]
+
+    return polygons
+
+
+def count_vertices(
+    footprints: list[np.ndarray], voids: list[list[np.ndarray]]
+) -> np.ndarray:
+    """Count the vertices of each footprint with its voids."""
+    return np.array(
+        [
+            len(coords) + sum(len(c) for c in coords_inner)
+            for coords, coords_inner in zip(footprints, voids)
+        ],
+        dtype=np.int64,
+    )
+
+
+def simplify_buildings(
+    footprints: list[np.ndarray],
+    voids: list[list[np.ndarray]],
+    bands: tuple[tuple] = LOD_BANDS,
+) -> tuple[list[np.ndarray], list[list[np.ndarray]], np.ndarray, list[dict]]:
+    """Simplify the footprints (around the site origin) more the farther they are.
+
+    Rings are simplified with the tolerance of the distance band of their
+    vertex centroid, and buildings smaller than the minimum area of the band
+    are dropped. A simplified footprint is only used if it is still a valid
+    polygon with all of its voids. Returns the footprints, the voids, a mask
+    of the kept ones and a report per band.
+    """
+    centroids = np.array(
+        [
+            np.asarray(coords, dtype=np.float64).reshape(-1, 2).mean(axis=0)
+            if len(coords)
+            else (0.0, 0.0)
+            for coords in footprints
+        ]
+    ).reshape(-1, 2)
+    band_index = np.searchsorted(
+        [distance for distance, _, _ in bands[:-1]], np.hypot(*centroids.T)
+    )
+    tolerances = np.array([tolerance for _, tolerance, _ in bands])[band_index]
+    min_areas = np.array([min_area for _, _, min_area in bands])[band_index]
+    vertices_before = count_vertices(footprints, voids)
+
+    # only valid footprints of the outer bands are touched
+    candidates = (tolerances > 0) | (min_areas > 0)
+    polygons = np.full(len(footprints), None, dtype=object)
+    polygons[candidates] = get_footprint_polygons(
+        [footprints[i] for i in np.flatnonzero(candidates)],
+        [voids[i] for i in np.flatnonzero(candidates)],
+    )
+    candidates &= shapely.is_valid(polygons)  # False for None
+
+    keep = np.ones(len(footprints), dtype=bool)
+    keep[candidates] = shapely.area(polygons[candidates]) >= min_areas[candidates]
+
+    simplify = np.flatnonzero(candidates & keep & (tolerances > 0))
+    simplified = shapely.simplify(
+        polygons[simplify], tolerances[simplify], preserve_topology=True
+    )
+    accepted = (
+        shapely.is_valid(simplified)
+        & (shapely.get_type_id(simplified) == shapely.GeometryType.POLYGON)
+        & (
+            shapely.get_num_interior_rings(simplified)
+            == shapely.get_num_interior_rings(polygons[simplify])
+        )
+    )
+
+    footprints = list(footprints)
+    voids = list(voids)
+    rings, polygon_index = shapely.get_rings(simplified[accepted], return_index=True)
+    coords, ring_index = shapely.get_coordinates(rings, return_index=True)
+    ring_ends = np.cumsum(np.bincount(ring_index, minlength=len(rings)))
+    # without the closing point of each ring
+    ring_coords = (
+        [r[:-1] for r in np.split(coords, ring_ends[:-1])] if len(rings) else []
+    )
+    rings_per_polygon = np.bincount(polygon_index, minlength=accepted.sum())
+    k = 0
+    for i, count in zip(simplify[accepted].tolist(), rings_per_polygon.tolist()):
+        footprints[i] = ring_coords[k]
+        voids[i] = ring_coords[k + 1 : k + count]
+        k += count
+
+    vertices = count_vertices(footprints, voids) * keep
+    report = []
+    start = 0
+    for k, (distance, _, _) in enumerate(bands):
+        in_band = band_index == k
+        report.append(
+            {
+                "band": f"{start}-{distance} m",
+                "buildings": int(in_band.sum()),
+                "dropped": int((in_band & ~keep).sum()),
+                "vertices_before": int(vertices_before[in_band].sum()),
+                "vertices": int(vertices[in_band].sum()),
+            }
+        )
+        start = distance
+
+    return footprints, voids, keep, report
@@ -0,0 +1,102 @@
+import hashlib
+import os
+
+import numpy as np
+
+from utils.utils_cache import CACHE_FOLDER, DiskCache, cache_key
+from utils.utils_earcut import clean_polygon, triangulate_polygon
+from utils.utils_parallel import map_batches, split_batches
+
+# triangulated caps of buildings are reused between runs at the same site (and
+# true north rotation), the cache is off with 0 bytes
+MESH_CACHE_MAX_BYTES = int(os.getenv("MESH_CACHE_MAX_BYTES", 256 * 1024**2))
+# smaller polygons are triangulated faster than read from the disk
+MESH_CACHE_MIN_VERTICES = 32
+# rings are hashed relative to their first vertex, snapped to this grid, so
+# that float noise of the projection does not change the keys; other sites
+# project the buildings differently (site-centred CRS), so they do not hit
+MESH_CACHE_GRID = 0.001  # meters
+# part of every key, to be increased whenever the triangulation changes
+MESH_CACHE_VERSION = 1
+# int32 indices hardly compress, so a fast compression level is used
+mesh_cache = DiskCache(
+    os.path.join(CACHE_FOLDER, "meshes"),
+    max_bytes=MESH_CACHE_MAX_BYTES,
+    compress_level=1,
+)
+
+
+def get_triangulation_key(
+    osm_id: int, vertices: np.ndarray, hole_indices: list[int]
+) -> str:
+    """Get the cache key of the cleaned polygon of a building.
+
+    The projection (including the true north rotation of the site) is part
+    of the key through the projected coords, so only runs at the same site
+    and rotation share entries.
+    """
+    grid = np.round((vertices - vertices[0]) / MESH_CACHE_GRID).astype("<i8")
+    digest = hashlib.sha256(grid.tobytes())
+    return cache_key(MESH_CACHE_VERSION, osm_id, hole_indices, digest.hexdigest())
+
+
+def triangulate_footprints(
+    footprints: list[np.ndarray], voids: list[list[np.ndarray]]
+) -> list[np.ndarray]:
+    """Triangulate the footprints with their voids, as in extrude_footprints."""
+    return [
+        triangulate_polygon(coords, coords_inner)[1]
+        for coords, coords_inner in zip(footprints, voids)
+    ]
+
+
+def get_cached_triangulations(
+    osm_ids: list[int],
+    footprints: list[np.ndarray],
+    voids: list[list[np.ndarray]],
+    workers: int = 1,
+) -> tuple[list[np.ndarray | None], dict]:
+    """Get the cap triangles of the large footprints with voids, using the cache.
+
+    Only the footprints missing from the cache are triangulated (and then
+    cached). Returns the triangles (None for footprints left to
+    extrude_footprints) and a report of the cache hits and misses.
+    """
+    triangulations = [None] * len(footprints)
+    hits = 0
+    misses = []
+    for i, (osm_id, coords, coords_inner) in enumerate(zip(osm_ids, footprints, voids)):
+        # as in extrude_footprints, degenerate voids are dropped
+        coords_inner = [ring for ring in coords_inner if len(ring) >= 3]
+        if len(coords_inner) == 0 or len(coords) < 3:
+            continue
+        vertices, hole_indices = clean_polygon(coords, coords_inner)
+        if len(vertices) < MESH_CACHE_MIN_VERTICES:
+            continue
+        key = get_triangulation_key(osm_id, vertices, hole_indices)
+        data = mesh_cache.get(key)
+        if data is not None and len(data) % 12 == 0:
+            triangles = np.frombuffer(data, "<i4").reshape(-1, 3).astype(np.int64)
+            # guard against corrupted or colliding entries
+            if triangles.size == 0 or triangles.max() < len(vertices):
+                triangulations[i] = triangles
+                hits += 1
+                continue
+        misses.append((i, key))
+
+    batches = [
+        (
+            [footprints[i] for i, _ in misses[batch]],
+            [voids[i] for i, _ in misses[batch]],
+        )
+        for batch in split_batches(len(misses), workers)
+    ]
+    results = map_batches(triangulate_footprints, batches, workers)
+    for (i, key), triangles in zip(misses, (t for r in results for t in r)):
+        triangulations[i] = triangles
+        mesh_cache.set(key, triangles.astype("<i4").tobytes(), evict=False)
+    if misses:
+        mesh_cache.evict()
+
+    report = {"hits": hits, "misses": len(misses)}
+    return triangulations, report
@@ -1,365 +1,657 @@
-import requests
+import math
+import os
+from array import array
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from shapely import Polygon
 from specklepy.objects import Base
 from specklepy.objects.geometry import Mesh
 
+from utils.utils_clip import clip_buildings, clip_polylines
 from utils.utils_geometry import (
-    extrude_building,
+    extrude_buildings,
+    extrude_buildings_by_cell,
     join_roads,
-    road_buffer,
-    rotate_pt,
+    road_buffers,
     split_ways_by_intersection,
+    union_road_buffers,
 )
+from utils.utils_lod import simplify_buildings
+from utils.utils_mesh_cache import MESH_CACHE_MAX_BYTES, get_cached_triangulations
+from utils.utils_osm_extract import LocalExtractDataSource
+from utils.utils_osm_source import OsmDataSource, OverpassDataSource
 from utils.utils_other import (
-    clean_string,
     get_degrees_bbox_from_lat_lon_rad,
+    parse_number,
+    split_bbox,
 )
-from utils.utils_pyproj import create_crs, reproject_to_crs
+from utils.utils_parallel import get_mesh_workers
+from utils.utils_pyproj import ProjectionContext
+
+OSM_KEYWORDS = ["building", "highway"]
+# tags read by get_buildings and get_roads, all other tags are dropped on parsing
+OSM_TAG_KEYS = ("building", "building:levels", "height", "layer", "highway", "area")
+# relation members are stored as codes of their type and role
+MEMBER_NODE, MEMBER_WAY, MEMBER_RELATION = 0, 1, 2
+MEMBER_TYPES = {"node": MEMBER_NODE, "way": MEMBER_WAY, "relation": MEMBER_RELATION}
+ROLE_OTHER, ROLE_OUTER, ROLE_INNER = 0, 1, 2
+MEMBER_ROLES = {"outer": ROLE_OUTER, "inner": ROLE_INNER}
+
+BUILDING_HEIGHT = 9  # meters, if not tagged
+LEVEL_HEIGHT = 3  # meters
+# half of the road mesh width by highway class, in meters
+ROAD_BUFFERS = {"primary": 12, "secondary": 7}
+ROAD_BUFFER = 2  # other classes
+# segments per quarter circle at the road mesh joins
+ROAD_QUAD_SEGS = int(os.getenv("ROAD_QUAD_SEGS", 8))
+
+# large areas are fetched as a grid of smaller queries, run concurrently
+OSM_CHUNK_MIN_SIZE = float(os.getenv("OSM_CHUNK_MIN_SIZE", 1000))  # bbox side, m
+OSM_CHUNK_MAX_ELEMENTS = int(os.getenv("OSM_CHUNK_MAX_ELEMENTS", 20000))
+OSM_CHUNK_MAX_GRID = 8
+# the public Overpass instances allow a couple of concurrent queries per client
+OSM_CHUNK_WORKERS = int(os.getenv("OSM_CHUNK_WORKERS", 2))
+METERS_PER_DEGREE_LAT = 111_320
+
+
+class OsmElements:
+    """Columnar store of the OSM elements of a response, filled while it is parsed.
+
+    Nodes are kept as flat arrays of IDs and coordinates. The node IDs of
+    ways and the members of relations are concatenated into flat arrays,
+    with the start of each element in an offsets array (CSR layout). Tags
+    are parallel columns per key, holding only the tags used by the builders
+    (None where an element has no such tag).
+    """
+
+    def __init__(self) -> None:
+        """Create an empty store."""
+        self.node_ids = array("q")
+        self.node_lats = array("d")
+        self.node_lons = array("d")
+
+        self.way_ids = array("q")
+        self.way_offsets = array("q", [0])
+        self.way_nodes = array("q")
+        self.way_tags = {key: [] for key in OSM_TAG_KEYS}
+        self.way_rows: dict[int, int] = {}
+
+        self.relation_ids = array("q")
+        self.member_offsets = array("q", [0])
+        self.member_types = array("b")
+        self.member_refs = array("q")
+        self.member_roles = array("b")
+        self.relation_tags = {key: [] for key in OSM_TAG_KEYS}
+        self.relation_rows: dict[int, int] = {}
+
+    def add(self, element: dict) -> None:
+        """Route a parsed element into its columns."""
+        element_type = element["type"]
+        if element_type == "node":
+            self.node_ids.append(element["id"])
+            self.node_lats.append(element["lat"])
+            self.node_lons.append(element["lon"])
+        elif element_type == "way":
+            tags = element.get("tags") or {}
+            row = self.way_rows.get(element["id"])
+            if row is not None:
+                # an untagged ("skel") repetition of a stored way adds nothing,
+                # a tagged one completes a way stored as a relation member
+                if tags:
+                    set_tags(self.way_tags, row, tags)
+                return
+            self.way_rows[element["id"]] = len(self.way_ids)
+            self.way_ids.append(element["id"])
+            self.way_nodes.extend(element["nodes"])
+            self.way_offsets.append(len(self.way_nodes))
+            append_tags(self.way_tags, tags)
+        elif element_type == "relation":
+            if element["id"] in self.relation_rows:
+                return
+            self.relation_rows[element["id"]] = len(self.relation_ids)
+            self.relation_ids.append(element["id"])
+            for member in element["members"]:
+                self.member_types.append(MEMBER_TYPES[member["type"]])
+                self.member_refs.append(member["ref"])
+                self.member_roles.append(MEMBER_ROLES.get(member["role"], 0))
+            self.member_offsets.append(len(self.member_refs))
+            append_tags(self.relation_tags, element.get("tags") or {})
+
+    def extend(self, elements: Iterable[dict]) -> None:
+        """Route all elements into their columns."""
+        for element in elements:
+            self.add(element)
+
+    def merge(self, other: "OsmElements") -> None:
+        """Add the elements of another store, skipping the ones already stored."""
+        node_ids = np.frombuffer(other.node_ids, dtype=np.int64)
+        new = ~np.isin(node_ids, np.frombuffer(self.node_ids, dtype=np.int64))
+        self.node_ids.frombytes(node_ids[new].tobytes())
+        self.node_lats.frombytes(
+            np.frombuffer(other.node_lats, dtype=np.float64)[new].tobytes()
+        )
+        self.node_lons.frombytes(
+            np.frombuffer(other.node_lons, dtype=np.float64)[new].tobytes()
+        )
+
+        for row, way_id in enumerate(other.way_ids):
+            start, end = other.way_offsets[row], other.way_offsets[row + 1]
+            self.add(
+                {
+                    "type": "way",
+                    "id": way_id,
+                    "nodes": other.way_nodes[start:end],
+                    "tags": get_tags(other.way_tags, row),
+                }
+            )
+        for row, relation_id in enumerate(other.relation_ids):
+            if relation_id in self.relation_rows:
+                continue
+            start, end = other.member_offsets[row], other.member_offsets[row + 1]
+            self.relation_rows[relation_id] = len(self.relation_ids)
+            self.relation_ids.append(relation_id)
+            self.member_types.extend(other.member_types[start:end])
+            self.member_refs.extend(other.member_refs[start:end])
+            self.member_roles.extend(other.member_roles[start:end])
+            self.member_offsets.append(len(self.member_refs))
+            append_tags(self.relation_tags, get_tags(other.relation_tags, row))
+
+    def get_way(self, way_id: int) -> tuple[tuple[int], dict] | None:
+        """Get the node IDs and used tags of a way by its ID."""
+        row = self.way_rows.get(way_id)
+        if row is None:
+            return None
+        start, end = self.way_offsets[row], self.way_offsets[row + 1]
+        return tuple(self.way_nodes[start:end]), get_tags(self.way_tags, row)
+
+    def get_way_nodes(self, way_id: int) -> array | None:
+        """Get the node IDs of a way by its ID."""
+        row = self.way_rows.get(way_id)
+        if row is None:
+            return None
+        return self.way_nodes[self.way_offsets[row] : self.way_offsets[row + 1]]
+
+    def get_members(self, row: int) -> Iterator[tuple[int]]:
+        """Yield the (type, ref, role) codes of the members of a relation row."""
+        start, end = self.member_offsets[row], self.member_offsets[row + 1]
+        return zip(
+            self.member_types[start:end],
+            self.member_refs[start:end],
+            self.member_roles[start:end],
+        )
+
+
+def append_tags(columns: dict[str, list], tags: dict) -> None:
+    """Append the used tags of an element as a new row of the tag columns."""
+    for key, column in columns.items():
+        column.append(tags.get(key))
+
+
+def set_tags(columns: dict[str, list], row: int, tags: dict) -> None:
+    """Replace the used tags of an element in a row of the tag columns."""
+    for key, column in columns.items():
+        column[row] = tags.get(key)
+
+
+def get_tags(columns: dict[str, list], row: int) -> dict:
+    """Get the used tags of a row of the tag columns as a dictionary."""
+    return {
+        key: column[row] for key, column in columns.items() if column[row] is not None
+    }
+
+
+class NodeIndex:
+    """Projected (x, y) coordinates of nodes, looked up by node IDs in bulk."""
+
+    def __init__(self, node_ids: np.ndarray, xy: np.ndarray) -> None:
+        """Index the coordinates (an (n, 2) array) by node ID."""
+        order = np.argsort(node_ids, kind="stable")
+        self.ids = np.asarray(node_ids, dtype=np.int64)[order]
+        self.xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)[order]
+
+    def __len__(self) -> int:
+        """Get the number of indexed nodes."""
+        return len(self.ids)
+
+    def lookup(self, node_ids: Iterable[int]) -> tuple[np.ndarray]:
+        """Get the coordinates of the node IDs and a mask of the ones found."""
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        if len(self.ids) == 0:
+            return np.zeros((len(node_ids), 2)), np.zeros(len(node_ids), dtype=bool)
+        positions = np.searchsorted(self.ids, node_ids)
+        positions[positions == len(self.ids)] = 0
+        found = self.ids[positions] == node_ids
+
+        return self.xy[positions], found
+
+
+def get_data_source() -> OsmDataSource:
+    """Get the configured source of OSM data.
+
+    A local extract (.osm or .osm.pbf) if OSM_EXTRACT_PATH is set,
+    the Overpass API otherwise.
+    """
+    extract_path = os.getenv("OSM_EXTRACT_PATH")
+    if extract_path:
+        return LocalExtractDataSource(extract_path)
+    return OverpassDataSource()
 
 
 def get_features_from_osm_server(
-    keyword: str, min_lat_lon: tuple[float], max_lat_lon: tuple[float]
-) -> list[dict]:
-    """Get OSM features via Overpass API."""
-    overpass_url = "http://overpass-api.de/api/interpreter"
-    overpass_query = f"""[out:json];
-    (node["{keyword}"]({min_lat_lon[0]},{min_lat_lon[1]},{max_lat_lon[0]},{max_lat_lon[1]});
-    way["{keyword}"]({min_lat_lon[0]},{min_lat_lon[1]},{max_lat_lon[0]},{max_lat_lon[1]});
-    relation["{keyword}"]({min_lat_lon[0]},{min_lat_lon[1]},{max_lat_lon[0]},{max_lat_lon[1]});
-    );out body;>;out skel qt;"""
+    keywords: list[str],
+    min_lat_lon: tuple[float],
+    max_lat_lon: tuple[float],
+    data_source: OsmDataSource | None = None,
+) -> OsmElements:
+    """Get OSM features with any of the keywords from the (configured) data source.
+
+    Large areas are split into a grid of sub-bboxes, sized by the number of
+    elements in the area and fetched concurrently.
+    """
+    if data_source is None:
+        data_source = get_data_source()
+
+    grid_size = get_chunk_grid_size(data_source, keywords, min_lat_lon, max_lat_lon)
+    if grid_size == 1:
+        osm = fetch_chunk(data_source, keywords, (min_lat_lon, max_lat_lon))
+    else:
+        bboxes = split_bbox(min_lat_lon, max_lat_lon, grid_size)
+        print(f"Fetching OSM data in {len(bboxes)} chunks")
+        with ThreadPoolExecutor(max_workers=OSM_CHUNK_WORKERS) as executor:
+            chunks = executor.map(
+                lambda bbox: fetch_chunk(data_source, keywords, bbox), bboxes
+            )
+            # merged in grid order, so the result does not depend on timing
+            osm = next(chunks)
+            for chunk in chunks:
+                osm.merge(chunk)
+    print(f"OSM data source: {data_source.stats()}")
+
+    return osm
+
+
+def fetch_chunk(
+    data_source: OsmDataSource, keywords: list[str], bbox: tuple[tuple[float]]
+) -> OsmElements:
+    """Get OSM features with any of the keywords within a single bbox."""
+    osm = OsmElements()
+    osm.extend(data_source.iter_elements(keywords, *bbox))
+
+    return osm
+
+
+def get_chunk_grid_size(
+    data_source: OsmDataSource,
+    keywords: list[str],
+    min_lat_lon: tuple[float],
+    max_lat_lon: tuple[float],
+) -> int:
+    """Get the number of sub-bboxes per side to split the area into."""
+    size = (max_lat_lon[0] - min_lat_lon[0]) * METERS_PER_DEGREE_LAT
+    if size <= OSM_CHUNK_MIN_SIZE:
+        return 1
+    count = data_source.count_elements(keywords, min_lat_lon, max_lat_lon)
+    if count is None:
+        return 1
+    print(f"OSM elements in the area: {count}")
+    grid_size = math.ceil(math.sqrt(count / OSM_CHUNK_MAX_ELEMENTS))
+
+    return min(max(grid_size, 1), OSM_CHUNK_MAX_GRID)
+
+
+def get_osm_features(
+    lat: float, lon: float, r: float, angle_rad: float
+) -> tuple[OsmElements, NodeIndex]:
+    """Fetch buildings and roads by lat&lon (degrees) and radius (meters) at once.
+
+    Returns the OSM elements and the index of their projected nodes,
+    both shared by get_buildings and get_roads.
+    """
+    min_lat_lon, max_lat_lon = get_degrees_bbox_from_lat_lon_rad(lat, lon, r)
+    osm = get_features_from_osm_server(OSM_KEYWORDS, min_lat_lon, max_lat_lon)
+    node_index = build_node_index(osm, ProjectionContext(lat, lon, angle_rad))
+
+    return osm, node_index
 
-    response = requests.get(overpass_url, params={"data": overpass_query})
-    data = response.json()
-    features = data["elements"]
 
-    return features
+def build_node_index(osm: OsmElements, projection: ProjectionContext) -> NodeIndex:
+    """Index the projected (x, y) coordinates of the nodes of OSM elements."""
+    # reproject all nodes in a single call
+    x, y = projection.project(
+        np.frombuffer(osm.node_lats, dtype=np.float64),
+        np.frombuffer(osm.node_lons, dtype=np.float64),
+    )
 
+    return NodeIndex(
+        np.frombuffer(osm.node_ids, dtype=np.int64), np.column_stack((x, y))
+    )
 
-def get_buildings(lat: float, lon: float, r: float, angle_rad: float) -> list[Base]:
-    """Get a list of 3d Meshes of buildings by lat&lon (degrees) and radius (meters)."""
+
+def get_way_coords(node_ids: Iterable[int], node_index: NodeIndex) -> np.ndarray:
+    """Replace node IDs with projected (x, y) coordinates, skipping unknown nodes."""
+    xy, found = node_index.lookup(node_ids)
+
+    return xy[found]
+
+
+def stitch_ways(node_lists: Iterable[tuple[int]]) -> tuple[list[list[int]]]:
+    """Join ways that share end nodes into closed rings and open chains.
+
+    Each way is attached at most once, through an index of the open ways
+    by their end nodes, so the assembly is linear in the number of ways.
+    Rings repeat their first node at the end, like closed OSM ways.
+    """
+    rings = []
+    open_ways = []
+    for nodes in node_lists:
+        if len(nodes) < 2:
+            continue
+        if nodes[0] == nodes[-1]:
+            rings.append(list(nodes))
+        else:
+            open_ways.append(nodes)
+
+    ends = defaultdict(list)
+    for i, nodes in enumerate(open_ways):
+        ends[nodes[0]].append(i)
+        ends[nodes[-1]].append(i)
+    used = [False] * len(open_ways)
+
+    def next_way(node_id: int) -> int | None:
+        """Take an unused way starting or ending at the node."""
+        candidates = ends.get(node_id, [])
+        while candidates:
+            i = candidates.pop()
+            if not used[i]:
+                used[i] = True
+                return i
+        return None
+
+    chains = []
+    for i, nodes in enumerate(open_ways):
+        if used[i]:
+            continue
+        used[i] = True
+        chain = list(nodes)
+        # extend the end, then the start (by reversing) until closed or stuck
+        for _ in range(2):
+            while chain[-1] != chain[0]:
+                j = next_way(chain[-1])
+                if j is None:
+                    break
+                way = open_ways[j]
+                chain.extend(way[1:] if way[0] == chain[-1] else way[-2::-1])
+            if chain[-1] == chain[0]:
+                break
+            chain.reverse()
+
+        if chain[-1] == chain[0]:
+            rings.append(chain)
+        else:
+            chains.append(chain)
+
+    # a valid ring has at least 3 distinct nodes
+    rings = [ring for ring in rings if len(ring) >= 4]
+
+    return rings, chains
+
+
+def assign_inner_rings(
+    outer_rings: list[list[int]],
+    inner_rings: list[list[int]],
+    node_index: NodeIndex,
+) -> list[list[list[int]]]:
+    """Group the inner rings of a multipolygon by the outer ring containing them."""
+    if len(outer_rings) == 1:
+        return [inner_rings]
+
+    def to_polygon(ring: list[int]) -> Polygon | None:
+        points = get_way_coords(ring, node_index)
+        return Polygon(points) if len(points) >= 3 else None
+
+    outer_polygons = [to_polygon(ring) for ring in outer_rings]
+    groups = [[] for _ in outer_rings]
+    for ring in inner_rings:
+        inner_polygon = to_polygon(ring)
+        if inner_polygon is None:
+            continue
+        point = inner_polygon.representative_point()
+        for polygon, group in zip(outer_polygons, groups):
+            if polygon is not None and polygon.contains(point):
+                group.append(ring)
+                break
+
+    return groups
+
+
+def get_building_height(tags: dict[str, list], row: int) -> float:
+    """Get the height of a building from its height, levels or layer tag."""
+    height = tags["height"][row]
+    levels = tags["building:levels"][row]
+    layer = tags["layer"][row]
+
+    if height is not None:
+        value = parse_number(height)
+        return value if value is not None else BUILDING_HEIGHT
+    if levels is not None:
+        value = parse_number(levels)
+        return value * LEVEL_HEIGHT if value is not None else BUILDING_HEIGHT
+    if layer is not None:
+        value = parse_number(layer)
+        if value is not None and value < 0:
+            return -BUILDING_HEIGHT
+    return BUILDING_HEIGHT
+
+
+def get_buildings(
+    osm: OsmElements,
+    node_index: NodeIndex,
+    clip_radius: float | None = None,
+    cell_size: float | None = None,
+    indexed: bool = False,
+    simplify: bool = False,
+) -> list[Base]:
+    """Get a list of 3d Meshes of buildings from OSM elements and projected nodes.
+
+    With clip_radius (meters), buildings entirely outside the circle are dropped.
+    With cell_size (meters), the buildings are merged into a Mesh per grid cell.
+    If indexed, the Meshes share vertices and have a color per object.
+    If simplify, the footprints are simplified more the farther they are.
+    """
     # https://towardsdatascience.com/loading-data-from-openstreetmap-with-python-and-the-overpass-api-513882a27fd0
 
     keyword = "building"
-    min_lat_lon, max_lat_lon = get_degrees_bbox_from_lat_lon_rad(lat, lon, r)
-    features = get_features_from_osm_server(keyword, min_lat_lon, max_lat_lon)
 
-    ways = []
-    tags = []
-    rel_outer_ways = []
-    rel_outer_ways_tags = []
-    rel_inner_ways = []
-    ways_part = []
-    nodes = []
-
-    for feature in features:
-        # ways
-        if feature["type"] == "way":
-            try:
-                feature["id"]
-                feature["nodes"]
-
-                try:
-                    tags.append(
-                        {
-                            f"{keyword}": feature["tags"][keyword],
-                            "height": feature["tags"]["height"],
-                        }
-                    )
-                except:
-                    try:
-                        tags.append(
-                            {
-                                f"{keyword}": feature["tags"][keyword],
-                                "levels": feature["tags"]["building:levels"],
-                            }
-                        )
-                    except:
-                        try:
-                            tags.append(
-                                {
-                                    f"{keyword}": feature["tags"][keyword],
-                                    "layer": feature["tags"]["layer"],
-                                }
-                            )
-                        except:
-                            tags.append({f"{keyword}": feature["tags"][keyword]})
-                ways.append(
-                    {
-                        "nodes": feature["nodes"],
-                        "inner_nodes": [],
-                    }  # "id": feature["id"],
-                )
-            except:
-                ways_part.append({"id": feature["id"], "nodes": feature["nodes"]})
-
-        # relations
-        elif feature["type"] == "relation":
-            outer_ways = []
-            inner_ways = []
-            try:
-                outer_ways_tags = {
-                    f"{keyword}": feature["tags"][keyword],
-                    "height": feature["tags"]["height"],
-                }
-            except:
-                try:
-                    outer_ways_tags = {
-                        f"{keyword}": feature["tags"][keyword],
-                        "levels": feature["tags"]["building:levels"],
-                    }
-                except:
-                    try:
-                        outer_ways_tags = {
-                            f"{keyword}": feature["tags"][keyword],
-                            "layer": feature["tags"]["layer"],
-                        }
-                    except:
-                        outer_ways_tags = {f"{keyword}": feature["tags"][keyword]}
-
-            for n, x in enumerate(feature["members"]):
-                # if several Outer ways, combine them
-                if (
-                    feature["members"][n]["type"] == "way"
-                    and feature["members"][n]["role"] == "outer"
-                ):
-                    outer_ways.append({"ref": feature["members"][n]["ref"]})
-                elif (
-                    feature["members"][n]["type"] == "way"
-                    and feature["members"][n]["role"] == "inner"
-                ):
-                    inner_ways.append({"ref": feature["members"][n]["ref"]})
-            rel_outer_ways.append(outer_ways)
-            rel_outer_ways_tags.append(outer_ways_tags)
-            rel_inner_ways.append(inner_ways)
-
-        # get nodes (that don't have tags)
-        elif feature["type"] == "node":
-            try:
-                feature["tags"]
-            except:
-                nodes.append(
-                    {"id": feature["id"], "lat": feature["lat"], "lon": feature["lon"]}
-                )
-
-    # turn relations_OUTER into ways
-    for n, x in enumerate(rel_outer_ways):  # just 1
-        # there will be a list of "ways" in each of rel_outer_ways
-        full_node_list = []
-        full_node_inner_list = []
-        for m, y in enumerate(rel_outer_ways[n]):
-            # find ways_parts with corresponding ID
-            for k, z in enumerate(ways_part):
-                if k == len(ways_part):
-                    break
-                if rel_outer_ways[n][m]["ref"] == ways_part[k]["id"]:
-                    full_node_list += ways_part[k]["nodes"]
-                    ways_part.pop(k)  # remove used ways_parts
-                    k -= 1  # reset index
-                    break
-        for m, y in enumerate(rel_inner_ways[n]):
-            # find ways_parts with corresponding ID
-            local_node_list = []
-            for k, z in enumerate(ways_part):
-                if k == len(ways_part):
-                    break
-                if rel_inner_ways[n][m]["ref"] == ways_part[k]["id"]:
-                    local_node_list += ways_part[k]["nodes"]
-                    ways_part.pop(k)  # remove used ways_parts
-                    k -= 1  # reset index
-                    break
-            full_node_inner_list.append(local_node_list)
+    # all way nodes in site coordinates at once
+    way_xy, way_found = node_index.lookup(osm.way_nodes)
 
-        ways.append({"nodes": full_node_list, "inner_nodes": full_node_inner_list})
-        try:
-            tags.append(
-                {
-                    f"{keyword}": rel_outer_ways_tags[n][keyword],
-                    "height": rel_outer_ways_tags[n]["height"],
-                }
-            )
-        except:
-            try:
-                tags.append(
-                    {
-                        f"{keyword}": rel_outer_ways_tags[n][keyword],
-                        "levels": rel_outer_ways_tags[n]["levels"],
-                    }
-                )
-            except:
-                try:
-                    tags.append(
-                        {
-                            f"{keyword}": rel_outer_ways_tags[n][keyword],
-                            "layer": rel_outer_ways_tags[n]["layer"],
-                        }
-                    )
-                except:
-                    tags.append({f"{keyword}": rel_outer_ways_tags[n][keyword]})
-
-    projected_crs = create_crs(lat, lon)
+    footprints = []
+    voids = []
+    tags = []
+    # ways
+    for row, building in enumerate(osm.way_tags[keyword]):
+        if building is None:
+            continue  # only a part of a relation, or not a building
+        # go through each external node of the Way (ignore last)
+        start, end = osm.way_offsets[row], osm.way_offsets[row + 1] - 1
+        footprints.append(way_xy[start:end][way_found[start:end]])
+        voids.append([])
+        height = get_building_height(osm.way_tags, row)
+        tags.append((osm.way_ids[row], building, height))
+
+    # relations
+    for row, building in enumerate(osm.relation_tags[keyword]):
+        if building is None:
+            continue
+        # assemble the rings from the member ways by their end nodes
+        outer_ways = []
+        inner_ways = []
+        for member_type, member_ref, member_role in osm.get_members(row):
+            if member_type != MEMBER_WAY or member_role == ROLE_OTHER:
+                continue
+            member = osm.get_way_nodes(member_ref)
+            if member is None:
+                continue
+            if member_role == ROLE_OUTER:
+                outer_ways.append(member.tolist())
+            else:
+                inner_ways.append(member.tolist())
+        outer_rings, _ = stitch_ways(outer_ways)
+        inner_rings, _ = stitch_ways(inner_ways)
+
+        # a building for each outer ring, with the inner rings within it
+        height = get_building_height(osm.relation_tags, row)
+        inner_groups = assign_inner_rings(outer_rings, inner_rings, node_index)
+        for ring, inner_group in zip(outer_rings, inner_groups):
+            footprints.append(get_way_coords(ring[:-1], node_index))
+            voids.append([get_way_coords(r[:-1], node_index) for r in inner_group])
+            tags.append((osm.relation_ids[row], building, height))
+
+    if clip_radius is not None:
+        keep, report = clip_buildings(footprints, clip_radius)
+        print(f"Clipped buildings to {clip_radius} m: {report}")
+        footprints = [f for f, k in zip(footprints, keep) if k]
+        voids = [v for v, k in zip(voids, keep) if k]
+        tags = [t for t, k in zip(tags, keep) if k]
+
+    if simplify:
+        footprints, voids, keep, report = simplify_buildings(footprints, voids)
+        print(f"Simplified buildings by distance: {report}")
+        footprints = [f for f, k in zip(footprints, keep) if k]
+        voids = [v for v, k in zip(voids, keep) if k]
+        tags = [t for t, k in zip(tags, keep) if k]
+
+    heights = [height for _, _, height in tags]
+    workers = get_mesh_workers(len(footprints))
+    triangulations = None
+    if MESH_CACHE_MAX_BYTES > 0:
+        # the triangulation of large courtyard buildings is reused between runs
+        osm_ids = [osm_id for osm_id, _, _ in tags]
+        triangulations, report = get_cached_triangulations(
+            osm_ids, footprints, voids, workers
+        )
+        print(f"Cached building triangulations: {report}")
+
+    if cell_size:
+        return get_merged_buildings(
+            footprints, voids, heights, tags, cell_size, indexed, triangulations
+        )
+
+    # extrude all footprints at once
+    meshes, report = extrude_buildings(
+        footprints, voids, heights, indexed, workers, triangulations
+    )
+    print(f"Building meshes: {report}")
 
-    # get coords of Ways
     objectGroup = []
-    for i, x in enumerate(ways):
-        ids = ways[i]
-        coords = []  # replace node IDs with actual coords for each Way
-        coords_inner = []
-        height = 9
-        try:
-            height = (
-                float(clean_string(tags[i]["levels"].split(",")[0].split(";")[0])) * 3
-            )
-        except:
-            try:
-                height = float(
-                    clean_string(tags[i]["height"].split(",")[0].split(";")[0])
-                )
-            except:
-                try:
-                    if (
-                        float(
-                            clean_string(tags[i]["layer"].split(",")[0].split(";")[0])
-                        )
-                        < 0
-                    ):
-                        height *= -1
-                except:
-                    pass
-
-        # go through each external node of the Way
-        for k, y in enumerate(ids["nodes"]):
-            if k == len(ids["nodes"]) - 1:
-                continue  # ignore last
-            for n, z in enumerate(nodes):  # go though all nodes
-                if ids["nodes"][k] == nodes[n]["id"]:
-                    x, y = reproject_to_crs(
-                        nodes[n]["lat"], nodes[n]["lon"], "EPSG:4326", projected_crs
-                    )
-                    coords.append({"x": x, "y": y})
-                    break
-
-        # go through each internal node of the Way
-        for l, void_nodes in enumerate(ids["inner_nodes"]):
-            coords_per_void = []
-            for k, y in enumerate(void_nodes):
-                if k == len(ids["inner_nodes"][l]) - 1:
-                    continue  # ignore last
-                for n, z in enumerate(nodes):  # go though all nodes
-                    if ids["inner_nodes"][l][k] == nodes[n]["id"]:
-                        x, y = reproject_to_crs(
-                            nodes[n]["lat"], nodes[n]["lon"], "EPSG:4326", projected_crs
-                        )
-                        coords_per_void.append({"x": x, "y": y})
-                        break
-            coords_inner.append(coords_per_void)
-
-        if angle_rad == 0:
-            obj = extrude_building(coords, coords_inner, height)
-        else:
-            rotated_coords = [rotate_pt(c, angle_rad) for c in coords]
-            rotated_coords_inner = [
-                [rotate_pt(c_void, angle_rad) for c_void in c] for c in coords_inner
-            ]
-            obj = extrude_building(rotated_coords, rotated_coords_inner, height)
+    for obj, (_, building, _) in zip(meshes, tags):
         if obj is not None:
             base_obj = Base(
                 units="m",
                 displayValue=[obj],
-                building=tags[i]["building"],
+                building=building,
                 source_data="© OpenStreetMap",
                 source_url="https://www.openstreetmap.org/",
             )
-            objectGroup.append(base_obj)  # (obj, tags[i]["building"]))
+            objectGroup.append(base_obj)
+
+    return objectGroup
+
 
-        coords = None
-        height = None
+def get_merged_buildings(
+    footprints: list[np.ndarray],
+    voids: list[list[np.ndarray]],
+    heights: list[float],
+    tags: list[tuple],
+    cell_size: float,
+    indexed: bool = False,
+    triangulations: list[np.ndarray | None] | None = None,
+) -> list[Base]:
+    """Get a Base per grid cell with the merged Mesh of its buildings.
+
+    The OSM id, building tag and height of each building are kept as arrays,
+    with face_starts: the faces of building i are faces[face_starts[i]:
+    face_starts[i + 1]] of the Mesh.
+    """
+    merged, report = extrude_buildings_by_cell(
+        footprints,
+        voids,
+        heights,
+        cell_size,
+        indexed,
+        get_mesh_workers(len(footprints)),
+        triangulations,
+    )
+    print(f"Building meshes: {report}")
+
+    objectGroup = []
+    for cell, mesh, indices, face_starts in merged:
+        base_obj = Base(
+            units="m",
+            displayValue=[mesh],
+            cell=list(cell),
+            cell_size=cell_size,
+            osm_id=[int(tags[i][0]) for i in indices],
+            building=[tags[i][1] for i in indices],
+            height=[float(tags[i][2]) for i in indices],
+            face_starts=face_starts,
+            source_data="© OpenStreetMap",
+            source_url="https://www.openstreetmap.org/",
+        )
+        objectGroup.append(base_obj)
 
     return objectGroup
 
 
-def get_roads(lat: float, lon: float, r: float, angle_rad: float) -> tuple[list[Base]]:
-    """Get a list of Polylines and Meshes of roads by lat&lon (degrees) and radius (meters)."""
+def get_roads(
+    osm: OsmElements,
+    node_index: NodeIndex,
+    clip_radius: float | None = None,
+    union: bool = False,
+    cell_size: float | None = None,
+) -> tuple[list[Base]]:
+    """Get a list of Polylines and Meshes of roads from OSM elements and nodes.
+
+    With clip_radius (meters), roads are cut at the circle. With union, the
+    road surfaces of each class are merged into one Mesh (or one per grid
+    cell of cell_size meters).
+    """
     keyword = "highway"
-    min_lat_lon, max_lat_lon = get_degrees_bbox_from_lat_lon_rad(lat, lon, r)
-    features = get_features_from_osm_server(keyword, min_lat_lon, max_lat_lon)
 
     ways = []
     tags = []
-    rel_outer_ways = []
-    rel_outer_ways_tags = []
-    ways_part = []
-    nodes = []
-
-    for feature in features:
-        # ways
-        if feature["type"] == "way":
-            try:
-                feature["id"]
-                feature["nodes"]
-
-                tags.append({f"{keyword}": feature["tags"][keyword]})
-                ways.append({"id": feature["id"], "nodes": feature["nodes"]})
-            except:
-                ways_part.append({"id": feature["id"], "nodes": feature["nodes"]})
-
-        # relations
-        elif feature["type"] == "relation":
-            outer_ways = []
-            try:
-                outer_ways_tags = {
-                    f"{keyword}": feature["tags"][keyword],
-                    "area": feature["tags"]["area"],
-                }
-            except:
-                outer_ways_tags = {f"{keyword}": feature["tags"][keyword]}
-
-            for n, x in enumerate(feature["members"]):
-                # if several Outer ways, combine them
-                if feature["members"][n]["type"] == "way":
-                    outer_ways.append({"ref": feature["members"][n]["ref"]})
-
-            rel_outer_ways.append(outer_ways)
-            rel_outer_ways_tags.append(outer_ways_tags)
-
-        # get nodes (that don't have tags)
-        elif feature["type"] == "node":
-            try:
-                feature["tags"]
-                feature["tags"][keyword]
-            except:
-                nodes.append(
-                    {"id": feature["id"], "lat": feature["lat"], "lon": feature["lon"]}
-                )
-
-    # turn relations_OUTER into ways
-    for n, x in enumerate(rel_outer_ways):
-        # there will be a list of "ways" in each of rel_outer_ways
-        full_node_list = []
-        for m, y in enumerate(rel_outer_ways[n]):
-            # find ways_parts with corresponding ID
-            for k, z in enumerate(ways_part):
-                if k == len(ways_part):
-                    break
-                if rel_outer_ways[n][m]["ref"] == ways_part[k]["id"]:
-                    full_node_list += ways_part[k]["nodes"]
-                    ways_part.pop(k)  # remove used ways_parts
-                    k -= 1  # reset index
-                    break
+    # ways
+    for row, highway in enumerate(osm.way_tags[keyword]):
+        if highway is None:
+            continue  # only a part of a relation, or not a road
+        start, end = osm.way_offsets[row], osm.way_offsets[row + 1]
+        tags.append({f"{keyword}": highway})
+        ways.append({"id": osm.way_ids[row], "nodes": osm.way_nodes[start:end]})
+
+    # relations
+    for row, highway in enumerate(osm.relation_tags[keyword]):
+        if highway is None:
+            continue
+        outer_ways_tags = {f"{keyword}": highway}
+        if osm.relation_tags["area"][row] is not None:
+            outer_ways_tags["area"] = osm.relation_tags["area"][row]
+
+        # join the member ways into continuous sections by their end nodes
+        member_ways = []
+        for member_type, member_ref, _ in osm.get_members(row):
+            member = (
+                osm.get_way_nodes(member_ref) if member_type == MEMBER_WAY else None
+            )
+            if member is not None:
+                member_ways.append(member.tolist())
+        rings, chains = stitch_ways(member_ways)
 
-            # move inside the loop to separate the sections
-            ways.append({"nodes": full_node_list})
-            try:
-                tags.append(
-                    {
-                        f"{keyword}": rel_outer_ways_tags[n][keyword],
-                        "area": rel_outer_ways_tags[n]["area"],
-                    }
-                )
-            except:
-                tags.append({f"{keyword}": rel_outer_ways_tags[n][keyword]})
-            # empty the list after each loop to start new part
-            full_node_list = []
-
-    projected_crs = create_crs(lat, lon)
+        for node_ids in rings + chains:
+            ways.append({"nodes": node_ids})
+            tags.append(dict(outer_ways_tags))
 
     # get coords of Ways
     objectGroup = []
@@ -367,43 +659,58 @@ def get_roads(lat: float, lon: float, r: float, angle_rad: float) -> tuple[list[
 
     ways, tags = split_ways_by_intersection(ways, tags)
 
+    polylines = []
+    polylines_closed = []
+    values = []
+    classes = []
     for i, x in enumerate(ways):  # go through each Way: 2384
         ids = ways[i]["nodes"]
-        coords = []  # replace node IDs with actual coords for each Way
-
-        value = 2
-        if tags[i][keyword] in ["primary"]:
-            value = 12
-        elif tags[i][keyword] in ["secondary"]:
-            value = 7
-        try:
-            if tags[i]["area"] == "yes":
-                value = None
-                continue
-        except:
-            pass
-
-        closed = False
-        for k, y in enumerate(ids):  # go through each node of the Way
-            if k == len(ids) - 1 and y == ids[0]:
-                closed = True
-                continue
-            for n, z in enumerate(nodes):  # go though all nodes
-                if ids[k] == nodes[n]["id"]:
-                    x, y = reproject_to_crs(
-                        nodes[n]["lat"], nodes[n]["lon"], "EPSG:4326", projected_crs
-                    )
-                    coords.append({"x": x, "y": y})
-                    break
 
-        if angle_rad == 0:
-            obj = join_roads(coords, closed, 0)
-        else:
-            rotated_coords = [rotate_pt(c, angle_rad) for c in coords]
-            obj = join_roads(rotated_coords, closed, 0)
+        value = ROAD_BUFFERS.get(tags[i][keyword], ROAD_BUFFER)
+        if tags[i].get("area") == "yes":
+            continue
+
+        # a closed Way repeats its first node at the end
+        closed = len(ids) > 0 and ids[-1] == ids[0]
+        if closed:
+            ids = ids[:-1]
+        polylines.append(get_way_coords(ids, node_index))
+        polylines_closed.append(closed)
+        values.append(value)
+        # primary, secondary and other roads
+        classes.append(
+            tags[i][keyword] if tags[i][keyword] in ROAD_BUFFERS else "other"
+        )
+
+    if clip_radius is not None:
+        parts, report = clip_polylines(polylines, polylines_closed, clip_radius)
+        print(f"Clipped roads to {clip_radius} m: {report}")
+    else:
+        parts = [(i, *x) for i, x in enumerate(zip(polylines, polylines_closed))]
+
+    for i, coords, closed in parts:
+        obj = join_roads(coords, closed, 0)
         objectGroup.append(obj)
 
-        objMesh = road_buffer(obj, value)
+    if union:
+        meshGroup, report = union_road_buffers(
+            [coords for _, coords, _ in parts],
+            [values[i] for i, _, _ in parts],
+            [classes[i] for i, _, _ in parts],
+            ROAD_QUAD_SEGS,
+            cell_size,
+        )
+        print(f"Unioned road meshes: {report}")
+        return objectGroup, meshGroup
+
+    # buffer all roads at once
+    meshes = road_buffers(
+        [coords for _, coords, _ in parts],
+        [values[i] for i, _, _ in parts],
+        ROAD_QUAD_SEGS,
+        get_mesh_workers(len(parts)),
+    )
+    for objMesh in meshes:
         if objMesh is not None:  # filter out ignored "areas"
             meshGroup.append(objMesh)
 
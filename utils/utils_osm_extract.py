@@ -0,0 +1,347 @@
+import bz2
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+import xml.etree.ElementTree as ET
+from collections.abc import Iterable, Iterator
+
+from utils.utils_osm_source import OsmDataSource
+
+try:
+    import osmium
+except ImportError:  # only needed for .osm.pbf extracts
+    osmium = None
+
+INDEX_VERSION = "1"
+INSERT_BATCH_SIZE = 50_000
+SELECT_BATCH_SIZE = 900  # stay below the SQLite limit of query parameters
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE nodes (id INTEGER PRIMARY KEY, lat REAL NOT NULL, lon REAL NOT NULL);
+CREATE TABLE ways (id INTEGER PRIMARY KEY, nodes TEXT NOT NULL, tags TEXT);
+CREATE TABLE relations (id INTEGER PRIMARY KEY, members TEXT NOT NULL, tags TEXT);
+CREATE TABLE way_nodes (way_id INTEGER NOT NULL, node_id INTEGER NOT NULL);
+CREATE TABLE relation_ways (relation_id INTEGER NOT NULL, way_id INTEGER NOT NULL);
+CREATE VIRTUAL TABLE way_bbox USING rtree(id, min_lat, max_lat, min_lon, max_lon);
+CREATE VIRTUAL TABLE relation_bbox USING rtree(id, min_lat, max_lat, min_lon, max_lon);
+"""
+
+# bboxes of ways from their nodes, of relations from their member ways
+FINALIZE = """
+INSERT INTO way_bbox
+    SELECT wn.way_id, min(n.lat), max(n.lat), min(n.lon), max(n.lon)
+    FROM way_nodes wn JOIN nodes n ON n.id = wn.node_id
+    GROUP BY wn.way_id;
+INSERT INTO relation_bbox
+    SELECT rw.relation_id,
+        min(b.min_lat), max(b.max_lat), min(b.min_lon), max(b.max_lon)
+    FROM relation_ways rw JOIN way_bbox b ON b.id = rw.way_id
+    GROUP BY rw.relation_id;
+DROP TABLE way_nodes;
+DROP TABLE relation_ways;
+"""
+
+BBOX_CONDITION = (
+    "b.max_lat >= ? AND b.min_lat <= ? AND b.max_lon >= ? AND b.min_lon <= ?"
+)
+
+
+class LocalExtractDataSource(OsmDataSource):
+    """OSM elements from a local .osm / .osm.pbf extract, through a spatial index.
+
+    The index is an SQLite database with R*Tree bboxes of all ways and
+    relations. It is built next to the extract on first use and rebuilt
+    whenever the extract changes.
+    """
+
+    def __init__(self, extract_path: str, index_path: str | None = None) -> None:
+        """Use the extract at extract_path (.osm, .osm.gz, .osm.bz2 or .osm.pbf)."""
+        if not os.path.isfile(extract_path):
+            raise Exception(f"OSM extract not found: {extract_path}")
+        self.extract_path = extract_path
+        self.index_path = index_path or f"{extract_path}.sqlite"
+        self.index_built = False
+        self.queries = 0
+
+    def iter_elements(
+        self, keywords: list[str], min_lat_lon: tuple[float], max_lat_lon: tuple[float]
+    ) -> Iterator[dict]:
+        """Yield the elements with any of the keywords within the bbox."""
+        connection = self._connect()
+        self.queries += 1
+        try:
+            yield from query_index(connection, keywords, min_lat_lon, max_lat_lon)
+        finally:
+            connection.close()
+
+    def count_elements(
+        self, keywords: list[str], min_lat_lon: tuple[float], max_lat_lon: tuple[float]
+    ) -> int | None:
+        """Not supported, the local index is queried at once for any area."""
+        return None
+
+    def stats(self) -> dict:
+        """Get the extract in use and whether its index had to be built."""
+        return {
+            "extract": self.extract_path,
+            "index_built": self.index_built,
+            "queries": self.queries,
+        }
+
+    def _extract_signature(self) -> dict:
+        stat = os.stat(self.extract_path)
+        return {
+            "version": INDEX_VERSION,
+            "extract_size": str(stat.st_size),
+            "extract_mtime": str(stat.st_mtime_ns),
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the index, (re)building it if missing or outdated."""
+        signature = self._extract_signature()
+        if os.path.isfile(self.index_path):
+            connection = sqlite3.connect(self.index_path)
+            try:
+                meta = dict(connection.execute("SELECT key, value FROM meta"))
+            except sqlite3.DatabaseError:
+                meta = {}
+            if meta == signature:
+                return connection
+            connection.close()
+
+        build_index(self.extract_path, self.index_path, signature)
+        self.index_built = True
+        return sqlite3.connect(self.index_path)
+
+
+class _IndexWriter:
+    """Batched inserts of OSM elements into a new index database."""
+
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self.connection = connection
+        self.nodes = []
+        self.ways = []
+        self.way_nodes = []
+        self.relations = []
+        self.relation_ways = []
+
+    def add_node(self, node_id: int, lat: float, lon: float) -> None:
+        self.nodes.append((node_id, lat, lon))
+        if len(self.nodes) >= INSERT_BATCH_SIZE:
+            self.flush()
+
+    def add_way(self, way_id: int, node_ids: list[int], tags: dict) -> None:
+        self.ways.append(
+            (way_id, json.dumps(node_ids), json.dumps(tags) if tags else None)
+        )
+        self.way_nodes.extend((way_id, node_id) for node_id in set(node_ids))
+        if len(self.way_nodes) >= INSERT_BATCH_SIZE:
+            self.flush()
+
+    def add_relation(self, relation_id: int, members: list[dict], tags: dict) -> None:
+        self.relations.append(
+            (relation_id, json.dumps(members), json.dumps(tags) if tags else None)
+        )
+        self.relation_ways.extend(
+            (relation_id, member["ref"])
+            for member in members
+            if member["type"] == "way"
+        )
+        if len(self.relation_ways) >= INSERT_BATCH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        execute = self.connection.executemany
+        execute("INSERT OR REPLACE INTO nodes VALUES (?, ?, ?)", self.nodes)
+        execute("INSERT OR REPLACE INTO ways VALUES (?, ?, ?)", self.ways)
+        execute("INSERT INTO way_nodes VALUES (?, ?)", self.way_nodes)
+        execute("INSERT OR REPLACE INTO relations VALUES (?, ?, ?)", self.relations)
+        execute("INSERT INTO relation_ways VALUES (?, ?)", self.relation_ways)
+        for batch in (
+            self.nodes,
+            self.ways,
+            self.way_nodes,
+            self.relations,
+            self.relation_ways,
+        ):
+            batch.clear()
+
+
+def build_index(extract_path: str, index_path: str, signature: dict) -> None:
+    """Load an OSM extract into a new spatial index database at index_path."""
+    print(f"Building spatial index of {extract_path}")
+    folder = os.path.dirname(os.path.abspath(index_path))
+    fd, temp_path = tempfile.mkstemp(dir=folder, suffix=".sqlite.tmp")
+    os.close(fd)
+    try:
+        connection = sqlite3.connect(temp_path)
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        connection.executescript(SCHEMA)
+        writer = _IndexWriter(connection)
+        if extract_path.endswith(".pbf"):
+            read_osm_pbf(extract_path, writer)
+        else:
+            read_osm_xml(extract_path, writer)
+        writer.flush()
+        connection.executescript(FINALIZE)
+        connection.executemany("INSERT INTO meta VALUES (?, ?)", signature.items())
+        connection.commit()
+        connection.execute("VACUUM")
+        connection.close()
+        # replace atomically, so that concurrent runs never read a partial index
+        os.replace(temp_path, index_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def read_osm_xml(path: str, writer: _IndexWriter) -> None:
+    """Stream the elements of an OSM XML file (optionally .gz/.bz2) into the index."""
+    if path.endswith(".gz"):
+        f = gzip.open(path, "rb")
+    elif path.endswith(".bz2"):
+        f = bz2.open(path, "rb")
+    else:
+        f = open(path, "rb")
+
+    with f:
+        root = None
+        for event, element in ET.iterparse(f, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = element
+                continue
+            if element.tag == "node":
+                writer.add_node(
+                    int(element.get("id")),
+                    float(element.get("lat")),
+                    float(element.get("lon")),
+                )
+            elif element.tag == "way":
+                writer.add_way(
+                    int(element.get("id")),
+                    [int(nd.get("ref")) for nd in element.iter("nd")],
+                    {tag.get("k"): tag.get("v") for tag in element.iter("tag")},
+                )
+            elif element.tag == "relation":
+                writer.add_relation(
+                    int(element.get("id")),
+                    [
+                        {
+                            "type": member.get("type"),
+                            "ref": int(member.get("ref")),
+                            "role": member.get("role", ""),
+                        }
+                        for member in element.iter("member")
+                    ],
+                    {tag.get("k"): tag.get("v") for tag in element.iter("tag")},
+                )
+            else:
+                continue
+            # drop parsed elements, so that memory stays flat for large extracts
+            root.clear()
+
+
+def read_osm_pbf(path: str, writer: _IndexWriter) -> None:
+    """Stream the elements of an OSM PBF file into the index (requires osmium)."""
+    if osmium is None:
+        raise ImportError(
+            "Reading .osm.pbf extracts requires the 'osmium' package (pyosmium), "
+            "install it with: poetry install --with pbf"
+        )
+    member_types = {"n": "node", "w": "way", "r": "relation"}
+
+    class Handler(osmium.SimpleHandler):
+        def node(self, n):
+            if n.location.valid():
+                writer.add_node(n.id, n.location.lat, n.location.lon)
+
+        def way(self, w):
+            writer.add_way(w.id, [n.ref for n in w.nodes], {t.k: t.v for t in w.tags})
+
+        def relation(self, r):
+            writer.add_relation(
+                r.id,
+                [
+                    {"type": member_types[m.type], "ref": m.ref, "role": m.role}
+                    for m in r.members
+                ],
+                {t.k: t.v for t in r.tags},
+            )
+
+    Handler().apply_file(path)
+
+
+def query_index(
+    connection: sqlite3.Connection,
+    keywords: list[str],
+    min_lat_lon: tuple[float],
+    max_lat_lon: tuple[float],
+) -> Iterator[dict]:
+    """Yield elements in the layout of an Overpass "out body;>;out skel qt;" response.
+
+    Nodes with the keywords are not included, as they carry no geometry
+    for buildings and roads.
+    """
+    keywords = set(keywords)
+    bbox = (min_lat_lon[0], max_lat_lon[0], min_lat_lon[1], max_lat_lon[1])
+    way_ids = set()
+    node_ids = set()
+
+    # out body: tagged ways and relations
+    rows = connection.execute(
+        "SELECT w.id, w.nodes, w.tags FROM way_bbox b JOIN ways w ON w.id = b.id "
+        f"WHERE w.tags IS NOT NULL AND {BBOX_CONDITION} ORDER BY w.id",
+        bbox,
+    )
+    for way_id, nodes, tags in rows:
+        tags = json.loads(tags)
+        if keywords.isdisjoint(tags):
+            continue
+        nodes = json.loads(nodes)
+        way_ids.add(way_id)
+        node_ids.update(nodes)
+        yield {"type": "way", "id": way_id, "nodes": nodes, "tags": tags}
+
+    member_way_ids = set()
+    rows = connection.execute(
+        "SELECT r.id, r.members, r.tags FROM relation_bbox b "
+        "JOIN relations r ON r.id = b.id "
+        f"WHERE r.tags IS NOT NULL AND {BBOX_CONDITION} ORDER BY r.id",
+        bbox,
+    )
+    for relation_id, members, tags in rows:
+        tags = json.loads(tags)
+        if keywords.isdisjoint(tags):
+            continue
+        members = json.loads(members)
+        member_way_ids.update(m["ref"] for m in members if m["type"] == "way")
+        yield {"type": "relation", "id": relation_id, "members": members, "tags": tags}
+
+    # out skel: member ways of relations, then the nodes of all ways
+    for way_id, nodes in _select_by_ids(
+        connection, "SELECT id, nodes FROM ways", sorted(member_way_ids)
+    ):
+        nodes = json.loads(nodes)
+        node_ids.update(nodes)
+        yield {"type": "way", "id": way_id, "nodes": nodes}
+
+    for node_id, lat, lon in _select_by_ids(
+        connection, "SELECT id, lat, lon FROM nodes", sorted(node_ids)
+    ):
+        yield {"type": "node", "id": node_id, "lat": lat, "lon": lon}
+
+
+def _select_by_ids(
+    connection: sqlite3.Connection, select: str, ids: list[int]
+) -> Iterable[tuple]:
+    """Run a SELECT for many IDs in batches."""
+    for i in range(0, len(ids), SELECT_BATCH_SIZE):
+        batch = ids[i : i + SELECT_BATCH_SIZE]
+        placeholders = ",".join("?" * len(batch))
+        yield from connection.execute(f"{select} WHERE id IN ({placeholders})", batch)
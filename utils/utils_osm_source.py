@@ -0,0 +1,175 @@
+import json
+import os
+from abc import ABC, abstractmethod
+from collections.abc import Iterable, Iterator
+
+from utils.utils_cache import CACHE_FOLDER, CacheWriter, DiskCache, cache_key
+from utils.utils_http import http_client
+from utils.utils_json import iter_json_array
+
+OVERPASS_URL = "http://overpass-api.de/api/interpreter"
+STREAM_CHUNK_SIZE = 64 * 1024
+# Overpass may take up to its own query timeout (180 s) before sending any data
+OVERPASS_READ_TIMEOUT = 200  # seconds
+OVERPASS_TOTAL_TIMEOUT = 600  # seconds
+
+# Overpass responses are reused between runs on the same site
+OVERPASS_CACHE_TTL = float(os.getenv("OVERPASS_CACHE_TTL", 24 * 3600))  # seconds
+OVERPASS_CACHE_MAX_BYTES = int(os.getenv("OVERPASS_CACHE_MAX_BYTES", 512 * 1024**2))
+overpass_cache = DiskCache(
+    os.path.join(CACHE_FOLDER, "overpass"),
+    max_bytes=OVERPASS_CACHE_MAX_BYTES,
+    ttl_seconds=OVERPASS_CACHE_TTL,
+)
+
+
+class OsmDataSource(ABC):
+    """Source of OSM elements for a bbox.
+
+    Elements are yielded one by one in the layout of an Overpass
+    "out body;>;out skel qt;" response: the elements with any of the
+    keywords (with tags), then the member ways of their relations and the
+    nodes of all their ways (without tags). Data sources implement both
+    iter_elements and count_elements.
+    """
+
+    @abstractmethod
+    def iter_elements(
+        self, keywords: list[str], min_lat_lon: tuple[float], max_lat_lon: tuple[float]
+    ) -> Iterator[dict]:
+        """Yield the OSM elements with any of the keywords within the bbox."""
+
+    @abstractmethod
+    def count_elements(
+        self, keywords: list[str], min_lat_lon: tuple[float], max_lat_lon: tuple[float]
+    ) -> int | None:
+        """Count the elements with any of the keywords, None if not supported."""
+
+    def stats(self) -> dict:
+        """Get statistics of the data source (e.g. caching and transfer)."""
+        return {}
+
+
+class OverpassDataSource(OsmDataSource):
+    """OSM elements from the Overpass API, cached on disk."""
+
+    def __init__(self, url: str = OVERPASS_URL) -> None:
+        """Use the Overpass API instance at url."""
+        self.url = url
+
+    def iter_elements(
+        self, keywords: list[str], min_lat_lon: tuple[float], max_lat_lon: tuple[float]
+    ) -> Iterator[dict]:
+        """Stream the elements of a single Overpass request (or its cached response).
+
+        The response is parsed while it streams in, so the full JSON document
+        is never loaded into memory.
+        """
+        overpass_query = get_overpass_query(keywords, min_lat_lon, max_lat_lon)
+
+        key = cache_key(self.url, " ".join(overpass_query.split()))
+        cached = overpass_cache.open(key)
+        if cached is not None:
+            try:
+                with cached:
+                    chunks = iter(lambda: cached.read(STREAM_CHUNK_SIZE), b"")
+                    yield from iter_json_array(chunks, "elements")
+            except (OSError, EOFError, ValueError):
+                # a corrupted entry, fetched again by the next run
+                overpass_cache.invalidate(key)
+                raise
+            return
+
+        response = http_client.get(
+            self.url,
+            params={"data": overpass_query},
+            stream=True,
+            read_timeout=OVERPASS_READ_TIMEOUT,
+            total_timeout=OVERPASS_TOTAL_TIMEOUT,
+        )
+        if response.status_code != 200:
+            response.close()
+            raise Exception(
+                f"Request not successful: Response code {response.status_code}"
+            )
+        writer = overpass_cache.writer(key)
+        other_values = {}
+        try:
+            chunks = write_through(
+                http_client.iter_content(response, STREAM_CHUNK_SIZE), writer
+            )
+            yield from iter_json_array(chunks, "elements", other_values)
+        except BaseException:  # including the consumer stopping early
+            writer.discard()
+            raise
+        # Overpass reports runtime errors (e.g. timeouts) of partial results in "remark"
+        if "remark" in other_values:
+            writer.discard()
+        else:
+            writer.commit()
+
+    def count_elements(
+        self, keywords: list[str], min_lat_lon: tuple[float], max_lat_lon: tuple[float]
+    ) -> int | None:
+        """Ask Overpass how many tagged elements a query would return.
+
+        The count is cached like the responses, so warm runs stay offline.
+        """
+        overpass_query = get_overpass_query(
+            keywords, min_lat_lon, max_lat_lon, out="out count;"
+        )
+        key = cache_key(self.url, " ".join(overpass_query.split()))
+        cached = overpass_cache.get(key)
+        if cached is not None:
+            return int(cached) if cached else None
+
+        response = http_client.get(
+            self.url,
+            params={"data": overpass_query},
+            read_timeout=OVERPASS_READ_TIMEOUT,
+            total_timeout=OVERPASS_TOTAL_TIMEOUT,
+        )
+        if response.status_code != 200:
+            raise Exception(
+                f"Request not successful: Response code {response.status_code}"
+            )
+        # {"elements": [{"type": "count", "tags": {"total": "123", ...}}]}
+        count = None
+        for element in json.loads(response.content)["elements"]:
+            if element["type"] == "count":
+                count = int(element["tags"]["total"])
+                break
+        overpass_cache.set(key, b"" if count is None else str(count).encode("ascii"))
+        return count
+
+    def stats(self) -> dict:
+        """Get the response cache and HTTP transfer statistics."""
+        return {"cache": overpass_cache.stats(), "http": http_client.summary()}
+
+
+def get_overpass_query(
+    keywords: list[str],
+    min_lat_lon: tuple[float],
+    max_lat_lon: tuple[float],
+    out: str = "out body;>;out skel qt;",
+) -> str:
+    """Compose an Overpass query for the elements with any of the keywords."""
+    # normalise the query, so that the same area always hits the same cache entry
+    bbox = ",".join(f"{v:.6f}" for v in (*min_lat_lon, *max_lat_lon))
+    statements = "".join(
+        f"""
+    node["{keyword}"]({bbox});
+    way["{keyword}"]({bbox});
+    relation["{keyword}"]({bbox});"""
+        for keyword in sorted(set(keywords))
+    )
+    return f"""[out:json];
+    ({statements}
+    );{out}"""
+
+
+def write_through(chunks: Iterable[bytes], writer: CacheWriter) -> Iterator[bytes]:
+    """Pass the chunks on, while also writing them to a cache entry."""
+    for chunk in chunks:
+        writer.write(chunk)
+        yield chunk
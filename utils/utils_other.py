@@ -1,4 +1,4 @@
-from copy import copy
+import re
 
 from utils.utils_pyproj import create_crs, reproject_to_crs
 
@@ -6,6 +6,7 @@ RESULT_BRANCH = "automate"
 COLOR_ROAD = (255 << 24) + (50 << 16) + (50 << 8) + 50  # argb
 COLOR_BLD = (255 << 24) + (230 << 16) + (230 << 8) + 230  # argb
 COLOR_VISIBILITY = (255 << 24) + (255 << 16) + (10 << 8) + 10  # argb
+NUMBER = re.compile(r"\d+\.?\d*|\.\d+")
 
 
 def get_degrees_bbox_from_lat_lon_rad(
@@ -23,6 +24,29 @@ def get_degrees_bbox_from_lat_lon_rad(
     return min_lat_lon, max_lat_lon
 
 
+def split_bbox(
+    min_lat_lon: tuple[float], max_lat_lon: tuple[float], grid_size: int
+) -> list[tuple[tuple]]:
+    """Split a bbox into a grid of grid_size x grid_size (min, max) sub-bboxes."""
+    lat_step = (max_lat_lon[0] - min_lat_lon[0]) / grid_size
+    lon_step = (max_lat_lon[1] - min_lat_lon[1]) / grid_size
+
+    bboxes = []
+    for i in range(grid_size):
+        for j in range(grid_size):
+            bboxes.append(
+                (
+                    (min_lat_lon[0] + i * lat_step, min_lat_lon[1] + j * lon_step),
+                    (
+                        min_lat_lon[0] + (i + 1) * lat_step,
+                        min_lat_lon[1] + (j + 1) * lon_step,
+                    ),
+                )
+            )
+
+    return bboxes
+
+
 def clean_string(text: str) -> str:
     """Clean string from non-numeric symbols."""
     symbols = r"/[^\d.-]/g, ''"
@@ -38,19 +62,34 @@ def clean_string(text: str) -> str:
     return new_text
 
 
-def fill_list(vals: list, lsts: list) -> list[list]:
-    """Split values into separate lists by the repeated value."""
-    if len(vals) > 1:
-        lsts.append([])
-    else:
-        return
-
-    for i, v in enumerate(vals):
-        if v not in lsts[len(lsts) - 1]:
-            lsts[len(lsts) - 1].append(v)
-        else:
-            if len(lsts[len(lsts) - 1]) <= 1:
-                lsts.pop(len(lsts) - 1)
-            vals = copy(vals[i - 1 :])
-            lsts = fill_list(vals, lsts)
+def parse_number(text: str) -> float | None:
+    """Parse the first number of a tag value (e.g. "12;15"), None if there is none."""
+    number = clean_string(text.split(",")[0].split(";")[0])
+    if NUMBER.fullmatch(number) is None:
+        return None
+
+    return float(number)
+
+
+def split_by_repeated_values(vals: list) -> list[list]:
+    """Split values into lists without repetitions, in a single pass.
+
+    A value already in the current list closes it, and the next list starts
+    from the value before it, so that consecutive lists share an end.
+    Consecutive equal values count once; lists of a single value are dropped.
+    """
+    lsts = []
+    current = []
+    seen = set()
+    for v in vals:
+        if current and v == current[-1]:
+            continue
+        if v in seen:
+            lsts.append(current)
+            current = [current[-1]]
+            seen = {current[-1]}
+        current.append(v)
+        seen.add(v)
+    if len(current) > 1:
+        lsts.append(current)
     return lsts
@@ -0,0 +1,76 @@
+import math
+import os
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+
+CGROUP_V2_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+CGROUP_V1_CPU_QUOTA = "/sys/fs/cgroup/cpu/cpu.cfs_quota_us"
+CGROUP_V1_CPU_PERIOD = "/sys/fs/cgroup/cpu/cpu.cfs_period_us"
+# items (footprints or roads) below which meshing stays in this process
+MESH_PARALLEL_MIN_ITEMS = int(os.getenv("MESH_PARALLEL_MIN_ITEMS", 5000))
+MESH_BATCHES_PER_WORKER = 4
+
+
+def get_cpu_quota() -> float | None:
+    """Read the CPU limit of the container from its cgroup, if any."""
+    try:
+        with open(CGROUP_V2_CPU_MAX) as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(CGROUP_V1_CPU_QUOTA) as f:
+            quota = int(f.read())
+        with open(CGROUP_V1_CPU_PERIOD) as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def get_cpu_count() -> int:
+    """Number of CPUs this process may use, limited by the container quota."""
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on all platforms
+        count = os.cpu_count() or 1
+    quota = get_cpu_quota()
+    if quota is not None:
+        count = min(count, math.floor(quota))
+    return max(1, count)
+
+
+MESH_WORKERS = int(os.getenv("MESH_WORKERS", 0)) or get_cpu_count()
+
+
+def get_mesh_workers(items: int) -> int:
+    """Number of processes for meshing the items, 1 for small jobs."""
+    if items < MESH_PARALLEL_MIN_ITEMS:
+        return 1
+    return MESH_WORKERS
+
+
+def split_batches(count: int, workers: int) -> list[slice]:
+    """Split a range of items into contiguous batches for the workers."""
+    if count == 0:
+        return [slice(0, 0)]
+    size = math.ceil(count / min(count, workers * MESH_BATCHES_PER_WORKER))
+    return [slice(start, start + size) for start in range(0, count, size)]
+
+
+def map_batches(function: Callable, batches: list[tuple], workers: int) -> list:
+    """Call the function with the arguments of each batch, in input order.
+
+    With more than one worker, the batches go to a process pool; their
+    arguments and results are pickled, so they should be plain arrays.
+    """
+    if workers <= 1 or len(batches) <= 1:
+        return [function(*arguments) for arguments in batches]
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(batches))) as executor:
+        return list(executor.map(function, *zip(*batches)))
@@ -1,14 +1,16 @@
 import math
 import os
-import shutil
+import struct
 import tempfile
-from datetime import datetime
-from statistics import mean
+import zlib
+from collections.abc import Iterable, Iterator
+from typing import BinaryIO
 
-import png
-import requests
+import numpy as np
 
+from utils.utils_http import http_client
 from utils.utils_other import get_degrees_bbox_from_lat_lon_rad
+from utils.utils_tiles import decode_png_colors, get_tiles, tile_cache
 
 MARGIN_COEFF = 100
 
@@ -18,53 +20,151 @@ assets_folder_path = os.path.dirname(os.path.abspath(__file__)).replace(
 PATH_COPYRIGHT = os.path.join(assets_folder_path, "copyright.PNG")
 PATH_NUMBERS = os.path.join(assets_folder_path, "numbers.PNG")
 
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# zlib level of the basemap PNG, from 1 (fastest) to 9 (smallest)
+PNG_COMPRESSION_LEVEL = int(os.getenv("PNG_COMPRESSION_LEVEL", 6))
+PNG_BLOCK_ROWS = 64  # rows filtered and compressed at once
+
 
 def create_image_from_bbox(lat: float, lon: float, radius: float) -> str:
     """Get OSM tile image around selected location and save it to a PNG file."""
-    temp_folder = "automate_tiles_" + str(datetime.now().timestamp())[:6]
-    temp_folder_path = os.path.join(os.path.abspath(tempfile.gettempdir()), temp_folder)
-    folderExist = os.path.exists(temp_folder_path)
-    if not folderExist:
-        os.makedirs(temp_folder_path)
+    temp_folder_path = os.path.join(
+        os.path.abspath(tempfile.gettempdir()), "automate_basemaps"
+    )
+    os.makedirs(temp_folder_path, exist_ok=True)
 
     min_lat_lon, max_lat_lon = get_degrees_bbox_from_lat_lon_rad(lat, lon, radius)
 
     x_px = min(2048, int(5 * radius))
     y_px = min(2048, int(5 * radius))
     png_name = f"map_{int(lat*1000000)}_{int(lon*1000000)}_{radius}.png"
-    color_rows = get_colors_of_points_from_tiles(
-        min_lat_lon, max_lat_lon, radius, temp_folder_path, png_name, x_px, y_px
+    image = get_colors_of_points_from_tiles(
+        min_lat_lon, max_lat_lon, radius, png_name, x_px, y_px
     )
 
     file_name = os.path.join(temp_folder_path, png_name)
-    writePng(color_rows, file_name)
+    writePng(image, file_name)
+    print(f"Tile cache: {tile_cache.stats()}")
+    print(f"HTTP: {http_client.summary()}")
 
     return file_name
 
 
-def writePng(color_rows: list[list[float]], path: str) -> None:
-    """Writes PNG file from rows with color tuples."""
+def writePng(
+    color_rows: np.ndarray | Iterable,
+    path: str,
+    width: int | None = None,
+    height: int | None = None,
+    compression_level: int = PNG_COMPRESSION_LEVEL,
+) -> None:
+    """Writes an RGB PNG file from rows of color values, in blocks of rows.
+
+    The rows are a (height, width * 3) or (height, width, 3) uint8 array, a
+    list of rows, or any iterable of rows (e.g. a generator) with the width
+    and height given. The rows are filtered and compressed block by block,
+    so only a block is held in memory besides the rows themselves.
+    """
     if not path.endswith(".png"):
         return
 
-    p = color_rows
-    f = open(path, "wb")
-    w = png.Writer(int(len(color_rows[0]) / 3), len(color_rows), greyscale=False)
-    w.write(f, p)
-    f.close()
+    if isinstance(color_rows, np.ndarray):
+        color_rows = color_rows.reshape(len(color_rows), -1)
+    if width is None or height is None:
+        width = int(len(color_rows[0]) / 3)
+        height = len(color_rows)
+
+    with open(path, "wb") as f:
+        f.write(PNG_SIGNATURE)
+        # 8 bit RGB, deflate, adaptive filtering, no interlace
+        write_png_chunk(
+            f, b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+        )
+        compressor = zlib.compressobj(compression_level)
+        previous = np.zeros(3 * width, dtype=np.uint8)
+        rows_written = 0
+        for block in iter_row_blocks(color_rows, 3 * width):
+            data = compressor.compress(filter_scanlines(block, previous).tobytes())
+            if data:
+                write_png_chunk(f, b"IDAT", data)
+            previous = block[-1]
+            rows_written += len(block)
+        write_png_chunk(f, b"IDAT", compressor.flush())
+        write_png_chunk(f, b"IEND", b"")
+
+    if rows_written != height:
+        raise Exception(f"Expected {height} rows for the PNG, got {rows_written}")
+
+
+def iter_row_blocks(
+    color_rows: np.ndarray | Iterable, values: int
+) -> Iterator[np.ndarray]:
+    """Yield (n, values) uint8 blocks of PNG_BLOCK_ROWS rows."""
+    if isinstance(color_rows, np.ndarray):
+        for start in range(0, len(color_rows), PNG_BLOCK_ROWS):
+            yield color_rows[start : start + PNG_BLOCK_ROWS].astype(
+                np.uint8, copy=False
+            )
+        return
 
+    block = []
+    for row in color_rows:
+        block.append(np.asarray(row, dtype=np.uint8).reshape(values))
+        if len(block) == PNG_BLOCK_ROWS:
+            yield np.stack(block)
+            block = []
+    if block:
+        yield np.stack(block)
+
+
+def filter_scanlines(block: np.ndarray, previous: np.ndarray) -> np.ndarray:
+    """Filter a block of RGB scanlines, each with the PNG filter that suits it best.
+
+    All five filters are applied to all rows at once; each row keeps the one
+    with the smallest sum of absolute (signed) values, prefixed with its type.
+    The previous row is the last one of the preceding block (zeros at first).
+    """
+    above = np.concatenate((previous[None], block[:-1]))
+    left = np.zeros_like(block)
+    left[:, 3:] = block[:, :-3]
+    upper_left = np.zeros_like(block)
+    upper_left[:, 3:] = above[:, :-3]
+
+    # the predictor closest to left + above - upper_left
+    a, b, c = (values.astype(np.int16) for values in (left, above, upper_left))
+    distance_left = np.abs(b - c)
+    distance_above = np.abs(a - c)
+    distance_upper_left = np.abs(a + b - 2 * c)
+    paeth = np.where(
+        (distance_left <= distance_above) & (distance_left <= distance_upper_left),
+        left,
+        np.where(distance_above <= distance_upper_left, above, upper_left),
+    )
+    average = (left >> 1) + (above >> 1) + (left & above & 1)
 
-def get_colors_of_points_from_tiles(
-    min_lat_lon: tuple,
-    max_lat_lon: tuple,
-    radius: float,
-    temp_folder_path: str,
-    png_name: str,
-    x_px: int = 256,
-    y_px: int = 256,
-) -> list[list[float]]:
-    """Retrieve colors from OSM tiles from bbox and writes to PNG file 256x256 px."""
-    # set the map zoom level
+    # none, sub, up, average, paeth (uint8 arithmetic wraps around as in PNG)
+    filtered = np.empty((5, *block.shape), dtype=np.uint8)
+    filtered[0] = block
+    for i, predictor in enumerate((left, above, average, paeth), start=1):
+        np.subtract(block, predictor, out=filtered[i])
+    costs = np.abs(filtered.view(np.int8)).view(np.uint8).sum(axis=2, dtype=np.uint32)
+    types = np.argmin(costs, axis=0)
+
+    scanlines = np.empty((len(block), 1 + block.shape[1]), dtype=np.uint8)
+    scanlines[:, 0] = types
+    scanlines[:, 1:] = filtered[types, np.arange(len(block))]
+    return scanlines
+
+
+def write_png_chunk(f: BinaryIO, chunk_type: bytes, data: bytes) -> None:
+    """Write a PNG chunk with its length and CRC."""
+    f.write(struct.pack(">I", len(data)))
+    f.write(chunk_type)
+    f.write(data)
+    f.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type))))
+
+
+def get_zoom(min_lat_lon: tuple, max_lat_lon: tuple) -> int:
+    """Get the zoom level of the tiles for the bbox, lower for larger areas."""
     zoom = 18
     zoom_max_range = 0.014
     diff_lat = max_lat_lon[0] - min_lat_lon[0]  # 0.008988129231113362 # for 500m r
@@ -77,75 +177,85 @@ def get_colors_of_points_from_tiles(
             zoom_step = 2
         zoom -= zoom_step
 
-    # initialize rows of colors
-    range_lon = [
-        min_lat_lon[1] + (max_lat_lon[1] - min_lat_lon[1]) * step / x_px
-        for step in range(x_px)
-    ]
-    range_lat = [
-        min_lat_lon[0] + (max_lat_lon[0] - min_lat_lon[0]) * step / y_px
-        for step in range(y_px)
-    ]
-    color_rows: list[list] = [[] for _ in range(y_px)]
-
-    all_tile_names = []
-    all_files_data = []
-    for i, lat in enumerate(range_lat):
-        for k, lon in enumerate(range_lon):
-            # get tiles indices
-            n = math.pow(2, zoom)
-            x = n * ((lon + 180) / 360)
-            y_r = math.radians(lat)
-            y = n * (1 - (math.log(math.tan(y_r) + 1 / math.cos(y_r)) / math.pi)) / 2
-
-            # check if the previous iterations saved this tile
-            file_name = f"{zoom}_{int(x)}_{int(y)}"
-            if file_name not in all_tile_names:
-                # if not, check whether the file with this name exists
-                file_path = os.path.join(temp_folder_path, f"{file_name}.png")
-                fileExists = os.path.isfile(file_path)
-                # download a tile if doesn't exist yet
-                if not fileExists:
-                    url = f"https://tile.openstreetmap.org/{zoom}/{int(x)}/{int(y)}.png"  # e.g. https://tile.openstreetmap.org/3/4/2.png
-                    headers = {
-                        "User-Agent": f"Speckle-Automate; Python 3.11; Image: {png_name}"
-                    }
-                    r = requests.get(url, headers=headers, stream=True)
-                    if r.status_code == 200:
-                        with open(file_path, "wb") as f:
-                            r.raw.decode_content = True
-                            shutil.copyfileobj(r.raw, f)
-                    else:
-                        raise Exception(
-                            f"Request not successful: Response code {r.status_code}"
-                        )
-            # find pixel index in the image
-            remainder_x_degrees = x % 1  # (lon + 180) % degrees_in_tile_x
-            remainder_y_degrees = y % 1  # y_remapped_value % degrees_in_tile_y
-
-            reader = png.Reader(filename=file_path)
-            try:
-                file_data = all_files_data[all_tile_names.index(file_name)]
-            except ValueError:
-                file_data = reader.read_flat()
-                all_tile_names.append(file_name)
-                all_files_data.append(file_data)
-            w, h, pixels, metadata = file_data  # w = h = 256pixels each side
-
-            # get pixel color
-            average_color_tuple = get_image_pixel_color(
-                w,
-                h,
-                pixels,
-                metadata,
-                remainder_x_degrees,
-                remainder_y_degrees,
-                average_px_offset=1,
-                contrast_factor=2,
-            )
-            color_rows[len(range_lat) - i - 1].extend(average_color_tuple)
+    return zoom
+
+
+def get_tile_coords(
+    min_lat_lon: tuple, max_lat_lon: tuple, zoom: int, x_px: int, y_px: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Get the fractional Web-Mercator tile x of each column and y of each row.
+
+    Columns and rows sample the bbox from its min corner, the rows are
+    ordered from north to south (as in the image).
+    """
+    n = math.pow(2, zoom)
+    steps = np.arange(x_px)
+    lons = min_lat_lon[1] + (max_lat_lon[1] - min_lat_lon[1]) * steps / x_px
+    x = n * ((lons + 180) / 360)
 
-    color_rows = add_copyright_text(color_rows, width=x_px)
+    # a row shares its latitude, so math is called once per row
+    y = []
+    for step in reversed(range(y_px)):
+        lat = min_lat_lon[0] + (max_lat_lon[0] - min_lat_lon[0]) * step / y_px
+        y_r = math.radians(lat)
+        y.append(n * (1 - (math.log(math.tan(y_r) + 1 / math.cos(y_r)) / math.pi)) / 2)
+
+    return x, np.array(y)
+
+
+def read_png_colors(file_path: str) -> np.ndarray:
+    """Decode a PNG file (palette, RGB or RGBA) into an (h, w, 3) uint8 array."""
+    with open(file_path, "rb") as f:
+        return decode_png_colors(f.read())
+
+
+def quantize_colors(colors: np.ndarray, contrast_factor: int = 2) -> np.ndarray:
+    """Increase the contrast by rounding the colors down to multiples of the factor."""
+    return colors // contrast_factor * contrast_factor
+
+
+def get_colors_of_points_from_tiles(
+    min_lat_lon: tuple,
+    max_lat_lon: tuple,
+    radius: float,
+    png_name: str,
+    x_px: int = 256,
+    y_px: int = 256,
+) -> np.ndarray:
+    """Render the OSM tiles of the bbox into an image of x_px by y_px pixels.
+
+    Returns the (rows, columns, 3) uint8 colors, with the copyright notice
+    and the scale bar added below and onto the map.
+    """
+    zoom = get_zoom(min_lat_lon, max_lat_lon)
+    x, y = get_tile_coords(min_lat_lon, max_lat_lon, zoom, x_px, y_px)
+    tiles_x = x.astype(np.int64)
+    tiles_y = y.astype(np.int64)
+
+    # fetch all tiles of the bbox first, then decode each once into a mosaic
+    columns = np.unique(tiles_x)
+    rows = np.unique(tiles_y)
+    user_agent = f"Speckle-Automate; Python 3.11; Image: {png_name}"
+    tiles = get_tiles(zoom, columns.tolist(), rows.tolist(), user_agent)
+    report = {"cached": 0, "revalidated": 0, "downloaded": 0}
+    h, w = tiles[0][0][0].shape[:2]  # w = h = 256pixels each side
+    mosaic = np.zeros((len(rows) * h, len(columns) * w, 3), np.uint8)
+    for i, row in enumerate(tiles):
+        for k, (tile, status) in enumerate(row):
+            report[status] += 1
+            mosaic[i * h : (i + 1) * h, k * w : (k + 1) * w] = tile
+    print(f"Tiles: {report}")
+
+    image = render_mosaic(
+        mosaic,
+        np.searchsorted(columns, tiles_x) * w,
+        np.floor(x % 1 * w).astype(np.int64),
+        np.searchsorted(rows, tiles_y) * h,
+        np.floor(y % 1 * h).astype(np.int64),
+        w,
+        h,
+    )
+    image = add_copyright_text(image, width=x_px)
 
     pixels_per_meter = x_px / 2 / radius
     scale_meters = math.floor(radius / 200) * 100
@@ -153,77 +263,65 @@ def get_colors_of_points_from_tiles(
         scale_meters = math.floor(radius / 20) * 10
         if scale_meters == 0:
             scale_meters = 1
-    color_rows = add_scale_bar(color_rows, pixels_per_meter, scale_meters, x_px)
-    color_rows = add_scale_text(color_rows, scale_meters, width=x_px)
+    image = add_scale_bar(image, pixels_per_meter, scale_meters, x_px)
+    image = add_scale_text(image, scale_meters, width=x_px)
 
-    return color_rows
+    return image
 
 
-def get_image_pixel_color(
-    sizeX: int,
-    sizeY: int,
-    pixels: int,
-    metadata: dict,
-    x_ratio: float,
-    y_ratio: float,
+def render_mosaic(
+    mosaic: np.ndarray,
+    column_tiles: np.ndarray,
+    column_pixels: np.ndarray,
+    row_tiles: np.ndarray,
+    row_pixels: np.ndarray,
+    w: int,
+    h: int,
     average_px_offset: int = 1,
     contrast_factor: int = 2,
-) -> tuple[int]:
-    """From PNG file reader data, get pixel color at x,y (normalized) position."""
-    try:
-        palette = metadata["palette"]
-    except KeyError:
-        palette = None
-    # get average of surrounding pixels (in case it falls on the text/symbol)
-    local_colors_list = []
-    for offset_step_x in range((-1) * average_px_offset, average_px_offset + 1):
-        coeff_x = offset_step_x  # + offset
-        for offset_step_y in range((-1) * average_px_offset, average_px_offset + 1):
-            coeff_y = offset_step_y  # + offset
-
-            pixel_x_index = math.floor(x_ratio * sizeX)
-            if 0 <= pixel_x_index + coeff_x < sizeX:
-                pixel_x_index += coeff_x
-
-            pixel_y_index = math.floor(y_ratio * sizeY)
-            if 0 <= pixel_y_index + coeff_y < sizeY:
-                pixel_y_index += coeff_y
-
-            pixel_index = pixel_y_index * sizeX + pixel_x_index
-            if palette is not None:
-                color_tuple = palette[pixels[pixel_index]]
-            elif metadata["alpha"] is True:
-                color_tuple = (
-                    pixels[pixel_index * 4],
-                    pixels[pixel_index * 4 + 1],
-                    pixels[pixel_index * 4 + 2],
-                )
-            else:
-                color_tuple = (
-                    pixels[pixel_index * 3],
-                    pixels[pixel_index * 3 + 1],
-                    pixels[pixel_index * 3 + 2],
-                )
-            local_colors_list.append(color_tuple)
-
-    average_color_tuple = (
-        int(mean([c[0] for c in local_colors_list])),
-        int(mean([c[1] for c in local_colors_list])),
-        int(mean([c[2] for c in local_colors_list])),
-    )
-    # increase contrast
-    contrast_factor = 2
-    average_color_tuple = (
-        int(average_color_tuple[0] / contrast_factor) * contrast_factor,
-        int(average_color_tuple[1] / contrast_factor) * contrast_factor,
-        int(average_color_tuple[2] / contrast_factor) * contrast_factor,
-    )
-    return average_color_tuple
+) -> np.ndarray:
+    """Resample the mosaic of (w by h px) tiles with a box filter at once.
+
+    Each output pixel is the mean of the (2 * average_px_offset + 1)**2
+    pixels around its pixel within its tile (in case it falls on a
+    text/symbol), rounded down and quantized. Neighbours outside the tile
+    are replaced by the center pixel.
+    """
+    total = np.zeros((len(row_tiles), len(column_tiles), 3), dtype=np.uint32)
+    offsets = range(-average_px_offset, average_px_offset + 1)
+    for offset_y in offsets:
+        pixels_y = row_pixels + offset_y
+        pixels_y = np.where((pixels_y >= 0) & (pixels_y < h), pixels_y, row_pixels)
+        mosaic_rows = mosaic[row_tiles + pixels_y]
+        for offset_x in offsets:
+            pixels_x = column_pixels + offset_x
+            pixels_x = np.where(
+                (pixels_x >= 0) & (pixels_x < w), pixels_x, column_pixels
+            )
+            total += mosaic_rows[:, column_tiles + pixels_x]
+
+    mean = total // len(offsets) ** 2
+    return quantize_colors(mean, contrast_factor).astype(np.uint8)
+
+
+def sample_image(
+    colors: np.ndarray, x_ratio: np.ndarray, y_ratio: np.ndarray
+) -> np.ndarray:
+    """Get the colors of an image at x,y (normalized) positions (nearest pixel).
+
+    As the pixels are indexed in row-major order, an x beyond the width
+    continues on the next row.
+    """
+    h, w = colors.shape[:2]
+    pixel_index = np.floor(y_ratio * h).astype(np.int64) * w + np.floor(
+        x_ratio * w
+    ).astype(np.int64)
+    return quantize_colors(colors.reshape(-1, 3)[pixel_index])
 
 
 def add_scale_bar(
-    color_rows: list[list], pixels_per_meter: float, scale_meters: int, size: int
-) -> list[list[float]]:
+    image: np.ndarray, pixels_per_meter: float, scale_meters: int, size: int
+) -> np.ndarray:
     """Add a scale bar."""
     line_width = int(size / MARGIN_COEFF / 5)
     line_width = max(2, line_width)
@@ -234,53 +332,34 @@ def add_scale_bar(
     tick_height = 2 * size / MARGIN_COEFF
     tick_height = max(tick_height, 4)
     tick_height = min(tick_height, 30 + line_width - size / MARGIN_COEFF)
-    rows = len(color_rows)
-
-    for i, _ in enumerate(range(rows)):
-        # stop at the necessary row for ticks
-        count = 0
-        if (
-            i >= (rows - min(2, size / MARGIN_COEFF) - line_width - tick_height)
-            and i < rows - min(2, size / MARGIN_COEFF) - line_width
-            and count <= line_width
-        ):
-            count += 1
-            for k, _ in enumerate(range(3 * size)):
-                # only color pixel within the scale range
-                if k in list(
-                    range(int(3 * scale_start), int(3 * scale_start + line_width))
-                ) or k in list(
-                    range(int(3 * (scale_end - line_width)), int(3 * scale_end))
-                ):
-                    color_rows[i][k] = 0
-
-        # stop at the necessary row for the strip
-        count = 0
-        if (
-            i >= rows - min(2, size / MARGIN_COEFF) - line_width
-            and i < rows - min(2, size / MARGIN_COEFF)
-            and count <= line_width
-        ):
-            count += 1
-            for k, _ in enumerate(range(3 * size)):
-                # only color pixel within the scale range
-                if k >= 3 * scale_start and k < 3 * scale_end:
-                    color_rows[i][k] = 0
-
-    return color_rows
-
-
-def add_scale_text(
-    color_rows: list[float], scale: int, width: float
-) -> list[list[float]]:
+    rows = len(image)
+    margin = min(2, size / MARGIN_COEFF)
+    i = np.arange(rows)
+    # the ranges are of color values (not pixels) of the rows, as before
+    values = image.reshape(rows, -1)
+
+    # ticks
+    is_tick = (i >= rows - margin - line_width - tick_height) & (
+        i < rows - margin - line_width
+    )
+    values[is_tick, int(3 * scale_start) : int(3 * scale_start + line_width)] = 0
+    values[is_tick, max(0, int(3 * (scale_end - line_width))) : int(3 * scale_end)] = 0
+
+    # strip
+    is_strip = (i >= rows - margin - line_width) & (i < rows - margin)
+    values[is_strip, 3 * scale_start : max(0, 3 * scale_end)] = 0
+
+    return image
+
+
+def add_scale_text(image: np.ndarray, scale: int, width: float) -> np.ndarray:
     """Add text (e.g. '100 m') to the scale bar."""
     fileExists = os.path.isfile(PATH_NUMBERS)
     if not fileExists:
         raise Exception("Number file not found")
 
-    reader = png.Reader(filename=PATH_NUMBERS)
-    file_data = reader.read_flat()
-    w, h, pixels, metadata = file_data  # w = h = 256pixels each side
+    numbers = read_png_colors(PATH_NUMBERS)
+    h, w = numbers.shape[:2]
 
     text = str(int(scale)) + "m"
     size = 25
@@ -297,63 +376,53 @@ def add_scale_text(
     start_row = width  # int(rows - 2 * rows / MARGIN_COEFF - new_h)
     start_ind = int(3 * 2 * width / MARGIN_COEFF)
 
-    for r in range(new_h):
-        x_remainder = px_cut * size_coeff  # start a count
-        char_index = 0
-        for c in range(new_w):
-            # at each X, check which number to add
-            if round(x_remainder, 2) == round((size - px_cut) * size_coeff, 2):
-                x_remainder = px_cut * size_coeff  # restart for each char
-                char_index += 1
-
-            if char_index >= len(text):
-                continue
-
-            # find the data from that number
-            for char in "0123456789m":
-                if char == text[char_index]:
-                    try:
-                        index = int(char)
-                    except:
-                        index = 10
-            x_ratio = (index * size * size_coeff + x_remainder) / new_w
-            # get pixel color
-            color_tuple = get_image_pixel_color(
-                w,
-                h,
-                pixels,
-                metadata,
-                x_ratio,
-                r / new_h,
-                average_px_offset=0,
-                contrast_factor=1,
-            )
-            x_remainder += 1 * size_coeff
-            row_index = start_row + r
-            column_index = start_ind + int(
-                3 * ((size - 2 * px_cut) * char_index * size_coeff + x_remainder)
-            )
-            if char_index == len(text) - 1:
-                column_index += int(3 * (size - 2 * px_cut) * size_coeff)
-
-            # only overwrite nearly black pixels
-            if all([color_tuple[k] < 100 for k in range(3)]):
-                color_rows[row_index][column_index] = min(color_tuple)
-                color_rows[row_index][column_index + 1] = min(color_tuple)
-                color_rows[row_index][column_index + 2] = min(color_tuple)
-
-    return color_rows
-
-
-def add_copyright_text(color_rows: list[float], width: float) -> list[list[float]]:
+    # the columns of the characters are the same in each row
+    x_ratios = []
+    column_indices = []
+    x_remainder = px_cut * size_coeff  # start a count
+    char_index = 0
+    for _ in range(new_w):
+        # at each X, check which number to add
+        if round(x_remainder, 2) == round((size - px_cut) * size_coeff, 2):
+            x_remainder = px_cut * size_coeff  # restart for each char
+            char_index += 1
+
+        if char_index >= len(text):
+            continue
+
+        # find the data from that number
+        char = text[char_index]
+        index = 10 if char == "m" else int(char)
+        x_ratios.append((index * size * size_coeff + x_remainder) / new_w)
+        x_remainder += 1 * size_coeff
+        column_index = start_ind + int(
+            3 * ((size - 2 * px_cut) * char_index * size_coeff + x_remainder)
+        )
+        if char_index == len(text) - 1:
+            column_index += int(3 * (size - 2 * px_cut) * size_coeff)
+        column_indices.append(column_index)
+
+    r = np.arange(new_h)
+    values = image.reshape(len(image), -1)
+    for x_ratio, column_index in zip(x_ratios, column_indices):
+        colors = sample_image(numbers, np.full(new_h, x_ratio), r / new_h)
+        # only overwrite nearly black pixels
+        dark = np.all(colors < 100, axis=1)
+        values[start_row + r[dark], column_index : column_index + 3] = colors[dark].min(
+            axis=1
+        )[:, None]
+
+    return image
+
+
+def add_copyright_text(image: np.ndarray, width: float) -> np.ndarray:
     """Add a bar with copyright notice."""
     fileExists = os.path.isfile(PATH_COPYRIGHT)
     if not fileExists:
         raise Exception("Copyright file not found")
 
-    reader = png.Reader(filename=PATH_COPYRIGHT)
-    file_data = reader.read_flat()
-    w, h, pixels, metadata = file_data  # w = h = 256pixels each side
+    notice = read_png_colors(PATH_COPYRIGHT)
+    h, w = notice.shape[:2]
 
     size = 25
 
@@ -365,25 +434,12 @@ def add_copyright_text(color_rows: list[float], width: float) -> list[list[float
     new_h = int(h * size_coeff)
     start_ind = int(width - width / MARGIN_COEFF - w * size_coeff)
 
-    for r in range(new_h):
-        new_row = []
-        for c in range(width):
-            if c >= start_ind and c < start_ind + w * size_coeff:
-                # get pixel color
-                color_tuple = get_image_pixel_color(
-                    w,
-                    h,
-                    pixels,
-                    metadata,
-                    (c - start_ind) / size_coeff / w,
-                    r / new_h,
-                    average_px_offset=0,
-                    contrast_factor=1,
-                )
-                new_row.extend(color_tuple)
-            else:
-                new_row.extend([255, 255, 255])
-
-        color_rows.append(new_row)
-
-    return color_rows
+    bar = np.full((new_h, width, 3), 255, dtype=np.uint8)
+    c = np.arange(width)
+    c = c[(c >= start_ind) & (c < start_ind + w * size_coeff)]
+    r = np.arange(new_h)
+    x_ratio = (c - start_ind) / size_coeff / w
+    y_ratio = r / new_h
+    bar[r[:, None], c] = sample_image(notice, x_ratio[None, :], y_ratio[:, None])
+
+    return np.concatenate((image, bar))
@@ -1,6 +1,10 @@
+from functools import lru_cache
+
+import numpy as np
 from pyproj import CRS, Transformer
 
 
+@lru_cache(maxsize=16)
 def create_crs(lat: float, lon: float) -> CRS:
     """Create a projected Coordinate Reference System centered at lat&lon (based on Traverse Mercator)."""
     new_crs_string = (
@@ -15,11 +19,47 @@ def create_crs(lat: float, lon: float) -> CRS:
     return crs2
 
 
+@lru_cache(maxsize=16)
+def get_transformer(crs_from, crs_to) -> Transformer:
+    """Get a (cached) Transformer between two Coordinate Reference Systems."""
+    return Transformer.from_crs(crs_from, crs_to, always_xy=True)
+
+
 def reproject_to_crs(
     lat: float, lon: float, crs_from, crs_to, direction="FORWARD"
 ) -> tuple[float]:
     """Reproject a point to a different Coordinate Reference System."""
-    transformer = Transformer.from_crs(crs_from, crs_to, always_xy=True)
+    transformer = get_transformer(crs_from, crs_to)
     pt = transformer.transform(lon, lat, direction=direction)
 
     return pt[0], pt[1]
+
+
+class ProjectionContext:
+    """Site projection (local Traverse Mercator + true north rotation) of a run."""
+
+    def __init__(self, lat: float, lon: float, angle_rad: float = 0) -> None:
+        """Create the site CRS and cache the transformer from lat&lon (degrees)."""
+        self.lat = lat
+        self.lon = lon
+        self.angle_rad = angle_rad
+        self.crs = create_crs(lat, lon)
+        self.transformer = get_transformer("EPSG:4326", self.crs)
+
+    def project(
+        self, lats: np.ndarray, lons: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Reproject arrays of lat&lon (degrees) to site x&y (meters).
+
+        The coords are rotated to the site's true north (by angle_rad).
+        """
+        x, y = self.transformer.transform(
+            np.asarray(lons, dtype=np.float64), np.asarray(lats, dtype=np.float64)
+        )
+        if self.angle_rad == 0:
+            return x, y
+
+        # same rotation around (0,0,1) axis as utils_geometry.rotate_pt
+        cos = np.cos(self.angle_rad)
+        sin = np.sin(self.angle_rad)
+        return x * cos + y * sin, -x * sin + y * cos
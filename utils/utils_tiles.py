@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+import numpy as np
+import png
+
+from utils.utils_cache import CACHE_FOLDER, DiskCache, cache_key
+from utils.utils_http import http_client
+
+TILE_URL = "https://tile.openstreetmap.org/{zoom}/{x}/{y}.png"
+
+# tiles are reused between runs, and revalidated once expired (the tile usage
+# policy asks to keep them for the max-age/Expires of the server, or 7 days)
+TILE_CACHE_MAX_BYTES = int(os.getenv("TILE_CACHE_MAX_BYTES", 256 * 1024**2))
+TILE_CACHE_MAX_AGE = float(os.getenv("TILE_CACHE_MAX_AGE", 7 * 24 * 3600))  # s
+# also keep the decoded colors of the tiles, to skip the PNG decoding
+TILE_CACHE_DECODED = os.getenv("TILE_CACHE_DECODED", "0") == "1"
+# PNG tiles are compressed already, so a fast compression level is used
+tile_cache = DiskCache(
+    os.path.join(CACHE_FOLDER, "tiles"),
+    max_bytes=TILE_CACHE_MAX_BYTES,
+    compress_level=1,
+)
+COLORS_HEADER = struct.Struct("<qq")  # height, width
+
+# tiles are fetched concurrently, but within the tile usage policy: a couple
+# of connections and a limited request rate (cached tiles are not counted)
+TILE_WORKERS = int(os.getenv("TILE_WORKERS", 4))
+TILE_RATE_LIMIT = float(os.getenv("TILE_RATE_LIMIT", 8))  # requests per second
+TILE_RATE_BURST = int(os.getenv("TILE_RATE_BURST", 8))
+
+
+class TokenBucket:
+    """Thread-safe token bucket limiting the rate of requests.
+
+    Tokens are added at rate per second, up to capacity; each request takes
+    one token, waiting until one is available.
+    """
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        """Start with a full bucket."""
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take a token, waiting for it if needed. Returns the seconds waited."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            # reserve the token now, so that waiting threads queue up in order
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+tile_rate_limiter = TokenBucket(TILE_RATE_LIMIT, TILE_RATE_BURST)
+
+
+def get_tiles(
+    zoom: int, columns: list[int], rows: list[int], user_agent: str
+) -> list[list[tuple[np.ndarray, str]]]:
+    """Get the colors and status (as get_tile_colors) of a grid of tiles.
+
+    The tiles are fetched concurrently by TILE_WORKERS threads and returned
+    (once all are ready) as a list of rows, each with a tile per column. The
+    tile cache is trimmed to its size once, after all tiles are stored.
+    """
+    tiles = [(x, y) for y in rows for x in columns]
+    with ThreadPoolExecutor(max_workers=TILE_WORKERS) as executor:
+        results = list(
+            executor.map(lambda tile: get_tile_colors(zoom, *tile, user_agent), tiles)
+        )
+    tile_cache.evict()
+    return [results[i : i + len(columns)] for i in range(0, len(results), len(columns))]
+
+
+def get_tile_colors(
+    zoom: int, x: int, y: int, user_agent: str
+) -> tuple[np.ndarray, str]:
+    """Get the (h, w, 3) uint8 colors of a tile and how it was obtained.
+
+    The status is "cached", "revalidated" (after a 304) or "downloaded". The
+    tile is stored without eviction, call tile_cache.evict afterwards.
+    """
+    data, status = fetch_tile(zoom, x, y, user_agent)
+    if not TILE_CACHE_DECODED:
+        return decode_png_colors(data), status
+
+    # the decoded colors are addressed by the content of the tile
+    key = cache_key("colors", hashlib.sha256(data).hexdigest())
+    cached = tile_cache.get(key)
+    if cached is not None and len(cached) >= COLORS_HEADER.size:
+        h, w = COLORS_HEADER.unpack_from(cached)
+        if len(cached) == COLORS_HEADER.size + h * w * 3:
+            colors = np.frombuffer(cached, np.uint8, offset=COLORS_HEADER.size)
+            return colors.reshape(h, w, 3), status
+
+    colors = decode_png_colors(data)
+    tile_cache.set(
+        key, COLORS_HEADER.pack(*colors.shape[:2]) + colors.tobytes(), evict=False
+    )
+    return colors, status
+
+
+def fetch_tile(zoom: int, x: int, y: int, user_agent: str) -> tuple[bytes, str]:
+    """Get the PNG data of a tile from the cache, or from the tile server.
+
+    Expired tiles are revalidated with ETag/If-Modified-Since, so unchanged
+    ones are not downloaded again.
+    """
+    url = TILE_URL.format(zoom=zoom, x=x, y=y)
+    key = cache_key(url)
+    entry = read_tile_entry(tile_cache.get(key))
+    if entry is not None and entry[0]["expires"] > time.time():
+        return entry[1], "cached"
+
+    headers = {"User-Agent": user_agent}
+    if entry is not None:
+        if entry[0].get("etag"):
+            headers["If-None-Match"] = entry[0]["etag"]
+        if entry[0].get("last_modified"):
+            headers["If-Modified-Since"] = entry[0]["last_modified"]
+
+    tile_rate_limiter.acquire()
+    r = http_client.get(url, headers=headers)
+    if r.status_code == 304 and entry is not None:
+        data, status = entry[1], "revalidated"
+    elif r.status_code == 200:
+        data, status = r.content, "downloaded"
+    else:
+        raise Exception(f"Request not successful: Response code {r.status_code}")
+
+    metadata = {
+        "etag": r.headers.get("ETag") or (entry[0].get("etag") if entry else None),
+        "last_modified": r.headers.get("Last-Modified")
+        or (entry[0].get("last_modified") if entry else None),
+        "expires": time.time() + get_max_age(r.headers),
+    }
+    entry = json.dumps(metadata).encode("utf-8") + b"\n" + data
+    tile_cache.set(key, entry, evict=False)
+    return data, status
+
+
+def read_tile_entry(blob: bytes | None) -> tuple[dict, bytes] | None:
+    """Split a cached tile into its metadata and PNG data (None if invalid)."""
+    if blob is None:
+        return None
+    header, _, data = blob.partition(b"\n")
+    try:
+        metadata = json.loads(header)
+    except ValueError:
+        return None
+    if not isinstance(metadata, dict) or "expires" not in metadata:
+        return None
+    return metadata, data
+
+
+def get_max_age(headers: dict) -> float:
+    """Get the seconds a tile may be used without revalidation.
+
+    From the Cache-Control max-age or the Expires header of the response,
+    TILE_CACHE_MAX_AGE if it has neither.
+    """
+    for directive in headers.get("Cache-Control", "").split(","):
+        name, _, value = directive.strip().partition("=")
+        if name.lower() == "max-age":
+            try:
+                return float(value)
+            except ValueError:
+                break
+    try:
+        return parsedate_to_datetime(headers["Expires"]).timestamp() - time.time()
+    except (KeyError, TypeError, ValueError):
+        return TILE_CACHE_MAX_AGE
+
+
+def decode_png_colors(data: bytes) -> np.ndarray:
+    """Decode PNG data (palette, RGB or RGBA) into an (h, w, 3) uint8 array."""
+    w, h, pixels, metadata = png.Reader(bytes=data).read_flat()
+    pixels = np.asarray(pixels, dtype=np.uint8)
+    if "palette" in metadata:
+        palette = np.array([color[:3] for color in metadata["palette"]], np.uint8)
+        return palette[pixels].reshape(h, w, 3)
+    planes = 4 if metadata["alpha"] else 3
+    return pixels.reshape(h, w, planes)[:, :, :3]